@@ -1,19 +1,21 @@
-from pymongo import MongoClient
-import datetime
-import schedule
 import time
+_PROCESS_START = time.perf_counter()
+
+import datetime
+import math
 import threading
 import json
 import os
+import argparse
+import atexit
+from concurrent.futures import ThreadPoolExecutor
 
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
+from tkinter import ttk, messagebox, simpledialog, filedialog
 from calendar import monthrange
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from matplotlib.figure import Figure
-from PIL import Image, ImageTk, ImageEnhance
+# matplotlib and PIL are imported where they are first used: together they
+# cost more than everything needed to put the first window on screen.
 import sys
-import os
 
 def resource_path(relative_path):
     """ Get absolute path to resource, works for dev and PyInstaller """
@@ -24,205 +26,285 @@ def resource_path(relative_path):
         base_path = os.path.abspath(".")
     return os.path.join(base_path, relative_path)
 
+# ---------------- Startup timings ----------------
+class StartupTimer:
+    """Records how long each startup phase took; printed with --timings."""
+    def __init__(self, started):
+        self.started = started
+        self.last = started
+        self.phases = []
+        self.enabled = False
+        self.reported = False
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last, now - self.started))
+        self.last = now
+        if self.enabled and self.reported:
+            # phases finishing after the first window (background bootstrap, first chart)
+            self.report_phase(self.phases[-1])
+
+    def report_phase(self, entry):
+        phase, took, cumulative = entry
+        print(f"startup | {took * 1000:9.1f} ms | {cumulative * 1000:9.1f} ms | {phase}")
+
+    def report(self):
+        print("startup |   self    | cumulative | phase")
+        for entry in self.phases:
+            self.report_phase(entry)
+        self.reported = True
+
+startup = StartupTimer(_PROCESS_START)
+startup.mark("import tkinter and stdlib")
+
+from habit_storage import (
+    db_calls, load_config, configure_storage, BACKENDS, ensure_bootstrapped,
+    create_user, login_user, get_user_stats, set_user_pin,
+    build_habit_list, get_habit, save_habit,
+    add_habit_log_for_user, add_habit_logs_for_user, undo_last_habit_log, recompute_user_stats, recompute_all_users,
+    rebalance_habit, migrate_logs_to_buckets,
+    get_month_totals, get_habits_logged_on, backfill_daily_totals, load_dashboard_snapshot,
+    LEADERBOARDS, get_leaderboard, get_ranks, get_logs_page, count_logs, page_cursor, AlreadyLoggedError,
+)
+from habit_metrics import metrics
+startup.mark("import storage backends")
+
+# ---------------- Bootstrap ----------------
+# Seeding, schema/index checks and the catalog change stream all need the
+# database, so they run once on first use (or in the background at GUI
+# startup) rather than at import time.
+def bootstrap_in_background():
+    def run():
+        try:
+            ensure_bootstrapped(mark=startup.mark)
+        except Exception as e:
+            # The first UI request will retry and surface the error to the user
+            print("⚠️ Database bootstrap failed:", e)
+    threading.Thread(target=run, daemon=True).start()
+
+# ---------------- Background DB worker ----------------
+class BackgroundDB:
+    """Runs backend calls on a worker pool so the Tk main loop never waits on the database.
+
+    Results are handed back to the Tk thread with root.after (Tcl queues calls
+    made from other threads onto the main loop). Jobs submitted with a `key`
+    supersede earlier jobs with the same key: a queued one is cancelled and a
+    running one has its result dropped.
+    """
+    def __init__(self, root, workers=4):
+        self.root = root
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="habit-db")
+        self.pending = 0
+        self.on_pending_change = None
+        self._latest = {}
+
+    def submit(self, name, fn, *args, on_done=None, on_error=None, key=None):
+        submitted = time.perf_counter()
+
+        def job():
+            with db_calls.action(name):
+                return fn(*args)
+
+        future = self.pool.submit(job)
+        if key is not None:
+            previous = self._latest.get(key)
+            if previous is not None:
+                previous.cancel()
+            self._latest[key] = future
+        self._set_pending(1)
+
+        def deliver():
+            self._set_pending(-1)
+            if future.cancelled() or (key is not None and self._latest.get(key) is not future):
+                return  # superseded by a newer request
+            if key is not None:
+                del self._latest[key]
+            error = future.exception()
+            # job.<name>: submit until the result reaches the Tk thread (queueing included);
+            # job.<name>.render: the callback drawing it
+            metrics.observe(f"job.{name}", (time.perf_counter() - submitted) * 1000)
+            with metrics.timer(f"job.{name}.render"):
+                if error is not None:
+                    (on_error or self.report_error)(error)
+                elif on_done is not None:
+                    on_done(future.result())
+
+        future.add_done_callback(lambda f: self.root.after(0, deliver))
+        return future
+
+    def report_error(self, error):
+        messagebox.showerror("Database Error", f"Could not reach the database:\n{error}")
+
+    def _set_pending(self, delta):
+        self.pending += delta
+        if self.on_pending_change:
+            self.on_pending_change(self.pending)
+
+# ---------------- History paging ----------------
+# The History tab shows a user's whole log history through a fixed set of row
+# widgets. Rows are addressed by position (0 = newest) and fetched a page at a
+# time with keyset cursors; only the cursors and a few pages around the
+# viewport are kept, so a 100k-log history costs the same memory as a short one.
+HISTORY_PAGE = 100
+HISTORY_ROWS = 20
+HISTORY_CACHED_PAGES = 4
+
+def history_row(log):
+    """(date, local time, habit, points, is_good) for one log."""
+    stamp = log["timestamp"]
+    if isinstance(stamp, str):
+        stamp = datetime.datetime.fromisoformat(stamp)
+    if stamp.tzinfo is None:
+        stamp = stamp.replace(tzinfo=datetime.timezone.utc)  # stored as UTC
+    habit = get_habit(log["habit"])
+    good = habit["type"] == "good" if habit else log["points"] > 0
+    return log["date"], stamp.astimezone().strftime("%H:%M"), log["habit"], log["points"], good
+
+def fetch_history(username, page, cursor, target):
+    """Fetch page `page` with `cursor` and walk forward to page `target` (or the last page).
+
+    Returns (page reached, cursors of the pages after each one fetched, rows of the page reached).
+    """
+    cursors = []
+    while True:
+        logs = get_logs_page(username, cursor, HISTORY_PAGE)
+        cursor = page_cursor(logs) if len(logs) == HISTORY_PAGE else None
+        if cursor is not None:
+            cursors.append(cursor)
+        if page == target or cursor is None:
+            return page, cursors, [history_row(log) for log in logs]
+        page += 1
+
+class HistoryPages:
+    """The cursors and cached pages behind the History tab for one user."""
+    def __init__(self, total, newest):
+        self.total = total
+        self.newest = newest  # the newest row, to tell whether the history changed on reload
+        self.cursors = [None]  # cursors[p] fetches page p
+        self.pages = {}
+
+    def rows(self, first, count):
+        """Rows first..first+count-1 (None where the page is not loaded yet)."""
+        rows = []
+        for i in range(first, min(first + count, self.total)):
+            page = self.pages.get(i // HISTORY_PAGE)
+            offset = i % HISTORY_PAGE
+            rows.append(page[offset] if page is not None and offset < len(page) else None)
+        return rows
+
+    def missing(self, first, count):
+        """The first page the viewport needs that is not loaded, reading one page ahead; None if all are."""
+        last = min(first + count + HISTORY_PAGE // 2, self.total) - 1
+        for page in range(first // HISTORY_PAGE, last // HISTORY_PAGE + 1):
+            if page not in self.pages:
+                return page
+        return None
 
+    def start_for(self, page):
+        """(page, cursor) to fetch from: the page itself if its cursor is known, else the furthest known."""
+        start = min(page, len(self.cursors) - 1)
+        return start, self.cursors[start]
 
+    def store(self, start, page, cursors, rows):
+        for i, cursor in enumerate(cursors, start + 1):
+            if i == len(self.cursors):
+                self.cursors.append(cursor)
+        self.pages[page] = rows
+        # Evict the pages furthest from the one just loaded
+        while len(self.pages) > HISTORY_CACHED_PAGES:
+            del self.pages[max(self.pages, key=lambda p: abs(p - page))]
 
-# ---------------- Database Setup ----------------
-client = MongoClient("mongodb://localhost:27017/")
-db = client["habit_game"]
-
-users_collection = db["users"]
-habits_collection = db["habits"]
-logs_collection = db["logs"]
-
-# Predefined habits
-if habits_collection.count_documents({}) == 0:
-    habits = [
-        {"habit": "Studied for 2 hours", "type": "good", "points": 18},
-        {"habit": "Exercise / Physical Activity", "type": "good", "points": 13},
-        {"habit": "Practiced a hobby or skill", "type": "good", "points": 12},
-        {"habit": "Stayed hydrated", "type": "good", "points": 12},
-        {"habit": "Attended lectures on time", "type": "good", "points": 11},
-        {"habit": "Read books or articles", "type": "good", "points": 9},
-        {"habit": "Overused social media", "type": "bad", "points": -6},
-        {"habit": "Skipped class", "type": "bad", "points": -7},
-        {"habit": "Skipped meal", "type": "bad", "points": -9},
-        {"habit": "Avoided studying or practicing skills", "type": "bad", "points": -9},
-        {"habit": "Getting angry / losing cool", "type": "bad", "points": -10},
-        {"habit": "Stayed up late", "type": "bad", "points": -12},
-    ]
-    habits_collection.insert_many(habits)
-
-# ---------------- Core backend functions ----------------
-def create_user(username, password):
-    if users_collection.find_one({"username": username}):
-        return False
-    users_collection.insert_one({
-        "username": username,
-        "password": password,
-        "points": 0,
-        "level": 1,
-        "streak": 0,
-        "last_action_date": None,
-        "pin": None,
-        "pin_recovery": None
-    })
-    return True
-
-def login_user(username, password):
-    return users_collection.find_one({"username": username, "password": password})
-
-def calculate_level(points):
-    return max(1, points // 100 + 1)
-
-def add_habit_log_for_user(username, habit_name):
-    habit = habits_collection.find_one({"habit": habit_name})
-    if not habit:
-        return None
-    points = int(habit["points"])
-    entry = {
-        "user": username,
-        "habit": habit_name,
-        "points": points,
-        # store ISO date for day-based grouping and a precise timestamp for ordering
-        "date": datetime.date.today().isoformat(),
-        "timestamp": datetime.datetime.utcnow()
-    }
-    logs_collection.insert_one(entry)
-
-    user = users_collection.find_one({"username": username})
-    if not user:
-        return None
-
-    today = datetime.date.today()
-    last = user.get("last_action_date")
-    streak = user.get("streak", 0)
+# ---------------- Scheduler ----------------
+def remind_log(user):
+    print(f"🔔 Hey {user}, don’t forget to log your habits today!")
 
-    if last:
-        try:
-            last_date = datetime.date.fromisoformat(last)
-            if today == last_date + datetime.timedelta(days=1):
-                streak += 1
-            elif today == last_date:
-                streak = streak
-            else:
-                streak = 1
-        except:
-            streak = 1
-    else:
-        streak = 1
-
-    new_points = user.get("points", 0) + points
-    new_level = calculate_level(new_points)
-
-    users_collection.update_one(
-        {"username": username},
-        {"$set": {
-            "points": new_points,
-            "level": new_level,
-            "streak": streak,
-            "last_action_date": today.isoformat()
-        }}
-    )
-    return points
-
-def undo_last_habit_log(username):
-    # Find the most recently inserted log using timestamp (fallback to date ordering)
-    last_log = logs_collection.find({"user": username}).sort([("timestamp", -1), ("date", -1)]).limit(1)
-    last_log = list(last_log)
-    if not last_log:
-        return False
-
-    logs_collection.delete_one({"_id": last_log[0]["_id"]})
-
-    # Fetch logs ordered by timestamp ascending so we can recompute streaks in chronological order
-    logs = list(logs_collection.find({"user": username}).sort([("timestamp", 1), ("date", 1)]))
-    total_points = sum(l.get("points", 0) for l in logs)
-    level = calculate_level(total_points)
-
-    streak = 0
-    last_date = None
-    for l in logs:
-        pts = l.get("points", 0)
-        try:
-            log_date = datetime.date.fromisoformat(l["date"])
-        except:
-            continue
-        if last_date:
-            if (log_date - last_date).days == 1 and pts > 0:
-                streak += 1
-            elif (log_date - last_date).days > 1 and pts > 0:
-                streak = 1
-            else:
-                streak = 0
-        else:
-            streak = 1 if pts > 0 else 0
-        last_date = log_date
+REMINDER_TIME = datetime.time(20, 0)
 
-    last_action_date = last_date.isoformat() if last_date else None
+class TimerService:
+    """Runs callbacks at local wall-clock deadlines on the Tk thread, without polling.
 
-    users_collection.update_one(
-        {"username": username},
-        {"$set": {
-            "points": total_points,
-            "level": level,
-            "streak": streak,
-            "last_action_date": last_action_date
-        }}
-    )
-    return True
+    A single Tk timer is armed for the nearest deadline. Each sleep is capped at
+    MAX_SLEEP because the Tk timer does not advance while the machine is
+    suspended and cannot see wall-clock jumps; deadlines are also re-checked
+    whenever the window is mapped or focused, which is what happens on resume.
+    """
+    MAX_SLEEP = datetime.timedelta(minutes=15)
 
-def get_user_stats(username):
-    return users_collection.find_one({"username": username})
+    def __init__(self, root):
+        self.root = root
+        self.jobs = []
+        self._after_id = None
+        self.root.bind("<Map>", lambda e: self.reschedule(), add="+")
+        self.root.bind("<FocusIn>", lambda e: self.reschedule(), add="+")
 
-def get_logs_for_user(username, limit=1000):
-    return list(logs_collection.find({"user": username}).sort("date", -1).limit(limit))
+    def add(self, first_due, fire, next_due):
+        """Call fire() at first_due, then at next_due(now) after every run."""
+        self.jobs.append({"due": first_due, "fire": fire, "next_due": next_due})
+        self.reschedule()
 
-def build_habit_list():
-    return list(habits_collection.find({}))
+    def at_midnight(self, callback):
+        """callback(yesterday, today) exactly once whenever the local date changes."""
+        state = {"date": datetime.date.today()}
 
-# ---------------- Scheduler ----------------
-def remind_log(user):
-    print(f"🔔 Hey {user}, don’t forget to log your habits today!")
+        def next_midnight(now):
+            return datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time())
 
-def run_scheduler():
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
+        def fire():
+            today = datetime.date.today()
+            if today != state["date"]:
+                yesterday, state["date"] = state["date"], today
+                callback(yesterday, today)
+        self.add(next_midnight(datetime.datetime.now()), fire, next_midnight)
+
+    def daily_at(self, at, callback):
+        def next_run(now):
+            due = datetime.datetime.combine(now.date(), at)
+            return due if due > now else due + datetime.timedelta(days=1)
+        self.add(next_run(datetime.datetime.now()), callback, next_run)
+
+    def reschedule(self):
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+        now = datetime.datetime.now()
+        for job in self.jobs:
+            if job["due"] <= now:
+                job["fire"]()
+                job["due"] = job["next_due"](now)
+        if not self.jobs:
+            return
+        delay = min(min(job["due"] for job in self.jobs) - now, self.MAX_SLEEP)
+        self._after_id = self.root.after(max(0, int(delay.total_seconds() * 1000)), self.reschedule)
 
 # ---------------- Habit Game App ----------------
 class HabitGameApp:
     REMEMBER_FILE = "remember_user.json"
 
 
-    def start_daily_rollover_check(self):
-        """Start a background thread to check when a new day starts."""
-        def check_day_change():
-            last_checked = datetime.date.today()
-            while True:
-                today = datetime.date.today()
-                if today != last_checked:
-                    # Day has changed
-                    self.on_new_day(last_checked, today)
-                    last_checked = today
-                time.sleep(30)  # Check every 30 seconds
+    def start_timers(self):
+        """Day rollover and the daily reminder, fired on the Tk thread by one timer service."""
+        self.timers = TimerService(self.root)
+        self.timers.at_midnight(self.on_new_day)
+        self.timers.daily_at(REMINDER_TIME, self.remind_current_user)
 
-        threading.Thread(target=check_day_change, daemon=True).start()
+    def remind_current_user(self):
+        if self.current_user:
+            remind_log(self.current_user["username"])
 
     def on_new_day(self, yesterday, today):
         """Handle the rollover to a new day."""
-        # Refresh dashboard so new day is reflected
-        self.refresh_dashboard()
+        # Refresh dashboard (which includes the monthly calendar) so new day is reflected
+        if self.current_user and getattr(self, "notebook", None):
+            self.refresh_dashboard()
         # Optionally: show a notification
         print(f"🌅 New day: {today}. Yesterday's logs saved for {yesterday}.")
-        # Optionally, update the monthly calendar immediately
-        self.show_monthly_calendar()
 
     def __init__(self, root):
         self.root = root
         self.root.title("🎮 Habit Game")
         self.root.geometry("900x700")
         self.current_user = None
+        self.snapshot = None
         self.displayed_year = datetime.date.today().year
         self.displayed_month = datetime.date.today().month
         # Load icon safely: iconbitmap may fail in some environments (PyInstaller temp dir),
@@ -232,6 +314,7 @@ class HabitGameApp:
             self.root.iconbitmap(ico_path)
         except Exception:
             try:
+                from PIL import Image, ImageTk
                 img = Image.open(resource_path("resources/logo.png"))
                 self.root.iconphoto(True, ImageTk.PhotoImage(img))
             except Exception:
@@ -243,8 +326,15 @@ class HabitGameApp:
         self.style.configure("TButton", font=("Arial", 11))
         self.style.configure("Header.TLabel", font=("Arial", 16, "bold"))
 
+        self.db = BackgroundDB(self.root)
+        self.db.on_pending_change = self.show_pending_state
+        self.status_var = tk.StringVar()
+
+        # Hidden diagnostics panel
+        self.root.bind_all("<Control-Shift-D>", lambda e: self.show_diagnostics())
+
         self.load_remembered_user()
-        self.start_daily_rollover_check()
+        self.start_timers()
 
 
     # ---------- Remember Me ----------
@@ -256,16 +346,29 @@ class HabitGameApp:
         if os.path.exists(self.REMEMBER_FILE):
             with open(self.REMEMBER_FILE, "r") as f:
                 data = json.load(f)
-                user = get_user_stats(data.get("username"))
-                if user:
-                    self.current_user = user
-                    if user.get("pin"):
-                        self.show_pin_lock()
-                    else:
-                        self.show_dashboard()
-                    return
+            # Nothing usable goes on screen until the user document says whether a PIN is set
+            self.show_loading_screen(f"Loading {data.get('username')}...")
+            self.db.submit("remembered_user", get_user_stats, data.get("username"),
+                           on_done=self.finish_login,
+                           on_error=lambda e: self.show_login_screen())
+            return
         self.show_login_screen()
 
+    def finish_login(self, user):
+        if not user:
+            self.current_user = None
+            self.show_login_screen()
+            return
+        self.current_user = user
+        if user.get("pin"):
+            self.show_pin_lock()
+        else:
+            self.show_dashboard()
+
+    def show_loading_screen(self, message):
+        self.clear_screen()
+        ttk.Label(self.root, text=message, style="Header.TLabel").place(relx=0.5, rely=0.5, anchor="center")
+
     def clear_remembered_user(self):
         if os.path.exists(self.REMEMBER_FILE):
             os.remove(self.REMEMBER_FILE)
@@ -273,22 +376,12 @@ class HabitGameApp:
     # ---------- Login / Signup ----------
     def show_login_screen(self):
         self.clear_screen()
-
-        # Load background image (original)
-        try:
-            self.original_bg_image = Image.open(resource_path("resources/background.png"))
-            enhancer = ImageEnhance.Brightness(self.original_bg_image)
-            self.original_bg_image = enhancer.enhance(0.4)  # Darken once
-        except Exception as e:
-            print("Background image error:", e)
-            self.original_bg_image = None
+        self.original_bg_image = None
 
         self.bg_label = tk.Label(self.root)
         self.bg_label.place(x=0, y=0, relwidth=1, relheight=1)
-
-        if self.original_bg_image:
-            self.update_bg_image()  # initial resize
-            self.root.bind("<Configure>", lambda e: self.update_bg_image())
+        # The form shows first; PIL and the background image load once the loop is idle
+        self.root.after_idle(self.load_login_background)
 
         # Container frame on top of background
         container = ttk.Frame(self.root, padding=16)
@@ -317,9 +410,27 @@ class HabitGameApp:
         ttk.Button(btn_frame, text="Quit", command=self.root.quit).grid(row=0, column=2, padx=6)
 
 
+    def load_login_background(self):
+        if not self.bg_label.winfo_exists():
+            return  # already logged in
+        # Load background image (original)
+        try:
+            from PIL import Image, ImageEnhance
+            self.original_bg_image = Image.open(resource_path("resources/background.png"))
+            enhancer = ImageEnhance.Brightness(self.original_bg_image)
+            self.original_bg_image = enhancer.enhance(0.4)  # Darken once
+        except Exception as e:
+            print("Background image error:", e)
+            self.original_bg_image = None
+
+        if self.original_bg_image:
+            self.update_bg_image()  # initial resize
+            self.root.bind("<Configure>", lambda e: self.update_bg_image())
+
     def update_bg_image(self):
-        if not self.original_bg_image:
+        if not self.original_bg_image or not self.bg_label.winfo_exists():
             return
+        from PIL import Image, ImageTk
         w = self.root.winfo_width()
         h = self.root.winfo_height()
         resized = self.original_bg_image.resize((w, h), Image.LANCZOS)
@@ -333,17 +444,16 @@ class HabitGameApp:
         if not username or not password:
             messagebox.showerror("Error", "Please enter username and password")
             return
-        user = login_user(username, password)
-        if user:
-            self.current_user = user
-            if self.remember_var.get():
+        remember = self.remember_var.get()
+
+        def done(user):
+            if not user:
+                messagebox.showerror("Error", "Invalid username or password")
+                return
+            if remember:
                 self.save_remembered_user(username)
-            if user.get("pin"):
-                self.show_pin_lock()
-            else:
-                self.show_dashboard()
-        else:
-            messagebox.showerror("Error", "Invalid username or password")
+            self.finish_login(user)
+        self.db.submit("login", login_user, username, password, on_done=done, key="login")
 
     def handle_signup(self):
         username = self.username_entry.get().strip()
@@ -351,11 +461,12 @@ class HabitGameApp:
         if not username or not password:
             messagebox.showerror("Error", "Please provide username and password")
             return
-        success = create_user(username, password)
-        if success:
-            messagebox.showinfo("Success", "User created. Please login.")
-        else:
-            messagebox.showerror("Error", "User already exists")
+        def done(success):
+            if success:
+                messagebox.showinfo("Success", "User created. Please login.")
+            else:
+                messagebox.showerror("Error", "User already exists")
+        self.db.submit("signup", create_user, username, password, on_done=done, key="signup")
 
     # ---------- PIN Lock ----------
     def show_pin_lock(self):
@@ -364,6 +475,13 @@ class HabitGameApp:
         window.geometry("300x180")
         window.grab_set()
 
+        def cancel():
+            # Closing the lock is not a way past it: back to the login form
+            window.destroy()
+            self.current_user = None
+            self.show_login_screen()
+        window.protocol("WM_DELETE_WINDOW", cancel)
+
         tk.Label(window, text="Enter your 4-digit PIN:", font=("Arial", 12)).pack(pady=8)
         pin_entry = ttk.Entry(window, width=10, show="*")
         pin_entry.pack(pady=6)
@@ -388,16 +506,38 @@ class HabitGameApp:
         ttk.Button(window, text="Forgot PIN?", command=recover_pin).pack(pady=4)
 
     # ---------- Dashboard ----------
+    @metrics.timed("ui.show_dashboard")
     def show_dashboard(self):
+        self.build_dashboard_shell()
+        self.load_dashboard_data()
+
+    def build_dashboard_shell(self):
+        """Every dashboard widget that needs no data; filled in by load_dashboard_data."""
         self.clear_screen()
         self.notebook = ttk.Notebook(self.root)
         self.notebook.pack(fill="both", expand=True)
 
         self.dashboard_tab = ttk.Frame(self.notebook)
         self.calendar_tab = ttk.Frame(self.notebook)
+        self.leaderboard_tab = ttk.Frame(self.notebook)
+        self.analytics_tab = ttk.Frame(self.notebook)
+        self.history_tab = ttk.Frame(self.notebook)
 
         self.notebook.add(self.dashboard_tab, text="Dashboard")
         self.notebook.add(self.calendar_tab, text="Monthly Points")
+        self.notebook.add(self.leaderboard_tab, text="Leaderboard")
+        self.notebook.add(self.analytics_tab, text="Analytics")
+        self.notebook.add(self.history_tab, text="History")
+        self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
+        self.leaderboard_boxes = None  # built the first time the tab is opened
+        self.analytics_canvas = None  # likewise for the analytics charts
+        self.history_slots = None  # and for the history rows
+        self.history_pages = None
+        self.history_top = 0
+        self.history_loading = None
+        self.calendar_cells = None  # built on first render, then reused
+        self.pie_canvas = None  # likewise for the daily pie chart
+        self.pie_counts = None
 
         # Header
         header = ttk.Frame(self.dashboard_tab, padding=12)
@@ -405,6 +545,7 @@ class HabitGameApp:
         ttk.Label(header, text=f"Welcome, {self.current_user['username']}!", style="Header.TLabel").pack(side="left")
         ttk.Button(header, text="Logout", command=self.logout).pack(side="right")
         ttk.Button(header, text="⚙", command=self.show_settings).pack(side="right", padx=8)
+        ttk.Label(header, textvariable=self.status_var).pack(side="right", padx=8)
 
         # Top stats
         top_frame = ttk.Frame(self.dashboard_tab, padding=12)
@@ -412,14 +553,20 @@ class HabitGameApp:
         self.points_var = tk.StringVar()
         self.level_var = tk.StringVar()
         self.streak_var = tk.StringVar()
+        self.rank_var = tk.StringVar()
         ttk.Label(top_frame, textvariable=self.points_var, font=("Arial", 14)).grid(row=0, column=0, sticky="w", padx=6, pady=6)
         ttk.Label(top_frame, textvariable=self.level_var, font=("Arial", 14)).grid(row=0, column=1, sticky="w", padx=6, pady=6)
         ttk.Label(top_frame, textvariable=self.streak_var, font=("Arial", 14)).grid(row=0, column=2, sticky="w", padx=6, pady=6)
+        ttk.Label(top_frame, textvariable=self.rank_var, font=("Arial", 14)).grid(row=0, column=3, sticky="w", padx=6, pady=6)
 
         # Recent activity
         middle = ttk.Frame(self.dashboard_tab, padding=(12,8))
         middle.pack(fill="both", expand=False)
-        ttk.Label(middle, text="Recent Activity:", font=("Arial", 12, "bold")).pack(anchor="w")
+        recent_header = ttk.Frame(middle)
+        recent_header.pack(fill="x")
+        ttk.Label(recent_header, text="Recent Activity:", font=("Arial", 12, "bold")).pack(side="left")
+        ttk.Button(recent_header, text="Full History",
+                   command=lambda: self.notebook.select(self.history_tab)).pack(side="right")
         self.recent_box = tk.Text(middle, height=6, width=80, state="disabled")
         self.recent_box.pack(pady=(6,0))
 
@@ -427,43 +574,48 @@ class HabitGameApp:
         bottom = ttk.Frame(self.dashboard_tab, padding=12)
         bottom.pack(fill="both", expand=True)
         ttk.Label(bottom, text="Log a Habit (click):", font=("Arial", 12, "bold")).pack(anchor="w")
-        habit_templates = build_habit_list()
-        good_habits_frame = ttk.LabelFrame(bottom, text="Good Habits", padding=10)
-        good_habits_frame.pack(side="left", fill="both", expand=True, padx=(0,6))
-        bad_habits_frame = ttk.LabelFrame(bottom, text="Bad Habits", padding=10)
-        bad_habits_frame.pack(side="left", fill="both", expand=True, padx=(6,0))
-        today = datetime.date.today().isoformat()
-        user_logs_today = [l['habit'] for l in get_logs_for_user(self.current_user['username']) if l['date'] == today]
-
+        self.good_habits_frame = ttk.LabelFrame(bottom, text="Good Habits", padding=10)
+        self.good_habits_frame.pack(side="left", fill="both", expand=True, padx=(0,6))
+        self.bad_habits_frame = ttk.LabelFrame(bottom, text="Bad Habits", padding=10)
+        self.bad_habits_frame.pack(side="left", fill="both", expand=True, padx=(6,0))
         self.habit_buttons = {}  # Store buttons to update later
-
-        for h in habit_templates:
-            color = "#E6F0FF" if h["type"] == "good" else "#FFE6E6"
-            frame = good_habits_frame if h["type"] == "good" else bad_habits_frame
-            btn = tk.Button(frame, text=f"{h['habit']} ({h['points']} pts)",
-                            command=lambda name=h['habit']: self.handle_habit_click(name),
-                            bg=color, fg="black", font=("Arial", 12), width=20, height=2,
-                            relief="flat", bd=0, activebackground=color)
-            btn.pack(pady=4, padx=4, fill="x")
-
-            # Disable button if already logged today
-            if h['habit'] in user_logs_today:
-                btn.config(state="disabled", bg="#D3D3D3")  # greyed out
-
-            self.habit_buttons[h['habit']] = btn  # store reference for later
-
+        self.habit_colors = {}
 
         action_frame = ttk.Frame(bottom)
         action_frame.pack(pady=8, anchor="w")
         ttk.Button(action_frame, text="Undo Last Habit", command=self.handle_undo_last).pack(side="left", padx=6)
+        ttk.Button(action_frame, text="Log Several...", command=self.show_batch_log).pack(side="left", padx=6)
         
 
         
         self.chart_holder = ttk.Frame(bottom)
         self.chart_holder.pack(fill="both", expand=True)
 
+    def load_dashboard_data(self):
+        # The shell is on screen; the catalog and the first snapshot load in the background
+        self.db.submit("show_dashboard", build_habit_list, on_done=self.build_habit_buttons, key="catalog")
         self.refresh_dashboard()
 
+    @metrics.timed("ui.build_habit_buttons")
+    def build_habit_buttons(self, habit_templates):
+        for h in habit_templates:
+            color = "#E6F0FF" if h["type"] == "good" else "#FFE6E6"
+            frame = self.good_habits_frame if h["type"] == "good" else self.bad_habits_frame
+            btn = tk.Button(frame, text=f"{h['habit']} ({h['points']} pts)",
+                            command=lambda name=h['habit']: self.handle_habit_click(name),
+                            bg=color, fg="black", font=("Arial", 12), width=20, height=2,
+                            relief="flat", bd=0, activebackground=color)
+            btn.pack(pady=4, padx=4, fill="x")
+            self.habit_buttons[h['habit']] = btn  # store reference for later
+            self.habit_colors[h['habit']] = color
+        if self.snapshot:
+            self.update_habit_buttons_state(self.snapshot["logged_today"])
+
+    def show_pending_state(self, pending):
+        """Busy cursor and a status note while any database request is in flight."""
+        self.root.config(cursor="watch" if pending else "")
+        self.status_var.set("⏳ Syncing..." if pending else "")
+
 
     # ---------- Settings ----------
     def show_settings(self):
@@ -513,16 +665,16 @@ class HabitGameApp:
             if len(pin) != 4 or not pin.isdigit():
                 messagebox.showerror("Error", "PIN must be 4 digits")
                 return
-            users_collection.update_one({"username": self.current_user["username"]},
-                                        {"$set": {"pin": pin, "pin_recovery": rec}})
-            messagebox.showinfo("Success", "PIN set successfully")
-            self.current_user = get_user_stats(self.current_user["username"])
+            def done(user):
+                self.current_user = user
+                messagebox.showinfo("Success", "PIN set successfully")
+            self.db.submit("save_pin", set_user_pin, self.current_user["username"], pin, rec, on_done=done)
         ttk.Button(lock_frame, text="Save PIN", command=save_pin).pack(pady=6)
         def remove_pin():
-            users_collection.update_one({"username": self.current_user["username"]},
-                                        {"$set": {"pin": None, "pin_recovery": None}})
-            messagebox.showinfo("Success", "PIN removed")
-            self.current_user = get_user_stats(self.current_user["username"])
+            def done(user):
+                self.current_user = user
+                messagebox.showinfo("Success", "PIN removed")
+            self.db.submit("remove_pin", set_user_pin, self.current_user["username"], None, None, on_done=done)
         ttk.Button(lock_frame, text="Remove PIN", command=remove_pin).pack(pady=2)
 
     def build_habit_settings(self, frame):
@@ -552,80 +704,120 @@ class HabitGameApp:
                 messagebox.showerror("Error", "Points must be an integer")
                 return
             habit_type = habit_type_var.get()
-            existing = habits_collection.find_one({"habit": name})
-            if existing:
-                habits_collection.update_one({"habit": name}, {"$set": {"points": pts, "type": habit_type}})
-                messagebox.showinfo("Updated", f"Habit '{name}' updated")
-            else:
-                habits_collection.insert_one({"habit": name, "points": pts, "type": habit_type})
-                messagebox.showinfo("Added", f"Habit '{name}' added")
+
+            def rebalanced(summary):
+                messagebox.showinfo("Rebalanced", f"Updated {summary['logs']} past logs of {summary['users']} users")
+                self.refresh_dashboard()
+
+            def done(existed):
+                if not existed:
+                    messagebox.showinfo("Added", f"Habit '{name}' added")
+                elif messagebox.askyesno("Updated", f"Habit '{name}' updated.\n\nApply {pts} pts to past "
+                                                    f"'{name}' logs of every user too?"):
+                    # In-process: the app's own connection, batch after batch on a background thread
+                    self.db.submit("rebalance", lambda: rebalance_habit(name, pts, workers=1), on_done=rebalanced)
+            self.db.submit("save_habit", save_habit, name, pts, habit_type, on_done=done)
         ttk.Button(habit_frame, text="Save Habit", command=add_or_update_habit).pack(pady=6)
 
     # ---------- Monthly Calendar ----------
-    def show_monthly_calendar(self):
-        for w in self.calendar_tab.winfo_children():
-            w.destroy()
+    def build_calendar_grid(self):
+        """Create the nav bar and a 6x7 grid of day cells once; renders only update them."""
         nav_frame = ttk.Frame(self.calendar_tab)
         nav_frame.pack(fill="x", pady=8)
         ttk.Button(nav_frame, text="◀", command=lambda: self.change_month(-1)).pack(side="left", padx=8)
-        month_name = datetime.date(self.displayed_year, self.displayed_month, 1).strftime("%B %Y")
-        ttk.Label(nav_frame, text=month_name, font=("Arial", 16, "bold")).pack(side="left", padx=8)
-        today = datetime.date.today()
-        if (self.displayed_year < today.year) or (self.displayed_year == today.year and self.displayed_month < today.month):
-            ttk.Button(nav_frame, text="▶", command=lambda: self.change_month(1)).pack(side="left", padx=8)
-
-        cal_frame = tk.Frame(self.calendar_tab, bg="#F5F5F5")
-        cal_frame.pack(fill="both", expand=True, padx=12, pady=12)
+        self.month_name_var = tk.StringVar()
+        ttk.Label(nav_frame, textvariable=self.month_name_var, font=("Arial", 16, "bold")).pack(side="left", padx=8)
+        self.next_month_button = ttk.Button(nav_frame, text="▶", command=lambda: self.change_month(1))
+        self.next_month_shown = False
 
-        logs = get_logs_for_user(self.current_user["username"])
-        logs_by_date = {}
-        for l in logs:
-            date = datetime.date.fromisoformat(l["date"])
-            if date.year == self.displayed_year and date.month == self.displayed_month:
-                logs_by_date.setdefault(date, []).append(l)
+        self.cal_frame = tk.Frame(self.calendar_tab, bg="#F5F5F5")
+        self.cal_frame.pack(fill="both", expand=True, padx=12, pady=12)
 
         days_of_week = ["Sun","Mon","Tue","Wed","Thu","Fri","Sat"]
         for i, day in enumerate(days_of_week):
-            tk.Label(cal_frame, text=day, font=("Arial", 12, "bold"), bg="#F5F5F5").grid(row=0, column=i, padx=2, pady=2, sticky="nsew")
+            tk.Label(self.cal_frame, text=day, font=("Arial", 12, "bold"), bg="#F5F5F5").grid(row=0, column=i, padx=2, pady=2, sticky="nsew")
+            self.cal_frame.grid_columnconfigure(i, weight=1)
+
+        self.calendar_cells = []
+        for i in range(42):
+            row, col = divmod(i, 7)
+            card = tk.Frame(self.cal_frame, bd=1, relief="raised")
+            card.grid(row=row + 1, column=col, padx=4, pady=4, sticky="nsew")
+            day_label = tk.Label(card, font=("Arial", 14, "bold"))
+            day_label.pack(padx=4, pady=4)
+            points_label = tk.Label(card, font=("Arial", 10))
+            card.bind("<Button-1>", lambda e, i=i: self.on_calendar_cell_click(i))
+            card.grid_remove()
+            self.calendar_cells.append({"card": card, "day": day_label, "points": points_label,
+                                        "date": None, "state": None})
+
+    def on_calendar_cell_click(self, index):
+        date = self.calendar_cells[index]["date"]
+        if date:
+            self.show_day_logs(date)
+
+    def day_color(self, current_date, today, day_totals):
+        if current_date > today:
+            return "#FFFFFF"  # future days
+        if not day_totals:
+            return "#FFFACD"  # no logs
+        total_points = day_totals["points"]
+        if total_points < 45:
+            return "#FF9999"  # Slight Red
+        elif 45 <= total_points <= 60:
+            return "#ADD8E6"  # Blue
+        elif total_points > 60:
+            return "#98FB98"  # Slight Green
+        return "#FFB6B6"  # fallback light red
+
+    @metrics.timed("ui.show_monthly_calendar")
+    def show_monthly_calendar(self, month_totals=None):
+        if not getattr(self, "calendar_cells", None):
+            self.build_calendar_grid()
+        totals_by_date = month_totals or {}
+        today = datetime.date.today()
 
-        first_weekday, days_in_month = monthrange(self.displayed_year, self.displayed_month)
-        row = 1
-        col = first_weekday
-
-        for day in range(1, days_in_month+1):
-            current_date = datetime.date(self.displayed_year, self.displayed_month, day)
-            day_logs = logs_by_date.get(current_date, [])
-            total_points = sum(l["points"] for l in day_logs)
-            
-            if current_date > today:
-                bg_color = "#FFFFFF"  # future days
-            elif not day_logs:
-                bg_color = "#FFFACD"  # no logs
+        self.month_name_var.set(datetime.date(self.displayed_year, self.displayed_month, 1).strftime("%B %Y"))
+        show_next = (self.displayed_year < today.year) or (self.displayed_year == today.year and self.displayed_month < today.month)
+        if show_next != self.next_month_shown:
+            if show_next:
+                self.next_month_button.pack(side="left", padx=8)
             else:
-                if total_points < 45:
-                    bg_color = "#FF9999"  # Slight Red
-                elif 45 <= total_points <= 60:
-                    bg_color = "#ADD8E6"  # Blue
-                elif total_points > 60:
-                    bg_color = "#98FB98"  # Slight Green
-                else:
-                    bg_color = "#FFB6B6"  # fallback light red
-
-            card = tk.Frame(cal_frame, bg=bg_color, bd=1, relief="raised")
-            card.grid(row=row, column=col, padx=4, pady=4, sticky="nsew")
-            tk.Label(card, text=str(day), font=("Arial", 14, "bold"), bg=bg_color).pack(padx=4, pady=4)
-            if day_logs:
-                tk.Label(card, text=f"{total_points:+} pts", font=("Arial", 10), bg=bg_color).pack(padx=4, pady=2)
-            card.bind("<Button-1>", lambda e, d=current_date: self.show_day_logs(d))
-
-            cal_frame.grid_rowconfigure(row, weight=1)
-            cal_frame.grid_columnconfigure(col, weight=1)
-            col += 1
-            if col > 6:
-                col = 0
-                row += 1
+                self.next_month_button.pack_forget()
+            self.next_month_shown = show_next
 
+        first_weekday, days_in_month = monthrange(self.displayed_year, self.displayed_month)
+        for i, cell in enumerate(self.calendar_cells):
+            day = i - first_weekday + 1
+            if 1 <= day <= days_in_month:
+                current_date = datetime.date(self.displayed_year, self.displayed_month, day)
+                day_totals = totals_by_date.get(current_date)
+                points_text = f"{day_totals['points']:+} pts" if day_totals else None
+                state = (day, self.day_color(current_date, today, day_totals), points_text)
+            else:
+                current_date, state = None, None
+            cell["date"] = current_date
+            if state == cell["state"]:
+                continue  # unchanged since the last render: leave the widgets alone
 
+            if state is None:
+                cell["card"].grid_remove()
+            else:
+                day, bg_color, points_text = state
+                if cell["state"] is None:
+                    cell["card"].grid()
+                cell["card"].config(bg=bg_color)
+                cell["day"].config(text=str(day), bg=bg_color)
+                cell["points"].config(text=points_text or "", bg=bg_color)
+                if points_text and not cell["points"].winfo_manager():
+                    cell["points"].pack(padx=4, pady=2)
+                elif not points_text and cell["points"].winfo_manager():
+                    cell["points"].pack_forget()
+            cell["state"] = state
+
+        rows_used = (first_weekday + days_in_month + 6) // 7
+        for row in range(6):
+            self.cal_frame.grid_rowconfigure(row + 1, weight=1 if row < rows_used else 0)
 
     def change_month(self, delta):
         new_month = self.displayed_month + delta
@@ -640,20 +832,302 @@ class HabitGameApp:
             return
         self.displayed_month = new_month
         self.displayed_year = new_year
-        self.show_monthly_calendar()
+        # Rapid clicks supersede each other: only the last month requested gets rendered
+        self.db.submit("change_month", get_month_totals, self.current_user["username"], new_year, new_month,
+                       on_done=self.show_monthly_calendar, key="month")
 
     # ---------- Day Logs ----------
     def show_day_logs(self, date):
-        logs = get_logs_for_user(self.current_user["username"])
-        day_logs = [l for l in logs if datetime.date.fromisoformat(l["date"]) == date]
+        def load(username):
+            return [(name, get_habit(name)) for name in get_habits_logged_on(username, date)]
+        self.db.submit("day_logs", load, self.current_user["username"],
+                       on_done=lambda day_habits: self.render_day_logs(date, day_habits), key="day_logs")
+
+    def render_day_logs(self, date, day_habits):
         window = tk.Toplevel(self.root)
         window.title(f"Habits for {date.isoformat()}")
-        for l in day_logs:
-            habit = habits_collection.find_one({"habit": l["habit"]})
+        for name, habit in day_habits:
+            habit = habit or {"type": "bad", "points": "?"}
             color = "#ADD8E6" if habit["type"] == "good" else "#FFB6B6"
             frame = tk.Frame(window, bg=color, padx=8, pady=6)
             frame.pack(fill="x", padx=12, pady=4)
-            tk.Label(frame, text=f"{l['habit']} ({l['points']} pts)", bg=color, font=("Arial", 12)).pack(anchor="w")
+            tk.Label(frame, text=f"{name} ({habit['points']} pts)", bg=color, font=("Arial", 12)).pack(anchor="w")
+
+    # ---------- Leaderboard ----------
+    def on_tab_changed(self, event=None):
+        selected = self.notebook.select()
+        if selected == str(self.leaderboard_tab):
+            self.refresh_leaderboard()
+        elif selected == str(self.analytics_tab):
+            self.refresh_analytics()
+        elif selected == str(self.history_tab):
+            self.refresh_history()
+
+    def refresh_leaderboard(self):
+        def load():
+            return {board: get_leaderboard(board, limit=10) for board in LEADERBOARDS}
+        self.db.submit("leaderboard", load, on_done=self.render_leaderboard, key="leaderboard")
+
+    def render_ranks(self, ranks):
+        if not self.current_user:
+            return
+        overall, weekly = ranks.get("points"), ranks.get("weekly")
+        parts = [f"#{overall['rank']} overall"] if overall else []
+        if weekly:
+            parts.append(f"#{weekly['rank']} this week")
+        self.rank_var.set("Rank: " + ", ".join(parts) if parts else "")
+
+    def render_leaderboard(self, boards):
+        if not self.current_user or not self.leaderboard_tab.winfo_exists():
+            return
+        if self.leaderboard_boxes is None:
+            self.leaderboard_boxes = {}
+            for column, (board, title) in enumerate(LEADERBOARDS.items()):
+                frame = ttk.LabelFrame(self.leaderboard_tab, text=title, padding=10)
+                frame.grid(row=0, column=column, sticky="nsew", padx=8, pady=12)
+                self.leaderboard_tab.grid_columnconfigure(column, weight=1)
+                box = tk.Text(frame, height=12, width=28, state="disabled", font=("Courier", 11))
+                box.pack(fill="both", expand=True)
+                box.tag_configure("me", background="#E6F0FF", font=("Courier", 11, "bold"))
+                self.leaderboard_boxes[board] = box
+        me = self.current_user["username"]
+        for board, rows in boards.items():
+            box = self.leaderboard_boxes[board]
+            box.config(state="normal")
+            box.delete("1.0", tk.END)
+            for rank, row in enumerate(rows, start=1):
+                box.insert(tk.END, f"{rank:>3}. {row['username'][:16]:<16}{row['score']:>7}\n",
+                           "me" if row["username"] == me else ())
+            if not rows:
+                box.insert(tk.END, "No one yet")
+            box.config(state="disabled")
+
+    # ---------- Analytics ----------
+    def refresh_analytics(self):
+        # numpy comes in with the engine, on first use rather than at startup
+        from habit_analytics import user_analytics
+        self.db.submit("analytics", user_analytics, self.current_user["username"],
+                       on_done=self.render_analytics, key="analytics")
+
+    def build_analytics_view(self):
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        from matplotlib.figure import Figure
+        self.analytics_summary_var = tk.StringVar()
+        ttk.Label(self.analytics_tab, textvariable=self.analytics_summary_var, padding=12,
+                  font=("Arial", 12)).pack(anchor="w")
+        body = ttk.Frame(self.analytics_tab, padding=(12, 0))
+        body.pack(fill="both", expand=True)
+        self.analytics_box = tk.Text(body, width=58, state="disabled", font=("Courier", 10))
+        self.analytics_box.pack(side="left", fill="y", pady=(0, 12))
+        fig = Figure(figsize=(6, 6), dpi=80)
+        self.analytics_axes = fig.subplots(3, 1)
+        fig.subplots_adjust(hspace=0.6)
+        self.analytics_canvas = FigureCanvasTkAgg(fig, master=body)
+        self.analytics_canvas.get_tk_widget().pack(side="left", fill="both", expand=True, padx=(12, 0))
+
+    @metrics.timed("ui.render_analytics")
+    def render_analytics(self, analytics):
+        if not self.current_user or not self.analytics_tab.winfo_exists():
+            return
+        if self.analytics_canvas is None:
+            self.build_analytics_view()
+        if analytics is None:
+            self.analytics_summary_var.set("No habits logged yet.")
+            return
+        a = analytics
+        self.analytics_summary_var.set(
+            f"{a['logs']} logs on {a['active_days']} of {a['days']} days since {a['start']:%d %b %Y}   "
+            f"Good/bad: {a['good_logs']}/{a['bad_logs']}   "
+            f"Longest streak: {a['longest_streak']} days (current {a['current_streak']})")
+
+        self.analytics_box.config(state="normal")
+        self.analytics_box.delete("1.0", tk.END)
+        self.analytics_box.insert(tk.END, f"{'habit':<34}{'done':>7}{'days':>7}{'best':>7}\n")
+        for h in sorted(a["habits"], key=lambda h: (h["type"] != "good", -h["completion"])):
+            self.analytics_box.insert(tk.END, f"{h['habit'][:33]:<34}{h['completion']:>7.0%}{h['days']:>7}"
+                                              f"{h['longest_streak']:>7}\n")
+        self.analytics_box.insert(tk.END, "\nLatest streaks:\n")
+        for start, length in a["streaks"][-10:][::-1]:
+            self.analytics_box.insert(tk.END, f"  {start:%d %b %Y}  {length:>4} days\n")
+        self.analytics_box.config(state="disabled")
+
+        from habit_analytics import WEEKDAYS
+        rolling_ax, weekday_ax, ratio_ax = self.analytics_axes
+        for ax in self.analytics_axes:
+            ax.clear()
+        for window, series in a["rolling"].items():
+            rolling_ax.plot(a["dates"], series, label=f"{window}-day average")
+        rolling_ax.set_title("Points per day")
+        rolling_ax.legend(loc="upper left", fontsize=8)
+        weekday_ax.bar(WEEKDAYS, a["weekday_points"], color="#ADD8E6")
+        weekday_ax.set_title("Average points by weekday")
+        ratio_ax.plot(a["weeks"], a["week_good_ratio"], color="#2E8B57")
+        ratio_ax.set_ylim(0, 1)
+        ratio_ax.set_title("Share of good habits per week")
+        self.analytics_canvas.draw_idle()
+
+    # ---------- History ----------
+    def refresh_history(self):
+        username = self.current_user["username"]
+
+        def load():
+            return count_logs(username), fetch_history(username, 0, None, 0)
+        self.db.submit("history", load, on_done=self.reset_history, key="history")
+
+    def build_history_view(self):
+        self.history_summary_var = tk.StringVar()
+        ttk.Label(self.history_tab, textvariable=self.history_summary_var, padding=12,
+                  font=("Arial", 12)).pack(anchor="w")
+        body = ttk.Frame(self.history_tab, padding=(12, 0, 12, 12))
+        body.pack(fill="both", expand=True)
+        self.history_scrollbar = ttk.Scrollbar(body, orient="vertical", command=self.on_history_scrollbar)
+        self.history_scrollbar.pack(side="right", fill="y")
+        rows = tk.Frame(body)
+        rows.pack(side="left", fill="both", expand=True)
+        rows.grid_columnconfigure(2, weight=1)
+        self.history_blank_bg = rows.cget("bg")
+        # A fixed set of labels, refilled with whichever rows are in view
+        self.history_slots = []
+        for r in range(HISTORY_ROWS):
+            labels = (tk.Label(rows, width=11, anchor="w", font=("Courier", 11)),
+                      tk.Label(rows, width=6, anchor="w", font=("Courier", 11)),
+                      tk.Label(rows, anchor="w", font=("Arial", 11)),
+                      tk.Label(rows, width=9, anchor="e", font=("Courier", 11)))
+            for column, label in enumerate(labels):
+                label.grid(row=r, column=column, sticky="ew", ipady=2)
+            self.history_slots.append(labels)
+        self.history_shown = [None] * HISTORY_ROWS  # what each slot currently displays
+        for widget in (rows, *(label for labels in self.history_slots for label in labels)):
+            widget.bind("<MouseWheel>", self.on_history_wheel)
+            widget.bind("<Button-4>", lambda e: self.scroll_history(self.history_top - 3))
+            widget.bind("<Button-5>", lambda e: self.scroll_history(self.history_top + 3))
+
+    def reset_history(self, result):
+        if not self.current_user or not self.history_tab.winfo_exists():
+            return
+        if self.history_slots is None:
+            self.build_history_view()
+        total, (_, cursors, rows) = result
+        newest = rows[0] if rows else None
+        pages = self.history_pages
+        if pages is not None and pages.total == total and pages.newest == newest:
+            # Nothing logged or undone: the cursors still hold, but cached rows may be stale (e.g. rebalanced)
+            pages.pages.clear()
+        else:
+            pages = self.history_pages = HistoryPages(total, newest)
+            self.history_top = 0
+        pages.store(0, 0, cursors, rows)
+        self.history_loading = None
+        self.render_history()
+
+    def load_history_page(self, page):
+        pages = self.history_pages
+        start, cursor = pages.start_for(page)
+        self.history_loading = page
+
+        def done(result):
+            if pages is not self.history_pages:
+                return  # the history was reloaded meanwhile
+            self.history_loading = None
+            reached, _, rows = result
+            if len(rows) < HISTORY_PAGE:
+                pages.total = reached * HISTORY_PAGE + len(rows)  # the end moved (e.g. an undo elsewhere)
+            pages.store(start, *result)
+            self.render_history()
+        self.db.submit("history_page", fetch_history, self.current_user["username"], start, cursor, page,
+                       on_done=done, key="history_page")
+
+    @metrics.timed("ui.render_history")
+    def render_history(self):
+        if not self.current_user or not self.history_tab.winfo_exists():
+            return
+        pages = self.history_pages
+        top = self.history_top = max(0, min(self.history_top, pages.total - HISTORY_ROWS))
+        rows = pages.rows(top, HISTORY_ROWS)
+        for i, labels in enumerate(self.history_slots):
+            row = rows[i] if i < len(rows) else None
+            shown = row or ("loading" if i < len(rows) else None)
+            if shown == self.history_shown[i]:
+                continue  # recycled slot already shows this row
+            self.history_shown[i] = shown
+            if row:
+                date, time_of_day, habit, points, good = row
+                texts, bg = (date, time_of_day, habit, f"{points:+} pts"), "#ADD8E6" if good else "#FFB6B6"
+            else:
+                texts, bg = ("…" if shown else "", "", "", ""), self.history_blank_bg
+            for label, text in zip(labels, texts):
+                label.config(text=text, bg=bg)
+        if pages.total:
+            self.history_scrollbar.set(top / pages.total, min(1.0, (top + HISTORY_ROWS) / pages.total))
+            self.history_summary_var.set(f"{pages.total:,} logs, newest first   "
+                                         f"Showing {top + 1:,}-{min(top + HISTORY_ROWS, pages.total):,}")
+        else:
+            self.history_scrollbar.set(0, 1)
+            self.history_summary_var.set("No habits logged yet.")
+        page = pages.missing(top, HISTORY_ROWS)
+        if page is not None and page != self.history_loading:
+            self.load_history_page(page)
+
+    def scroll_history(self, top):
+        if self.history_pages is not None:
+            self.history_top = top
+            self.render_history()
+
+    def on_history_scrollbar(self, action, amount, unit=None):
+        if self.history_pages is None:
+            return
+        if action == "moveto":
+            self.scroll_history(int(float(amount) * self.history_pages.total))
+        else:
+            self.scroll_history(self.history_top + int(amount) * (HISTORY_ROWS if unit == "pages" else 1))
+
+    def on_history_wheel(self, event):
+        # Windows reports multiples of 120 per notch, macOS a few units
+        notches = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+        self.scroll_history(self.history_top - 3 * notches)
+
+    # ---------- Diagnostics ----------
+    def show_diagnostics(self):
+        """Ctrl+Shift+D: latency percentiles per operation, the slow-operation log and DB calls per action."""
+        window = tk.Toplevel(self.root)
+        window.title("Diagnostics")
+        text = tk.Text(window, width=100, height=30, font=("Courier", 10))
+        text.pack(fill="both", expand=True, padx=8, pady=8)
+
+        def render():
+            snap = metrics.snapshot()
+            text.config(state="normal")
+            text.delete("1.0", tk.END)
+            text.insert(tk.END, f"{'operation':<40}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}\n")
+            for op, s in snap["ops"].items():
+                text.insert(tk.END, f"{op:<40}{s['count']:>8}{s['p50_ms']:>10}{s['p95_ms']:>10}"
+                                    f"{s['p99_ms']:>10}{s['max_ms']:>10}\n")
+            text.insert(tk.END, f"\nSlower than {snap['slow_ms']} ms (most recent last):\n")
+            for entry in snap["slow"]:
+                text.insert(tk.END, f"{entry['at']}  {entry['op']:<40}{entry['ms']:>10}  {entry['detail'] or ''}\n")
+            text.insert(tk.END, "\nDB calls per action (last run):\n")
+            for name, count in sorted(db_calls.last.items()):
+                text.insert(tk.END, f"{name:<40}{count:>8}\n")
+            text.config(state="disabled")
+
+        def save(kind):
+            ext = ".prom" if kind == "prometheus" else ".json"
+            path = filedialog.asksaveasfilename(parent=window, defaultextension=ext,
+                                                initialfile=f"habit_metrics{ext}")
+            if path:
+                metrics.dump(path)
+
+        def reset():
+            metrics.reset()
+            render()
+
+        buttons = tk.Frame(window)
+        buttons.pack(pady=(0, 8))
+        ttk.Button(buttons, text="Refresh", command=render).pack(side="left", padx=4)
+        ttk.Button(buttons, text="Save JSON...", command=lambda: save("json")).pack(side="left", padx=4)
+        ttk.Button(buttons, text="Save Prometheus...", command=lambda: save("prometheus")).pack(side="left", padx=4)
+        ttk.Button(buttons, text="Reset", command=reset).pack(side="left", padx=4)
+        render()
 
     # ---------- Utility ----------
     def clear_screen(self):
@@ -663,111 +1137,301 @@ class HabitGameApp:
     def logout(self):
         self.clear_remembered_user()
         self.current_user = None
+        self.snapshot = None
         self.show_login_screen()
 
+    @metrics.timed("ui.refresh_dashboard")
     def refresh_dashboard(self):
-        self.current_user = get_user_stats(self.current_user["username"])
+        self.db.submit("refresh", load_dashboard_snapshot, self.current_user["username"],
+                       self.displayed_year, self.displayed_month,
+                       on_done=self.render_snapshot, key="refresh")
+
+    @metrics.timed("ui.render_snapshot")
+    def render_snapshot(self, snapshot):
+        user = snapshot["user"]
+        if not self.current_user or not user or user["username"] != self.current_user["username"]:
+            return  # logged out (or switched user) while the snapshot was loading
+        self.snapshot = snapshot
+        self.current_user = snapshot["user"]
         pts = self.current_user.get("points", 0)
         lvl = self.current_user.get("level", 1)
         streak = self.current_user.get("streak", 0)
         self.points_var.set(f"Points: {pts}")
         self.level_var.set(f"Level: {lvl}")
-        self.streak_var.set(f"Streak: {streak}")
+        longest = self.current_user.get("longest_streak") or streak
+        self.streak_var.set(f"Streak: {streak} (best {longest})")
 
-        recent_logs = get_logs_for_user(self.current_user["username"], limit=5)
         self.recent_box.config(state="normal")
         self.recent_box.delete("1.0", tk.END)
-        for l in recent_logs:
+        for l in snapshot["recent_logs"]:
             self.recent_box.insert(tk.END, f"{l['date']}: {l['habit']} ({l['points']} pts)\n")
         self.recent_box.config(state="disabled")
 
         # Ensure habit buttons and today's chart reflect the latest DB state.
         try:
             # Update button enabled/disabled states based on today's logs
-            self.update_habit_buttons_state()
+            self.update_habit_buttons_state(snapshot["logged_today"])
         except Exception:
             # Fail-safe: don't crash UI if update fails
             pass
 
         try:
             # Update the daily pie chart (if any logs for today)
-            self.update_daily_pie_chart()
+            self.update_daily_pie_chart(snapshot["today"])
         except Exception:
             pass
 
-        # Refresh the monthly calendar (rebuilds calendar tiles)
-        self.show_monthly_calendar()
-    def handle_habit_click(self, habit_name):
-        today = datetime.date.today().isoformat()
-        logs = get_logs_for_user(self.current_user["username"])
-        
-        # Prevent double logging
-        for l in logs:
-            if l['habit'] == habit_name and l['date'] == today:
-                messagebox.showinfo("Already Logged", f"You've already logged '{habit_name}' today!")
-                return
+        # Refresh the monthly calendar (updates changed tiles only) unless the user navigated meanwhile
+        if (snapshot["year"], snapshot["month"]) == (self.displayed_year, self.displayed_month):
+            self.show_monthly_calendar(snapshot["month_totals"])
 
-        # Log the habit
-        add_habit_log_for_user(self.current_user["username"], habit_name)
-        self.refresh_dashboard()
-        self.update_daily_pie_chart()
+        # Ranks come from cached counts, so they follow every refresh without holding up the snapshot
+        self.db.submit("ranks", get_ranks, user["username"], on_done=self.render_ranks, key="ranks")
+        self.on_tab_changed()
 
-        # Disable the button after logging
+    def handle_habit_click(self, habit_name):
+        # Prevent double logging, using the snapshot the buttons were rendered from
+        if not self.snapshot or habit_name in self.snapshot["logged_today"]:
+            messagebox.showinfo("Already Logged", f"You've already logged '{habit_name}' today!")
+            return
+
+        # Grey the button out right away; the write itself is never cancelled, only the refresh after it
+        self.snapshot["logged_today"].append(habit_name)
         if habit_name in self.habit_buttons:
             self.habit_buttons[habit_name].config(state="disabled", bg="#D3D3D3")
-
+        self.db.submit("habit_click", add_habit_log_for_user, self.current_user["username"], habit_name,
+                       on_done=lambda points: self.refresh_dashboard(),
+                       on_error=lambda error: self.log_failed([habit_name], error))
+
+    def log_failed(self, habit_names, error):
+        """Undo the optimistic greying-out of habits whose write failed, and say why."""
+        if isinstance(error, AlreadyLoggedError):
+            # Logged elsewhere meanwhile (another device): a refresh shows it as logged
+            messagebox.showinfo("Already Logged", str(error))
+            if self.current_user:
+                self.refresh_dashboard()
+        else:
+            if self.snapshot:
+                for name in habit_names:
+                    if name in self.snapshot["logged_today"]:
+                        self.snapshot["logged_today"].remove(name)
+                    if name in self.habit_buttons:
+                        self.habit_buttons[name].config(state="normal", bg=self.habit_colors[name])
+            messagebox.showerror("Not Logged", f"Could not log {', '.join(habit_names)}:\n{error}")
+
+    def show_batch_log(self):
+        """End-of-day entry: tick several habits and log them in one go."""
+        if not self.snapshot:
+            return
+        remaining = [name for name in self.habit_buttons if name not in self.snapshot["logged_today"]]
+        if not remaining:
+            messagebox.showinfo("All Logged", "Every habit is already logged today!")
+            return
+        window = tk.Toplevel(self.root)
+        window.title("Log Several Habits")
+        window.grab_set()
+        ttk.Label(window, text="Tick the habits to log for today:", font=("Arial", 12, "bold")).pack(anchor="w", padx=12, pady=8)
+        ticked = {}
+        for name in remaining:
+            ticked[name] = tk.BooleanVar(value=False)
+            ttk.Checkbutton(window, text=name, variable=ticked[name]).pack(anchor="w", padx=20)
+
+        def log_ticked():
+            names = [name for name, var in ticked.items() if var.get()]
+            window.destroy()
+            if not names:
+                return
+            for name in names:
+                self.snapshot["logged_today"].append(name)
+                self.habit_buttons[name].config(state="disabled", bg="#D3D3D3")
+            self.db.submit("batch_log", add_habit_logs_for_user, self.current_user["username"], names,
+                           on_done=lambda points: self.refresh_dashboard(),
+                           on_error=lambda error: self.log_failed(names, error))
+        ttk.Button(window, text="Log Selected", command=log_ticked).pack(pady=10)
 
     def handle_undo_last(self):
         # Undo the last habit
-        undone = undo_last_habit_log(self.current_user["username"])
-        if undone:
-            self.refresh_dashboard()
-            self.update_daily_pie_chart()
-            self.update_habit_buttons_state()
-
-    def update_habit_buttons_state(self):
-        today = datetime.date.today().isoformat()
-        user_logs_today = [l['habit'] for l in get_logs_for_user(self.current_user['username']) if l['date'] == today]
+        def done(undone):
+            if undone:
+                self.refresh_dashboard()
+        self.db.submit("undo", undo_last_habit_log, self.current_user["username"], on_done=done)
 
+    def update_habit_buttons_state(self, user_logs_today):
         for habit, btn in getattr(self, 'habit_buttons', {}).items():
             if habit in user_logs_today:
                 btn.config(state="disabled", bg="#D3D3D3")
             else:
                 # Enable it if not logged today
-                h = habits_collection.find_one({"habit": habit})
-                color = "#E6F0FF" if h["type"] == "good" else "#FFE6E6"
-                btn.config(state="normal", bg=color)
-
-
-
-
-    def update_daily_pie_chart(self):
-            # Clear previous chart
-            for widget in self.chart_holder.winfo_children():
-                widget.destroy()
+                btn.config(state="normal", bg=self.habit_colors[habit])
+
+    @metrics.timed("ui.update_daily_pie_chart")
+    def update_daily_pie_chart(self, totals):
+            # One figure and canvas live for the whole dashboard; only the wedges change
+            counts = (totals.get("good", 0), totals.get("bad", 0)) if totals else None
+            if counts == self.pie_counts:
+                return  # today's good/bad split is unchanged, nothing to redraw
+            self.pie_counts = counts
+
+            if not counts or not any(counts):
+                # Nothing to show (no logs today, or every one undone)
+                if self.pie_canvas is not None:
+                    self.pie_canvas.get_tk_widget().pack_forget()
+                return
 
-            today = datetime.date.today()
-            logs = get_logs_for_user(self.current_user["username"])
-            today_logs = [l for l in logs if datetime.date.fromisoformat(l["date"]) == today]
+            if self.pie_canvas is None:
+                # First chart of the session: this is where matplotlib gets imported
+                from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+                from matplotlib.figure import Figure
+                startup.mark("import matplotlib")
+                fig = Figure(figsize=(3,3), dpi=80)
+                ax = fig.add_subplot(111)
+                self.pie_parts = ax.pie([1, 1], labels=["Good", "Bad"], colors=["#ADD8E6","#FFB6B6"], autopct='%1.0f%%')
+                ax.set_title("Today's Habits")
+                self.pie_canvas = FigureCanvasTkAgg(fig, master=self.chart_holder)
+
+            self.set_pie_counts(*counts)
+            widget = self.pie_canvas.get_tk_widget()
+            if not widget.winfo_manager():
+                widget.pack()
+            self.pie_canvas.draw_idle()
+
+    def set_pie_counts(self, good_count, bad_count):
+        """Move the existing wedges, labels and percentages to a new good/bad split."""
+        wedges, labels, pcts = self.pie_parts
+        total = good_count + bad_count
+        if not total:
+            for wedge, pct in zip(wedges, pcts):
+                wedge.set_theta2(wedge.theta1)
+                pct.set_text("")
+            return
+        theta = 0.0
+        for wedge, label, pct, count in zip(wedges, labels, pcts, (good_count, bad_count)):
+            span = 360.0 * count / total
+            wedge.set_theta1(theta)
+            wedge.set_theta2(theta + span)
+            mid = math.radians(theta + span / 2)
+            label.set_position((1.1 * math.cos(mid), 1.1 * math.sin(mid)))
+            label.set_horizontalalignment("left" if math.cos(mid) > 0 else "right")
+            pct.set_position((0.6 * math.cos(mid), 0.6 * math.sin(mid)))
+            pct.set_text(f"{100.0 * count / total:1.0f}%")
+            theta += span
 
-            if not today_logs:
-                return  # Nothing to show
 
-            good_count = sum(1 for l in today_logs if habits_collection.find_one({"habit": l["habit"]})["type"] == "good")
-            bad_count = sum(1 for l in today_logs if habits_collection.find_one({"habit": l["habit"]})["type"] == "bad")
+# ---------------- Run App ----------------
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Habit Game")
+    commands = parser.add_subparsers(dest="command")
+    parser.add_argument("--timings", action="store_true", help="print a phase-by-phase startup timing breakdown")
+    parser.add_argument("--profile", metavar="PATH",
+                        help="on exit, write latency histograms to PATH (JSON, or Prometheus text for .prom)")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), help="storage backend (default: habit_config.json or mongo)")
+    recompute = commands.add_parser("recompute", help="rebuild points, level and streak from the full log history")
+    recompute.add_argument("--user", help="only this user (default: every user)")
+    recompute.add_argument("--batch-size", type=int, default=500, help="users replayed per log cursor")
+    recompute.add_argument("--workers", type=int, help="worker processes (default: one per CPU; SQLite uses one)")
+    rebalance = commands.add_parser("rebalance", help="apply a habit's current point value to its past logs")
+    rebalance.add_argument("habit", help="habit name")
+    rebalance.add_argument("--points", type=int, help="value to apply (default: the habit's current value)")
+    rebalance.add_argument("--dry-run", action="store_true", help="only report the users and logs that would change")
+    rebalance.add_argument("--batch-size", type=int, default=500, help="users re-priced per update_many")
+    rebalance.add_argument("--workers", type=int, help="worker processes (default: one per CPU; SQLite uses one)")
+    migrate = commands.add_parser("migrate-logs", help="copy MongoDB logs into one bucket per user per month")
+    migrate.add_argument("--batch-size", type=int, default=500, help="users migrated per batch")
+    migrate.add_argument("--workers", type=int, help="worker processes (default: one per CPU)")
+    backfill = commands.add_parser("backfill-daily-totals", help="build the per-day rollup from existing logs")
+    backfill.add_argument("--batch-size", type=int, default=200, help="users grouped per server-side aggregation")
+    backfill.add_argument("--workers", type=int, default=4, help="batches aggregated in parallel")
+    importer = commands.add_parser("import-logs", help="bulk-import historical logs from a CSV or JSONL file")
+    importer.add_argument("path", help="file with user, habit and date/timestamp columns")
+    importer.add_argument("--format", choices=["csv", "jsonl"], help="default: from the file extension")
+    importer.add_argument("--batch-size", type=int, default=5000, help="rows per insert_many")
+    importer.add_argument("--workers", type=int, default=4, help="users recomputed in parallel")
+    exporter = commands.add_parser("export", help="stream logs or user stats to CSV, JSONL or Parquet")
+    exporter.add_argument("path", help="output file (a directory for Parquet); re-run to resume an interrupted export")
+    exporter.add_argument("--format", choices=["csv", "jsonl", "parquet"], help="default: from the file extension")
+    exporter.add_argument("--user", help="only this user's logs (default: every user)")
+    exporter.add_argument("--users", action="store_true", help="export user stats instead of logs")
+    exporter.add_argument("--batch-size", type=int, default=10000, help="rows fetched and written per batch")
+    return parser
+
+def run_recompute(args):
+    if not args.user:
+        recompute_all_users(batch_size=args.batch_size, workers=args.workers)
+        return
+    stats = recompute_user_stats(args.user)
+    print(f"♻️ {args.user}: {stats['points']} pts, streak {stats['streak']} (longest {stats['longest_streak']})")
+
+def run_rebalance(args):
+    try:
+        rebalance_habit(args.habit, args.points, dry_run=args.dry_run, batch_size=args.batch_size,
+                        workers=args.workers)
+    except ValueError as e:
+        raise SystemExit(f"⚠️ {e}")
 
-            fig = Figure(figsize=(3,3), dpi=80)
-            ax = fig.add_subplot(111)
-            ax.pie([good_count, bad_count], labels=["Good", "Bad"], colors=["#ADD8E6","#FFB6B6"], autopct='%1.0f%%')
-            ax.set_title("Today's Habits")
+def run_migrate_logs(args):
+    try:
+        migrate_logs_to_buckets(batch_size=args.batch_size, workers=args.workers)
+    except ValueError as e:
+        raise SystemExit(f"⚠️ {e}")
 
-            canvas = FigureCanvasTkAgg(fig, master=self.chart_holder)
-            canvas.draw()
-            canvas.get_tk_widget().pack()
+def run_backfill_daily_totals(args):
+    backfill_daily_totals(batch_size=args.batch_size, workers=args.workers)
 
+def run_import_logs(args):
+    from habit_io import import_logs
+    import_logs(args.path, args.format, batch_size=args.batch_size, workers=args.workers)
 
-# ---------------- Run App ----------------
-root = tk.Tk()
-app = HabitGameApp(root)
-threading.Thread(target=run_scheduler, daemon=True).start()
-root.mainloop()
+def run_export(args):
+    from habit_io import export_logs, export_users
+    if args.users:
+        export_users(args.path, args.format, batch_size=args.batch_size)
+    else:
+        export_logs(args.path, args.format, username=args.user, batch_size=args.batch_size)
+
+COMMANDS = {
+    "recompute": run_recompute,
+    "rebalance": run_rebalance,
+    "migrate-logs": run_migrate_logs,
+    "backfill-daily-totals": run_backfill_daily_totals,
+    "import-logs": run_import_logs,
+    "export": run_export,
+}
+
+def dump_profile(path):
+    metrics.dump(path)
+    print(f"📈 Latency profile written to {path}")
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    startup.enabled = args.timings
+    # Per-action DB call counts are debugging output: printed only when timing or profiling
+    db_calls.report = bool(args.timings or args.profile)
+    if args.profile:
+        atexit.register(dump_profile, args.profile)
+    config = load_config()
+    if args.backend:
+        config["backend"] = args.backend
+    if args.command:
+        # The offline journal belongs to the GUI; maintenance commands write straight through
+        config["journal_path"] = None
+    configure_storage(config)
+    if args.command:
+        ensure_bootstrapped()
+        COMMANDS[args.command](args)
+        return
+    # Connection check, seeding and index verification run while the window comes up
+    bootstrap_in_background()
+    root = tk.Tk()
+    startup.mark("create Tk root")
+    app = HabitGameApp(root)
+    startup.mark("build first screen")
+
+    def first_frame():
+        startup.mark("first window drawn")
+        if startup.enabled:
+            startup.report()
+    root.after_idle(first_frame)
+    root.mainloop()
+
+if __name__ == "__main__":
+    main()
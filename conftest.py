@@ -0,0 +1,36 @@
+"""Shared fixtures: MongoDB-backed storage runs against mongomock, so no server is needed."""
+import pytest
+
+import habit_storage
+
+@pytest.fixture(autouse=True)
+def _reset_storage():
+    yield
+    habit_storage._storage = None  # the next test configures its own database
+
+@pytest.fixture
+def mongo_config(monkeypatch, tmp_path):
+    """Config for a fresh mongomock database; tests tweak it (journal_path, mongo_schema) before configuring."""
+    mongomock = pytest.importorskip("mongomock")
+    from mongomock.collection import BulkOperationBuilder
+    from mongomock.store import ServerStore
+    # pymongo 4.9+ passes a `sort` option mongomock does not know about
+    for name in ("add_update", "add_replace"):
+        add = getattr(BulkOperationBuilder, name)
+        monkeypatch.setattr(BulkOperationBuilder, name,
+                            lambda self, *args, sort=None, add=add, **kwargs: add(self, *args, **kwargs))
+    # Clients share one server, as reconfigured storages (e.g. the bucket migration) do against a real one
+    store = ServerStore()
+    monkeypatch.setattr(habit_storage, "MongoClient",
+                        lambda *args, **kwargs: mongomock.MongoClient(*args, _store=store, **kwargs))
+    # mongomock has no `hello` command; it behaves like a standalone server without transactions
+    monkeypatch.setattr(habit_storage.MongoStorage, "transactions_supported", lambda self: False)
+    return {"backend": "mongo", "mongo_uri": "mongodb://localhost", "mongo_db": f"test_{tmp_path.name}",
+            "journal_path": None}
+
+@pytest.fixture
+def mongo_storage(mongo_config):
+    storage = habit_storage.configure_storage(mongo_config)
+    storage.ensure_bootstrapped()
+    storage.create_user("ana", "pw")
+    return storage
@@ -0,0 +1,175 @@
+"""Vectorized analytics over a user's whole log history.
+
+A user's logs are streamed from the backend once into three parallel NumPy
+columns (day index, habit id, points); every statistic behind the Analytics
+tab is then a handful of array operations over those columns, so a five-year
+history costs milliseconds instead of a Python loop per log. Nothing here
+imports tkinter or matplotlib.
+"""
+import datetime
+
+import numpy as np
+
+from habit_metrics import metrics
+from habit_storage import get_storage
+
+ROLLING_WINDOWS = (7, 30)
+WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+# ---------------- Columnar History ----------------
+class LogArrays:
+    """One user's history as columns: day (days since `start`), habit id, points.
+
+    `habits[i]` and `good[i]` are the name and type of habit id i; `days` is
+    the number of calendar days from `start` to `end` inclusive.
+    """
+    def __init__(self, start, end, day, habit, points, habits, good):
+        self.start = start
+        self.end = end
+        self.day = day
+        self.habit = habit
+        self.points = points
+        self.habits = habits
+        self.good = good
+        self.days = (end - start).days + 1 if start else 0
+
+    def __len__(self):
+        return len(self.day)
+
+    @classmethod
+    def from_columns(cls, dates, names, points, habit_type, today=None):
+        """Build from raw columns: ISO date strings, habit names and points.
+
+        `habit_type(name)` returns "good"/"bad", or None for a habit no longer
+        in the catalog (its points' sign decides then).
+        """
+        today = today or datetime.date.today()
+        if not dates:
+            empty = np.empty(0, dtype=np.int32)
+            return cls(None, today, empty, empty, empty, [], np.empty(0, dtype=bool))
+        stamps = np.array(dates, dtype="datetime64[D]")
+        first = stamps.min()
+        start = first.astype(datetime.date)
+        end = max(today, stamps.max().astype(datetime.date))
+        day = (stamps - first).astype(np.int32)
+        # Habit ids in order of first appearance; a dict beats sorting the strings
+        ids = {}
+        habit = np.array([ids.setdefault(name, len(ids)) for name in names], dtype=np.int32)
+        habits = list(ids)
+        points = np.array(points, dtype=np.int32)
+        # Type per habit id; the catalog knows, deleted habits fall back to the sign of their points
+        good = np.array([habit_type(name) == "good" for name in habits], dtype=bool)
+        unknown = np.array([habit_type(name) is None for name in habits], dtype=bool)
+        if unknown.any():
+            net = np.bincount(habit, weights=points, minlength=len(habits))
+            good[unknown] = net[unknown] > 0
+        return cls(start, end, day, habit, points, habits, good)
+
+@metrics.timed("analytics.load")
+def load_log_arrays(username, storage=None, today=None):
+    """Load a user's logs into a LogArrays with one narrow backend query."""
+    storage = storage or get_storage()
+    dates, names, points = storage.log_columns(username)
+
+    def habit_type(name):
+        habit = storage.get_habit(name)
+        return habit["type"] if habit else None
+    return LogArrays.from_columns(dates, names, points, habit_type, today)
+
+# ---------------- Statistics ----------------
+def rolling_mean(values, window):
+    """Trailing mean over `window` entries; the first window-1 use what exists so far."""
+    totals = np.cumsum(values, dtype=np.float64)
+    totals[window:] = totals[window:] - totals[:-window]
+    return totals / np.minimum(np.arange(1, len(values) + 1), window)
+
+def runs(active):
+    """(start, length) of each run of True in a boolean array, in order."""
+    edges = np.diff(np.concatenate(([0], active.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    return starts, np.flatnonzero(edges == -1) - starts
+
+def habit_streaks(logs):
+    """Longest run of consecutive days per habit id (0 for habits never logged)."""
+    longest = np.zeros(len(logs.habits), dtype=np.int32)
+    if not len(logs):
+        return longest
+    # One key per (habit, day) logged; sorted, a run continues while the key grows by exactly 1
+    keys = np.unique(logs.habit.astype(np.int64) * logs.days + logs.day)
+    habit = keys // logs.days
+    breaks = np.flatnonzero((np.diff(keys) != 1) | (np.diff(habit) != 0)) + 1
+    starts = np.concatenate(([0], breaks))
+    lengths = np.diff(np.concatenate((starts, [len(keys)])))
+    np.maximum.at(longest, habit[starts], lengths)
+    return longest
+
+@metrics.timed("analytics.compute")
+def compute_analytics(logs):
+    """Everything the Analytics tab shows, from one LogArrays.
+
+    Series are NumPy arrays indexed by day ("dates") or by week starting
+    Monday ("weeks", the first one containing logs.start).
+    """
+    if not len(logs):
+        return None
+    days = logs.days
+    day_points = np.bincount(logs.day, weights=logs.points, minlength=days)
+    active = np.bincount(logs.day, minlength=days) > 0
+    is_good = logs.good[logs.habit]
+
+    # Per habit: distinct days logged against the days since its first log
+    pairs = np.unique(logs.habit.astype(np.int64) * days + logs.day)
+    habit_days = np.bincount(pairs // days, minlength=len(logs.habits))
+    first_day = np.full(len(logs.habits), days, dtype=np.int64)
+    np.minimum.at(first_day, logs.habit, logs.day)
+    completion = habit_days / (days - first_day)
+
+    # Weekday pattern: average points and logs per calendar weekday over the whole span
+    first_weekday = logs.start.weekday()
+    weekday_of_day = (np.arange(days) + first_weekday) % 7
+    weekday_count = np.bincount(weekday_of_day, minlength=7)
+    log_weekday = weekday_of_day[logs.day]
+    weekday_points = np.bincount(log_weekday, weights=logs.points, minlength=7) / weekday_count
+    weekday_logs = np.bincount(log_weekday, minlength=7) / weekday_count
+
+    # Good share of logs per week
+    week = (logs.day + first_weekday) // 7
+    weeks = (days - 1 + first_weekday) // 7 + 1
+    week_good = np.bincount(week, weights=is_good, minlength=weeks)
+    week_total = np.bincount(week, minlength=weeks)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        week_good_ratio = np.where(week_total > 0, week_good / week_total, np.nan)
+
+    # Streaks: runs of consecutive days with any log, the same rule as the streak counter
+    run_starts, run_lengths = runs(active)
+    longest = habit_streaks(logs)
+    still_running = len(run_starts) and run_starts[-1] + run_lengths[-1] >= days - 1
+
+    return {
+        "start": logs.start,
+        "end": logs.end,
+        "days": days,
+        "logs": len(logs),
+        "active_days": int(active.sum()),
+        "total_points": int(logs.points.sum()),
+        "good_logs": int(is_good.sum()),
+        "bad_logs": int(len(logs) - is_good.sum()),
+        "dates": np.datetime64(logs.start) + np.arange(days),
+        "weeks": np.datetime64(logs.start - datetime.timedelta(days=first_weekday)) + 7 * np.arange(weeks),
+        "day_points": day_points,
+        "rolling": {w: rolling_mean(day_points, w) for w in ROLLING_WINDOWS},
+        "weekday_points": weekday_points,
+        "weekday_logs": weekday_logs,
+        "week_good_ratio": week_good_ratio,
+        "habits": [
+            {"habit": name, "type": "good" if logs.good[i] else "bad", "days": int(habit_days[i]),
+             "completion": float(completion[i]), "longest_streak": int(longest[i])}
+            for i, name in enumerate(logs.habits)
+        ],
+        "streaks": [(logs.start + datetime.timedelta(days=int(s)), int(n)) for s, n in zip(run_starts, run_lengths)],
+        "longest_streak": int(run_lengths.max()) if len(run_lengths) else 0,
+        "current_streak": int(run_lengths[-1]) if still_running else 0,
+    }
+
+def user_analytics(username, storage=None, today=None):
+    return compute_analytics(load_log_arrays(username, storage, today))
@@ -0,0 +1,234 @@
+"""Benchmarks for the backend hot paths on synthetic datasets.
+
+Each profile seeds a throwaway database with synthetic users and log
+histories, then times the calls behind the UI: logging a habit, undo, the
+recent-logs list, the month aggregation behind show_monthly_calendar, and the
+full refresh_dashboard data load, plus the Analytics tab's whole-history load and
+one History tab page. Results are written as JSON; pass an earlier
+results file with --compare to flag regressions (exit status 1).
+
+    python habit_bench.py                                  # in-memory SQLite stand-in
+    python habit_bench.py --backend mongo --profile 1k     # local mongod, database habit_bench
+    python habit_bench.py --out new.json --compare old.json
+"""
+import argparse
+import datetime
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+
+from habit_analytics import user_analytics
+from habit_storage import (
+    db_calls, configure_storage, PREDEFINED_HABITS,
+    add_habit_log_for_user, undo_last_habit_log, get_logs_for_user, get_month_totals, load_dashboard_snapshot,
+    get_logs_page, page_cursor,
+)
+
+# ---------------- Profiles ----------------
+# name -> (users, min logs per user, max logs per user); history lengths are
+# drawn log-uniformly between the bounds, and the first user always gets the max.
+PROFILES = {
+    "1": (1, 100_000, 100_000),
+    "1k": (1_000, 10, 10_000),
+    "100k": (100_000, 10, 100),
+}
+LOGS_PER_DAY = 5
+SEED_BATCH = 10_000
+
+def bench_config(backend, profile, mongo_uri):
+    if backend == "mongo":
+        return {"backend": "mongo", "mongo_uri": mongo_uri, "mongo_db": "habit_bench", "journal_path": None}
+    # A fresh name per run: shared in-memory databases live as long as any connection to them
+    return {"backend": "sqlite", "sqlite_path": f"file:habit_bench_{profile}_{uuid.uuid4().hex}?mode=memory&cache=shared"}
+
+def history_lengths(users, low, high, rng):
+    yield high
+    for _ in range(users - 1):
+        yield int(math.exp(rng.uniform(math.log(low), math.log(high))))
+
+def seed(storage, users, low, high, rng):
+    """Fill an empty database; returns (heavy user, typical user, total logs)."""
+    if storage.name == "mongo":
+        storage.client.drop_database(storage.db.name)
+    storage.ensure_bootstrapped()
+    names = [f"bench{i:06d}" for i in range(users)]
+    for i in range(0, users, SEED_BATCH):
+        storage.insert_users([{"username": n, "password": "bench"} for n in names[i:i + SEED_BATCH]])
+
+    habits = [(h["habit"], h["points"]) for h in PREDEFINED_HABITS]
+    today = datetime.date.today()
+    lengths = list(history_lengths(users, low, high, rng))
+    total = 0
+    batch = []
+    for username, length in zip(names, lengths):
+        # ~LOGS_PER_DAY logs a day, ending yesterday, oldest first
+        first_day = today - datetime.timedelta(days=math.ceil(length / LOGS_PER_DAY))
+        for i in range(length):
+            day = first_day + datetime.timedelta(days=i // LOGS_PER_DAY)
+            habit, points = rng.choice(habits)
+            batch.append({"user": username, "habit": habit, "points": points, "date": day.isoformat(),
+                          "timestamp": datetime.datetime.combine(day, datetime.time(8 + i % LOGS_PER_DAY))})
+            if len(batch) >= SEED_BATCH:
+                total += storage.insert_logs(batch)
+                batch = []
+    if batch:
+        total += storage.insert_logs(batch)
+    storage.backfill_daily_totals(names, batch_size=1000)
+
+    typical = names[lengths.index(sorted(lengths)[len(lengths) // 2])]
+    for username in {names[0], typical}:
+        storage.recompute_user_stats(username)
+    return names[0], typical, total
+
+# ---------------- Timing ----------------
+def timed(name, fn, repeat, reset=None):
+    """Time `repeat` calls of fn; `reset`, if given, runs untimed after each one."""
+    reset = reset or (lambda: None)
+    fn()  # warm caches (catalog, prepared statements, connection)
+    reset()
+    samples = []
+    for _ in range(repeat):
+        with db_calls.action(name, report=False):
+            started = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - started) * 1000)
+        reset()
+    samples.sort()
+    return {
+        "median_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        "mean_ms": round(statistics.fmean(samples), 3),
+        "min_ms": round(samples[0], 3),
+        "db_calls": db_calls.last[name],
+        "runs": repeat,
+    }
+
+def bench_user(username, repeat):
+    today = datetime.date.today()
+    habit = PREDEFINED_HABITS[0]["habit"]
+    results = {}
+    # A habit counts once a day, so each timed add is undone (and each timed undo
+    # re-added) untimed; the dataset ends where it started
+    add = lambda: add_habit_log_for_user(username, habit)
+    undo = lambda: undo_last_habit_log(username)
+    results["add_habit_log_for_user"] = timed("add", add, repeat, reset=undo)
+    add()
+    results["undo_last_habit_log"] = timed("undo", undo, repeat, reset=add)
+    results["get_logs_for_user"] = timed("get_logs", lambda: get_logs_for_user(username), repeat)
+    # A page behind a cursor, as the History tab reads them while scrolling
+    cursor = page_cursor(get_logs_page(username))
+    results["history_page"] = timed("history", lambda: get_logs_page(username, cursor), repeat)
+    results["month_totals"] = timed("month", lambda: get_month_totals(username, today.year, today.month), repeat)
+    results["refresh_dashboard_load"] = timed(
+        "refresh", lambda: load_dashboard_snapshot(username, today.year, today.month), repeat)
+    results["analytics"] = timed("analytics", lambda: user_analytics(username), repeat)
+    undo_last_habit_log(username)
+    return results
+
+def run_profile(name, backend, mongo_uri, repeat, rng):
+    users, low, high = PROFILES[name]
+    storage = configure_storage(bench_config(backend, name, mongo_uri))
+    print(f"🌱 Seeding profile {name}: {users} users, {low}-{high} logs each...")
+    started = time.perf_counter()
+    heavy, typical, total = seed(storage, users, low, high, rng)
+    seed_seconds = time.perf_counter() - started
+    print(f"🌱 {total} logs seeded in {seed_seconds:.1f}s")
+    result = {
+        "dataset": {"users": users, "logs": total, "seed_seconds": round(seed_seconds, 2)},
+        "heavy_user": bench_user(heavy, repeat),
+    }
+    if typical != heavy:
+        result["typical_user"] = bench_user(typical, repeat)
+    if storage.name == "mongo":
+        storage.client.drop_database(storage.db.name)
+    return result
+
+# ---------------- Results ----------------
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_results(results):
+    for profile, result in results["profiles"].items():
+        print(f"\n📊 Profile {profile} ({result['dataset']['users']} users, {result['dataset']['logs']} logs)")
+        for who in ("heavy_user", "typical_user"):
+            for op, stats in result.get(who, {}).items():
+                print(f"   {who:<13} {op:<24} median {stats['median_ms']:>9.3f} ms   "
+                      f"p95 {stats['p95_ms']:>9.3f} ms   {stats['db_calls']} DB calls")
+
+def compare(results, baseline, threshold):
+    """Print median ratios against a baseline; returns the list of regressions."""
+    regressions = []
+    print(f"\n⚖️ Against {baseline['meta'].get('revision') or 'baseline'} (regression if > {threshold:.2f}x)")
+    for profile, result in results["profiles"].items():
+        base = baseline["profiles"].get(profile)
+        if not base:
+            continue
+        for who in ("heavy_user", "typical_user"):
+            for op, stats in result.get(who, {}).items():
+                old = base.get(who, {}).get(op)
+                if not old:
+                    continue
+                ratio = stats["median_ms"] / max(old["median_ms"], 1e-6)
+                flag = "❌" if ratio > threshold else "✅"
+                print(f"   {flag} {profile:<5} {who:<13} {op:<24} {old['median_ms']:.3f} -> {stats['median_ms']:.3f} ms"
+                      f" ({ratio:.2f}x)")
+                if ratio > threshold:
+                    regressions.append((profile, who, op, ratio))
+    return regressions
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Habit Tracker backend benchmarks")
+    parser.add_argument("--backend", choices=["sqlite", "mongo"], default="sqlite",
+                        help="sqlite runs against an in-memory stand-in (default); mongo uses database habit_bench")
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017/")
+    parser.add_argument("--profile", action="append", choices=sorted(PROFILES),
+                        help="dataset profile to run, repeatable (default: all)")
+    parser.add_argument("--repeat", type=int, default=50, help="timed runs per operation")
+    parser.add_argument("--seed", type=int, default=42, help="random seed for the synthetic data")
+    parser.add_argument("--out", default="bench_results.json", help="where to write the JSON results")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="median slowdown ratio counted as a regression")
+    return parser
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    rng = random.Random(args.seed)
+    results = {
+        "meta": {
+            "backend": args.backend,
+            "revision": git_revision(),
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "seed": args.seed,
+        },
+        "profiles": {},
+    }
+    for profile in args.profile or list(PROFILES):
+        results["profiles"][profile] = run_profile(profile, args.backend, args.mongo_uri, args.repeat, rng)
+    print_results(results)
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n💾 Results written to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"❌ {len(regressions)} regressions")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
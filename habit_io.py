@@ -0,0 +1,318 @@
+"""Bulk import and export of habit logs and user stats.
+
+Files are streamed row by row, so memory stays bounded by the batch size
+whatever the size of the history. Like habit_storage, nothing here imports
+tkinter.
+"""
+import csv
+import datetime
+import io
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from habit_storage import RECOMPUTE_BATCH, get_storage
+
+# ---------------- File formats ----------------
+FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".json": "jsonl"}
+
+def detect_format(path, fmt=None):
+    fmt = fmt or FORMATS.get(os.path.splitext(path)[1].lower())
+    if fmt is None:
+        raise ValueError(f"Cannot tell the format of {path}; pass csv or jsonl explicitly")
+    return fmt
+
+def read_rows(path, fmt=None):
+    """Yield one dict per log row of a CSV (with a header line) or JSONL file."""
+    fmt = detect_format(path, fmt)
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+# ---------------- Import ----------------
+IMPORT_ERRORS_SHOWN = 10
+
+def parse_log_row(row, catalog, usernames, line_no=0):
+    """Turn one imported row into a log dict, or raise ValueError saying why it is rejected.
+
+    Rows name the user ("user" or "username"), the habit, and a "date" and/or
+    "timestamp" in ISO format. Points always come from the catalog.
+    """
+    username = (row.get("user") or row.get("username") or "").strip()
+    if username not in usernames:
+        raise ValueError(f"unknown user {username!r}")
+    habit = catalog.get((row.get("habit") or "").strip())
+    if habit is None:
+        raise ValueError(f"unknown habit {row.get('habit')!r}")
+    timestamp = row.get("timestamp")
+    if timestamp:
+        timestamp = datetime.datetime.fromisoformat(str(timestamp))
+    date = row.get("date")
+    date = datetime.date.fromisoformat(str(date)) if date else timestamp.date() if timestamp else None
+    if date is None:
+        raise ValueError("missing date")
+    if timestamp is None:
+        # Date-only rows keep their file order within the day
+        timestamp = datetime.datetime.combine(date, datetime.time()) + datetime.timedelta(microseconds=line_no)
+    return {"user": username, "habit": habit["habit"], "points": int(habit["points"]),
+            "date": date.isoformat(), "timestamp": timestamp}
+
+def import_logs(path, fmt=None, batch_size=5000, workers=4, storage=None):
+    """Stream a log file into storage, then rebuild aggregates once per imported user.
+
+    A habit counts once per user per day, as when logging: rows whose habit is
+    already stored for that day, or earlier in the file, are skipped as
+    duplicates, so re-running an import adds nothing.
+
+    Returns {"read", "imported", "rejected", "duplicates", "users", "seconds"}.
+    """
+    storage = storage or get_storage()
+    storage.ensure_bootstrapped()
+    catalog = {h["habit"]: h for h in storage.build_habit_list()}
+    usernames = set(storage.list_usernames())
+    started = time.perf_counter()
+    read = imported = rejected = duplicates = 0
+    users = set()
+    batch = []
+
+    def flush():
+        nonlocal imported, duplicates, batch
+        # One read per batch; earlier batches are already in the stored logs
+        logged = storage.habits_logged_on_days({(log["user"], log["date"]) for log in batch})
+        fresh = []
+        for log in batch:
+            habits = logged.setdefault((log["user"], log["date"]), set())
+            if log["habit"] in habits:
+                duplicates += 1
+                continue
+            habits.add(log["habit"])
+            fresh.append(log)
+            users.add(log["user"])
+        imported += storage.insert_logs(fresh)
+        batch = []
+        elapsed = time.perf_counter() - started
+        print(f"📥 Imported {imported} logs ({imported / max(elapsed, 1e-9):,.0f} rows/s)")
+
+    for line_no, row in enumerate(read_rows(path, fmt), 1):
+        read += 1
+        try:
+            log = parse_log_row(row, catalog, usernames, line_no)
+        except (ValueError, TypeError) as e:
+            rejected += 1
+            if rejected <= IMPORT_ERRORS_SHOWN:
+                print(f"⚠️ Row {line_no} skipped: {e}")
+            continue
+        batch.append(log)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    if rejected > IMPORT_ERRORS_SHOWN:
+        print(f"⚠️ ... {rejected - IMPORT_ERRORS_SHOWN} more rows skipped")
+    if duplicates:
+        print(f"🔁 {duplicates} rows skipped: habit already logged by that user on that day")
+
+    # Points, level, streak and undo snapshots are rebuilt once per user, not per row
+    users = sorted(users)
+    batches = [users[i:i + RECOMPUTE_BATCH] for i in range(0, len(users), RECOMPUTE_BATCH)]
+    done = 0
+    with ThreadPoolExecutor(max_workers=workers if storage.parallel_writes else 1) as pool:
+        for count in pool.map(storage.recompute_users, batches):
+            done += count
+            print(f"♻️ Recomputed {done}/{len(users)} users")
+    if users:
+        storage.backfill_daily_totals(users, workers=workers if storage.parallel_writes else 1)
+
+    seconds = time.perf_counter() - started
+    print(f"✅ Import finished: {imported} logs for {len(users)} users, {rejected} rows skipped, "
+          f"{duplicates} duplicates in {seconds:.1f}s ({imported / max(seconds, 1e-9):,.0f} rows/s)")
+    return {"read": read, "imported": imported, "rejected": rejected, "duplicates": duplicates,
+            "users": len(users), "seconds": seconds}
+
+# ---------------- Export ----------------
+# Exports stream from a storage cursor and write each batch as it arrives, so
+# memory stays constant. After every durable batch a checkpoint file
+# (<output>.checkpoint) records the stream position; re-running the same export
+# picks up from there instead of starting over.
+LOG_FIELDS = ["user", "habit", "points", "date", "timestamp"]
+USER_FIELDS = ["username", "points", "level", "streak", "longest_streak", "last_action_date"]
+# Column type of every exportable field, for formats with a schema (Parquet); anything else is a string
+FIELD_TYPES = {"points": "int", "level": "int", "streak": "int", "longest_streak": "int", "timestamp": "timestamp"}
+EXPORT_FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".parquet": "parquet"}
+
+def _cell(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return value
+
+class TextExportWriter:
+    """CSV or JSONL output; resumes by truncating to the last checkpointed byte offset."""
+    def __init__(self, path, fmt, fields, state=None):
+        self.fmt = fmt
+        self.fields = fields
+        if state is None:
+            self.f = open(path, "wb")
+            if fmt == "csv":
+                self._write([fields])
+        else:
+            self.f = open(path, "r+b")
+            self.f.truncate(state["offset"])
+            self.f.seek(state["offset"])
+
+    def _write(self, lines):
+        buf = io.StringIO()
+        if self.fmt == "csv":
+            csv.writer(buf).writerows(lines)
+        else:
+            for line in lines:
+                buf.write(json.dumps(line) + "\n")
+        self.f.write(buf.getvalue().encode("utf-8"))
+
+    def write_batch(self, rows):
+        if self.fmt == "csv":
+            self._write([[_cell(row.get(f)) for f in self.fields] for row in rows])
+        else:
+            self._write([{f: _cell(row.get(f)) for f in self.fields} for row in rows])
+
+    def commit(self):
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        return {"offset": self.f.tell()}
+
+    def close(self):
+        self.f.close()
+
+class ParquetExportWriter:
+    """Parquet dataset directory of part files (pyarrow required).
+
+    A Parquet file cannot be appended to once closed, so a checkpoint is taken
+    each time a part of PART_ROWS rows is closed; resuming drops any unfinished part.
+    """
+    PART_ROWS = 1_000_000
+
+    def __init__(self, path, fields, state=None):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet export needs pyarrow: pip install pyarrow")
+        self.pa, self.pq = pa, pq
+        types = {"int": pa.int64(), "timestamp": pa.timestamp("us"), "string": pa.string()}
+        self.schema = pa.schema([(f, types[FIELD_TYPES.get(f, "string")]) for f in fields])
+        self.fields = fields
+        self.path = path
+        self.part = state["part"] if state else 0
+        os.makedirs(path, exist_ok=True)
+        for name in os.listdir(path):
+            if name.startswith("part-") and (state is None or int(name[5:10]) >= self.part):
+                os.remove(os.path.join(path, name))
+        self.writer = None
+        self.rows = 0
+
+    def _value(self, field, value):
+        timestamp = FIELD_TYPES.get(field) == "timestamp"
+        if timestamp and isinstance(value, str):
+            return datetime.datetime.fromisoformat(value)
+        if not timestamp and isinstance(value, (datetime.datetime, datetime.date)):
+            return value.isoformat()
+        return value
+
+    def write_batch(self, rows):
+        if self.writer is None:
+            part_path = os.path.join(self.path, f"part-{self.part:05d}.parquet")
+            self.writer = self.pq.ParquetWriter(part_path, self.schema)
+        columns = {f: [self._value(f, row.get(f)) for row in rows] for f in self.fields}
+        self.writer.write_table(self.pa.table(columns, schema=self.schema))
+        self.rows += len(rows)
+
+    def commit(self):
+        if self.rows < self.PART_ROWS:
+            return None
+        self._close_part()
+        return {"part": self.part}
+
+    def _close_part(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+            self.part += 1
+            self.rows = 0
+
+    def close(self):
+        self._close_part()
+
+def _save_checkpoint(path, checkpoint):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp, path)
+
+def _export(path, fmt, fields, stream, position, batch_size):
+    """Drive one export: stream(after) yields rows, position(after, row) advances the resume point."""
+    fmt = fmt or EXPORT_FORMATS.get(os.path.splitext(path)[1].lower())
+    if fmt not in ("csv", "jsonl", "parquet"):
+        raise ValueError(f"Cannot tell the export format of {path}; pass csv, jsonl or parquet")
+    checkpoint_path = path.rstrip("/\\") + ".checkpoint"
+    checkpoint = None
+    if os.path.exists(checkpoint_path) and os.path.exists(path):
+        with open(checkpoint_path) as f:
+            checkpoint = json.load(f)
+        print(f"⏩ Resuming export after {checkpoint['rows']} rows")
+    state = checkpoint["writer"] if checkpoint else None
+    if fmt == "parquet":
+        writer = ParquetExportWriter(path, fields, state)
+    else:
+        writer = TextExportWriter(path, fmt, fields, state)
+
+    after = checkpoint["after"] if checkpoint else None
+    rows = resumed = checkpoint["rows"] if checkpoint else 0
+    started = time.perf_counter()
+    batch = []
+    try:
+        for row in stream(after):
+            batch.append(row)
+            after = position(after, row)
+            if len(batch) >= batch_size:
+                writer.write_batch(batch)
+                rows += len(batch)
+                batch = []
+                writer_state = writer.commit()
+                if writer_state is not None:
+                    _save_checkpoint(checkpoint_path, {"after": after, "rows": rows, "writer": writer_state})
+                if rows % (batch_size * 10) == 0:
+                    elapsed = time.perf_counter() - started
+                    print(f"📤 Exported {rows} rows ({(rows - resumed) / max(elapsed, 1e-9):,.0f} rows/s)")
+        if batch:
+            writer.write_batch(batch)
+            rows += len(batch)
+    finally:
+        writer.close()
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    print(f"✅ Export finished: {rows} rows in {time.perf_counter() - started:.1f}s")
+    return rows
+
+def _log_position(after, row):
+    timestamp = _cell(row["timestamp"])
+    if after and after["user"] == row["user"] and after["timestamp"] == timestamp:
+        return {**after, "ids": after["ids"] + [str(row["_id"])]}
+    return {"user": row["user"], "timestamp": timestamp, "ids": [str(row["_id"])]}
+
+def export_logs(path, fmt=None, username=None, fields=LOG_FIELDS, batch_size=10000, storage=None):
+    """Export one user's logs (or everyone's) to CSV, JSONL or Parquet; returns the row count."""
+    storage = storage or get_storage()
+    return _export(path, fmt, fields,
+                   lambda after: storage.iter_logs(username, after, batch_size, fields),
+                   _log_position, batch_size)
+
+def export_users(path, fmt=None, batch_size=10000, storage=None):
+    """Export every user's points, level and streak (never passwords or PINs)."""
+    storage = storage or get_storage()
+    return _export(path, fmt, USER_FIELDS,
+                   lambda after: storage.iter_users(after, batch_size),
+                   lambda after, row: row["username"], batch_size)
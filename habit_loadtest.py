@@ -0,0 +1,149 @@
+"""Load test for habit_server.py.
+
+Signs up and logs in a pool of virtual users, then keeps `--concurrency`
+keep-alive connections busy for `--duration` seconds with a realistic mix of
+requests (mostly reads, some logs and undos). Prints requests/s and latency
+percentiles per endpoint; --out also saves them as JSON. Only the standard
+library is needed.
+
+    python habit_server.py --port 8080 &
+    python habit_loadtest.py --url http://127.0.0.1:8080 --users 200 --concurrency 64 --duration 30
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from urllib.parse import urlsplit
+
+# (weight, name, method, path, body) -- body may be a callable(rng, catalog)
+MIX = [
+    (40, "stats", "GET", "/api/stats", None),
+    (15, "month-totals", "GET", "/api/month-totals", None),
+    (5, "leaderboard", "GET", "/api/leaderboard?board=weekly", None),
+    (20, "log", "POST", "/api/logs", lambda rng, catalog: {"habit": rng.choice(catalog)}),
+    (10, "undo", "POST", "/api/undo", lambda rng, catalog: {}),
+    (10, "catalog", "GET", "/api/catalog", None),
+]
+
+class Connection:
+    """One HTTP/1.1 keep-alive connection speaking just enough of the protocol for the API."""
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body=None, token=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        payload = json.dumps(body).encode() if body is not None else b""
+        headers = [f"{method} {path} HTTP/1.1", f"Host: {self.host}", f"Content-Length: {len(payload)}"]
+        if token:
+            headers.append(f"Authorization: Bearer {token}")
+        if body is not None:
+            headers.append("Content-Type: application/json")
+        self.writer.write(("\r\n".join(headers) + "\r\n\r\n").encode() + payload)
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("server closed the connection")
+        status = int(status_line.split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode().partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+        data = await self.reader.readexactly(length) if length else b""
+        return status, json.loads(data) if data else None
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+async def prepare_users(host, port, count, prefix):
+    """Sign up (or reuse) `count` users and return their tokens."""
+    conn = Connection(host, port)
+    tokens = []
+    for i in range(count):
+        credentials = {"username": f"{prefix}{i:05d}", "password": "load"}
+        status, _ = await conn.request("POST", "/api/signup", credentials)
+        if status not in (201, 409):
+            raise RuntimeError(f"signup failed with HTTP {status}")
+        status, data = await conn.request("POST", "/api/login", credentials)
+        if status != 200:
+            raise RuntimeError(f"login failed with HTTP {status}")
+        tokens.append(data["token"])
+    _, catalog = await conn.request("GET", "/api/catalog")
+    conn.close()
+    return tokens, [h["habit"] for h in catalog]
+
+async def worker(host, port, tokens, catalog, deadline, rng, samples, errors):
+    conn = Connection(host, port)
+    weights = [w for w, *_ in MIX]
+    try:
+        while time.perf_counter() < deadline:
+            _, name, method, path, body = rng.choices(MIX, weights)[0]
+            started = time.perf_counter()
+            try:
+                status, _ = await conn.request(method, path, body(rng, catalog) if body else None,
+                                               rng.choice(tokens))
+            except (ConnectionError, asyncio.IncompleteReadError, OSError):
+                errors[name] = errors.get(name, 0) + 1
+                conn.close()
+                conn = Connection(host, port)
+                continue
+            samples.setdefault(name, []).append((time.perf_counter() - started) * 1000)
+            # 409 is the API refusing a habit already logged today, not a failure
+            if status >= 400 and status != 409:
+                errors[name] = errors.get(name, 0) + 1
+    finally:
+        conn.close()
+
+def percentile(sorted_samples, p):
+    return sorted_samples[min(len(sorted_samples) - 1, int(len(sorted_samples) * p))]
+
+async def run(args):
+    url = urlsplit(args.url)
+    host, port = url.hostname, url.port or 80
+    print(f"👥 Preparing {args.users} users...")
+    tokens, catalog = await prepare_users(host, port, args.users, args.prefix)
+    samples, errors = {}, {}
+    rng = random.Random(args.seed)
+    print(f"🚀 {args.concurrency} connections for {args.duration}s against {args.url}")
+    started = time.perf_counter()
+    deadline = started + args.duration
+    await asyncio.gather(*(worker(host, port, tokens, catalog, deadline, random.Random(rng.random()), samples, errors)
+                           for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+
+    total = sum(len(s) for s in samples.values())
+    report = {"url": args.url, "concurrency": args.concurrency, "seconds": round(elapsed, 2),
+              "requests": total, "rps": round(total / elapsed, 1), "errors": errors, "endpoints": {}}
+    print(f"\n📊 {total} requests in {elapsed:.1f}s = {total / elapsed:,.0f} req/s, {sum(errors.values())} errors")
+    for name in sorted(samples):
+        s = sorted(samples[name])
+        stats = {"requests": len(s), "p50_ms": round(statistics.median(s), 2),
+                 "p95_ms": round(percentile(s, 0.95), 2), "p99_ms": round(percentile(s, 0.99), 2)}
+        report["endpoints"][name] = stats
+        print(f"   {name:<14}{stats['requests']:>8}   p50 {stats['p50_ms']:>8.2f} ms   "
+              f"p95 {stats['p95_ms']:>8.2f} ms   p99 {stats['p99_ms']:>8.2f} ms   errors {errors.get(name, 0)}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Results written to {args.out}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test for the Habit Tracker HTTP API")
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--users", type=int, default=100, help="virtual users signed up and logged in")
+    parser.add_argument("--prefix", default="load", help="username prefix for the virtual users")
+    parser.add_argument("--concurrency", type=int, default=64, help="open keep-alive connections")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="also write the results as JSON")
+    asyncio.run(run(parser.parse_args(argv)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Latency instrumentation for Habit Tracker.
+
+Every instrumented operation (backend functions, MongoDB commands, UI render
+steps) feeds a Metrics registry: cumulative histogram buckets for Prometheus,
+a rolling window of recent samples for percentiles, and a log of operations
+slower than a threshold. Nothing here imports tkinter.
+"""
+import collections
+import datetime
+import functools
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+WINDOW = 1000  # recent samples kept per operation for percentiles
+SLOW_LOG_SIZE = 200
+SLOW_MS = 200
+
+class OpStats:
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * len(BUCKETS_MS)
+        self.recent = collections.deque(maxlen=WINDOW)
+
+    def add(self, ms):
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.recent.append(ms)
+        for i, bound in enumerate(BUCKETS_MS):
+            if ms <= bound:
+                self.buckets[i] += 1
+
+    def summary(self):
+        recent = sorted(self.recent)
+
+        def pct(p):
+            return round(recent[min(len(recent) - 1, int(len(recent) * p))], 3) if recent else None
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else None,
+            "p50_ms": pct(0.50),
+            "p95_ms": pct(0.95),
+            "p99_ms": pct(0.99),
+            "max_ms": round(self.max_ms, 3),
+        }
+
+class Metrics:
+    def __init__(self, slow_ms=SLOW_MS):
+        self.slow_ms = slow_ms
+        self._lock = threading.Lock()
+        self.ops = {}
+        self.slow = collections.deque(maxlen=SLOW_LOG_SIZE)
+
+    def observe(self, op, ms, detail=None):
+        with self._lock:
+            stats = self.ops.get(op)
+            if stats is None:
+                stats = self.ops[op] = OpStats()
+            stats.add(ms)
+            if ms >= self.slow_ms:
+                self.slow.append({"op": op, "ms": round(ms, 1), "detail": detail,
+                                  "at": datetime.datetime.now().isoformat(timespec="seconds"),
+                                  "thread": threading.current_thread().name})
+        if ms >= self.slow_ms:
+            print(f"🐢 {op} took {ms:.0f} ms" + (f" ({detail})" if detail else ""))
+
+    @contextmanager
+    def timer(self, op, detail=None):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(op, (time.perf_counter() - started) * 1000, detail)
+
+    def timed(self, op):
+        """Decorator recording each call of the function under `op`."""
+        def decorate(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.timer(op):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def reset(self):
+        with self._lock:
+            self.ops.clear()
+            self.slow.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "generated": datetime.datetime.now().isoformat(timespec="seconds"),
+                "slow_ms": self.slow_ms,
+                "ops": {op: stats.summary() for op, stats in sorted(self.ops.items())},
+                "slow": list(self.slow),
+            }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        """Prometheus text exposition format: one latency histogram labelled by operation."""
+        lines = [
+            "# HELP habit_op_latency_seconds Latency of Habit Tracker operations.",
+            "# TYPE habit_op_latency_seconds histogram",
+        ]
+        with self._lock:
+            for op, stats in sorted(self.ops.items()):
+                for bound, count in zip(BUCKETS_MS, stats.buckets):
+                    lines.append(f'habit_op_latency_seconds_bucket{{op="{op}",le="{bound / 1000:g}"}} {count}')
+                lines.append(f'habit_op_latency_seconds_bucket{{op="{op}",le="+Inf"}} {stats.count}')
+                lines.append(f'habit_op_latency_seconds_sum{{op="{op}"}} {stats.total_ms / 1000:.6f}')
+                lines.append(f'habit_op_latency_seconds_count{{op="{op}"}} {stats.count}')
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        """Write JSON, or the Prometheus text format when the path ends in .prom or .txt."""
+        text = self.to_prometheus() if path.endswith((".prom", ".txt")) else self.to_json()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+metrics = Metrics()
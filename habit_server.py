@@ -0,0 +1,245 @@
+"""Headless multi-user HTTP API for Habit Tracker.
+
+Serves a whole class or team from one host over the same storage backends as
+the desktop app. Tornado runs the event loop; backend calls run on a thread
+pool sized to the shared MongoClient's connection pool, so a slow query never
+blocks other requests. Nothing here imports tkinter or matplotlib.
+
+    python habit_server.py --port 8080 [--processes 0]
+
+Endpoints (JSON; all but login, signup and catalog need "Authorization: Bearer <token>"):
+
+    POST /api/signup        {"username", "password"}
+    POST /api/login         {"username", "password"}       -> {"token", "user"}
+    POST /api/logs          {"habit"} or {"habits": [...]} -> {"points": [...]}, 409 if already logged today
+    POST /api/undo                                         -> {"undone": bool}
+    GET  /api/stats                                        -> user stats
+    GET  /api/month-totals?year=YYYY&month=M               -> {"YYYY-MM-DD": {"points", "count"}}
+    GET  /api/catalog                                      -> [habits]
+    GET  /api/leaderboard?board=points|weekly|streak&limit=N -> {"top": [...], "me": {"rank", "score"}}
+    GET  /metrics                                          -> Prometheus latency histograms
+"""
+import argparse
+import asyncio
+import base64
+import datetime
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import tornado.httpserver
+import tornado.netutil
+import tornado.process
+import tornado.web
+
+from habit_metrics import metrics
+from habit_storage import (
+    load_config, configure_storage, ensure_bootstrapped,
+    create_user, login_user, get_user_stats, build_habit_list,
+    add_habit_logs_for_user, undo_last_habit_log, get_month_totals, AlreadyLoggedError,
+    LEADERBOARDS, get_leaderboard, get_ranks,
+)
+
+TOKEN_TTL = datetime.timedelta(hours=12)
+MAX_LEADERBOARD = 100
+PUBLIC_USER_FIELDS = ("username", "points", "level", "streak", "longest_streak", "last_action_date")
+
+# ---------------- Tokens ----------------
+# Stateless signed tokens ("username|expiry|signature"), so every worker process
+# started from the same secret accepts them without shared session storage.
+def issue_token(secret, username):
+    expires = int(time.time() + TOKEN_TTL.total_seconds())
+    payload = f"{username}|{expires}"
+    signature = hmac.new(secret, payload.encode(), hashlib.sha256).hexdigest()
+    return base64.urlsafe_b64encode(f"{payload}|{signature}".encode()).decode()
+
+def verify_token(secret, token):
+    """Username for a valid, unexpired token, else None."""
+    try:
+        username, expires, signature = base64.urlsafe_b64decode(token.encode()).decode().rsplit("|", 2)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    expected = hmac.new(secret, f"{username}|{expires}".encode(), hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(signature, expected) or int(expires) < time.time():
+        return None
+    return username
+
+def public_user(user):
+    return {k: user.get(k) for k in PUBLIC_USER_FIELDS} if user else None
+
+# ---------------- Handlers ----------------
+class ApiHandler(tornado.web.RequestHandler):
+    """JSON in and out; backend calls go to the shared executor."""
+    def initialize(self, executor, secret):
+        self.executor = executor
+        self.secret = secret
+
+    def set_default_headers(self):
+        self.set_header("Content-Type", "application/json")
+
+    async def call(self, fn, *args):
+        with metrics.timer(f"http.{fn.__name__}"):
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    def body(self):
+        try:
+            data = json.loads(self.request.body or b"{}")
+        except ValueError:
+            raise tornado.web.HTTPError(400, reason="Body must be JSON")
+        if not isinstance(data, dict):
+            raise tornado.web.HTTPError(400, reason="Body must be a JSON object")
+        return data
+
+    def username(self):
+        header = self.request.headers.get("Authorization", "")
+        username = verify_token(self.secret, header[7:]) if header.startswith("Bearer ") else None
+        if username is None:
+            raise tornado.web.HTTPError(401, reason="Missing or expired token")
+        return username
+
+    def reply(self, data, status=200):
+        self.set_status(status)
+        self.finish(json.dumps(data, default=str))
+
+    def write_error(self, status_code, **kwargs):
+        self.finish(json.dumps({"error": self._reason}))
+
+class SignupHandler(ApiHandler):
+    async def post(self):
+        data = self.body()
+        username, password = data.get("username"), data.get("password")
+        if not username or not password:
+            raise tornado.web.HTTPError(400, reason="username and password are required")
+        if not await self.call(create_user, username, password):
+            raise tornado.web.HTTPError(409, reason="Username already exists")
+        self.reply({"username": username}, status=201)
+
+class LoginHandler(ApiHandler):
+    async def post(self):
+        data = self.body()
+        user = await self.call(login_user, data.get("username"), data.get("password"))
+        if not user:
+            raise tornado.web.HTTPError(401, reason="Invalid username or password")
+        self.reply({"token": issue_token(self.secret, user["username"]), "user": public_user(user)})
+
+class LogsHandler(ApiHandler):
+    async def post(self):
+        username = self.username()
+        data = self.body()
+        habits = data.get("habits") or ([data["habit"]] if data.get("habit") else [])
+        if not habits:
+            raise tornado.web.HTTPError(400, reason="habit or habits is required")
+        if not isinstance(habits, list) or not all(isinstance(h, str) and h for h in habits):
+            raise tornado.web.HTTPError(400, reason="habit must be a name and habits a list of names")
+        try:
+            points = await self.call(add_habit_logs_for_user, username, habits)
+        except AlreadyLoggedError as e:
+            raise tornado.web.HTTPError(409, reason=str(e))
+        if points is None:
+            raise tornado.web.HTTPError(404, reason="Unknown habit")
+        self.reply({"points": points}, status=201)
+
+class UndoHandler(ApiHandler):
+    async def post(self):
+        self.reply({"undone": bool(await self.call(undo_last_habit_log, self.username()))})
+
+class StatsHandler(ApiHandler):
+    async def get(self):
+        user = await self.call(get_user_stats, self.username())
+        if not user:
+            raise tornado.web.HTTPError(404, reason="Unknown user")
+        self.reply(public_user(user))
+
+class MonthTotalsHandler(ApiHandler):
+    async def get(self):
+        username = self.username()
+        today = datetime.date.today()
+        try:
+            year = int(self.get_query_argument("year", today.year))
+            month = int(self.get_query_argument("month", today.month))
+            datetime.date(year, month, 1)
+        except ValueError:
+            raise tornado.web.HTTPError(400, reason="year and month must form a valid month")
+        totals = await self.call(get_month_totals, username, year, month)
+        self.reply({day.isoformat(): t for day, t in sorted(totals.items())})
+
+class CatalogHandler(ApiHandler):
+    async def get(self):
+        habits = await self.call(build_habit_list)
+        self.reply([{"habit": h["habit"], "type": h["type"], "points": h["points"]} for h in habits])
+
+class LeaderboardHandler(ApiHandler):
+    async def get(self):
+        username = self.username()
+        board = self.get_query_argument("board", "points")
+        if board not in LEADERBOARDS:
+            raise tornado.web.HTTPError(400, reason=f"board must be one of {', '.join(LEADERBOARDS)}")
+        try:
+            limit = max(1, min(int(self.get_query_argument("limit", 10)), MAX_LEADERBOARD))
+        except ValueError:
+            raise tornado.web.HTTPError(400, reason="limit must be a number")
+        top = await self.call(get_leaderboard, board, limit)
+        ranks = await self.call(get_ranks, username)
+        self.reply({"board": board, "top": top, "me": ranks.get(board)})
+
+class MetricsHandler(tornado.web.RequestHandler):
+    def get(self):
+        self.set_header("Content-Type", "text/plain; version=0.0.4")
+        self.finish(metrics.to_prometheus())
+
+def make_app(executor, secret):
+    options = {"executor": executor, "secret": secret}
+    return tornado.web.Application([
+        (r"/api/signup", SignupHandler, options),
+        (r"/api/login", LoginHandler, options),
+        (r"/api/logs", LogsHandler, options),
+        (r"/api/undo", UndoHandler, options),
+        (r"/api/stats", StatsHandler, options),
+        (r"/api/month-totals", MonthTotalsHandler, options),
+        (r"/api/catalog", CatalogHandler, options),
+        (r"/api/leaderboard", LeaderboardHandler, options),
+        (r"/metrics", MetricsHandler),
+    ])
+
+# ---------------- Run Server ----------------
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Habit Tracker HTTP API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--processes", type=int, default=1,
+                        help="worker processes sharing the port (0 = one per CPU)")
+    parser.add_argument("--threads", type=int, default=32,
+                        help="backend calls in flight per process (also the MongoDB pool size)")
+    parser.add_argument("--backend", choices=["mongo", "sqlite"], help="default: habit_config.json or mongo")
+    return parser
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    config = load_config()
+    if args.backend:
+        config["backend"] = args.backend
+    # The offline journal is a desktop feature; a server writes straight through
+    config["journal_path"] = None
+    secret = os.environ.get("HABIT_SERVER_SECRET", "").encode() or secrets.token_bytes(32)
+
+    sockets = tornado.netutil.bind_sockets(args.port, args.host)
+    if args.processes != 1:
+        # Fork before any client exists: a MongoClient must not cross a fork
+        tornado.process.fork_processes(args.processes)
+    configure_storage(dict(config, mongo_pool_size=args.threads))
+    ensure_bootstrapped()
+
+    async def serve():
+        executor = ThreadPoolExecutor(max_workers=args.threads, thread_name_prefix="habit-api")
+        server = tornado.httpserver.HTTPServer(make_app(executor, secret), xheaders=True)
+        server.add_sockets(sockets)
+        print(f"🌐 Habit API on http://{args.host}:{args.port} (pid {os.getpid()}, {config['backend']} backend)")
+        await asyncio.Event().wait()
+    asyncio.run(serve())
+
+if __name__ == "__main__":
+    main()
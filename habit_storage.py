@@ -0,0 +1,2835 @@
+"""Storage backends for Habit Tracker.
+
+The core functions at the bottom of this module (create_user,
+add_habit_log_for_user, undo_last_habit_log, get_logs_for_user,
+build_habit_list, ...) delegate to the active backend, chosen by config:
+
+- "mongo":  MongoStorage, a MongoDB server (the default)
+- "sqlite": SQLiteStorage, an embedded database file for single-user desktops
+
+Nothing in here imports tkinter, so the backend can be reused headless.
+"""
+import datetime
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+try:
+    from pymongo import MongoClient, InsertOne, UpdateOne, ReplaceOne, ReturnDocument, monitoring
+    from pymongo.errors import OperationFailure, PyMongoError, BulkWriteError, DuplicateKeyError
+    from bson import ObjectId
+except ImportError:
+    # SQLite-only installs don't need pymongo
+    MongoClient = None
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: lock files through msvcrt instead
+    fcntl = None
+    import msvcrt
+
+from habit_metrics import metrics
+
+# ---------------- Config ----------------
+CONFIG_FILE = "habit_config.json"
+DEFAULT_CONFIG = {
+    "backend": "mongo",
+    "mongo_uri": "mongodb://localhost:27017/",
+    "mongo_db": "habit_game",
+    "mongo_timeout_ms": 3000,
+    # Set to null to write straight to MongoDB without the offline journal
+    "journal_path": "habit_journal.jsonl",
+    # "documents" (one per log) or "buckets" (one per user per month, no offline journal)
+    "mongo_schema": "documents",
+    "sqlite_path": "habit_game.db",
+}
+
+def load_config(path=CONFIG_FILE):
+    """DEFAULT_CONFIG overlaid with the optional JSON config file and HABIT_TRACKER_BACKEND."""
+    config = dict(DEFAULT_CONFIG)
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            config.update(json.load(f))
+    if os.environ.get("HABIT_TRACKER_BACKEND"):
+        config["backend"] = os.environ["HABIT_TRACKER_BACKEND"]
+    return config
+
+# ---------------- DB call counters ----------------
+class DBCallCounter:
+    """Counts the database calls each UI action sends.
+
+    Both backends report calls on the thread that issued them, so a
+    thread-local counter only sees the current action's own calls. The last
+    count per action is kept in `last`; printing each one is opt-in (`report`).
+    """
+    def __init__(self):
+        self._local = threading.local()
+        self.last = {}
+        self.report = False
+
+    def count(self):
+        if getattr(self._local, "count", None) is not None:
+            self._local.count += 1
+
+    @contextmanager
+    def action(self, name, report=None):
+        if getattr(self._local, "count", None) is not None:
+            # Nested action (e.g. show_dashboard from handle_login): the outer one owns the count
+            yield
+            return
+        self._local.count = 0
+        try:
+            yield
+        finally:
+            count, self._local.count = self._local.count, None
+            self.last[name] = count
+            if self.report if report is None else report:
+                print(f"🔎 {name}: {count} DB calls")
+
+db_calls = DBCallCounter()
+
+# ---------------- Shared rules ----------------
+PREDEFINED_HABITS = [
+    {"habit": "Studied for 2 hours", "type": "good", "points": 18},
+    {"habit": "Exercise / Physical Activity", "type": "good", "points": 13},
+    {"habit": "Practiced a hobby or skill", "type": "good", "points": 12},
+    {"habit": "Stayed hydrated", "type": "good", "points": 12},
+    {"habit": "Attended lectures on time", "type": "good", "points": 11},
+    {"habit": "Read books or articles", "type": "good", "points": 9},
+    {"habit": "Overused social media", "type": "bad", "points": -6},
+    {"habit": "Skipped class", "type": "bad", "points": -7},
+    {"habit": "Skipped meal", "type": "bad", "points": -9},
+    {"habit": "Avoided studying or practicing skills", "type": "bad", "points": -9},
+    {"habit": "Getting angry / losing cool", "type": "bad", "points": -10},
+    {"habit": "Stayed up late", "type": "bad", "points": -12},
+]
+
+def calculate_level(points):
+    return max(1, points // 100 + 1)
+
+class AlreadyLoggedError(ValueError):
+    """Raised by add_habit_logs when a habit was already logged today: each habit counts once per day."""
+    def __init__(self, habits):
+        super().__init__(f"Already logged today: {', '.join(habits)}")
+        self.habits = habits
+
+def repeated_habits(habit_names, logged):
+    """Habits in `habit_names` that are in `logged` or named twice."""
+    seen = set(logged)
+    repeated = []
+    for name in habit_names:
+        if name in seen:
+            repeated.append(name)
+        seen.add(name)
+    return repeated
+
+# ---------------- Streak engine ----------------
+# The one streak rule, used by every backend: a day with any log, good or bad
+# habit alike, extends the streak when the previous logged day was yesterday,
+# keeps it on the same day and restarts it at 1 otherwise. A user's running
+# state is (streak, longest_streak, last_action_date). Logging advances it in
+# O(1); every log stores the state it replaced as its prev_state, so undo
+# restores that in O(1) instead of replaying history; a full recompute folds
+# the same advance over the history with StatsReplay.
+def next_streak(streak, last_action_date, day):
+    """Streak after logging on `day`, given the current streak and last action date (ISO string)."""
+    if not last_action_date:
+        return 1
+    try:
+        last_date = datetime.date.fromisoformat(last_action_date)
+    except ValueError:
+        return 1
+    if day == last_date + datetime.timedelta(days=1):
+        return streak + 1
+    if day == last_date:
+        return streak
+    return 1
+
+def streak_state(doc):
+    """The streak state of a user document (or a log's prev_state), with defaults.
+
+    Documents from before longest_streak existed count their current streak as the longest.
+    """
+    streak = doc.get("streak") or 0
+    return {"streak": streak, "longest_streak": doc.get("longest_streak") or streak,
+            "last_action_date": doc.get("last_action_date")}
+
+def advance_streak(state, day):
+    """Streak state after a log on `day`."""
+    streak = next_streak(state["streak"], state["last_action_date"], day)
+    return {"streak": streak, "longest_streak": max(state["longest_streak"], streak),
+            "last_action_date": day.isoformat()}
+
+class StatsReplay:
+    """A user's aggregates rebuilt from their history, fed oldest log first."""
+    def __init__(self, today=None):
+        self.week = week_start(today or datetime.date.today())
+        self.points = 0
+        self.week_points = 0
+        self.week_logs = 0
+        self.state = streak_state({})
+
+    def add(self, points, date):
+        """Apply one log; returns the streak state it replaced (the log's prev_state)."""
+        prev = self.state
+        self.points += points
+        try:
+            day = datetime.date.fromisoformat(date)
+        except (TypeError, ValueError):
+            return prev
+        if week_start(day) == self.week:
+            self.week_points += points
+            self.week_logs += 1
+        self.state = advance_streak(prev, day)
+        return prev
+
+    def user_fields(self):
+        # Only users who logged this week are on the weekly board
+        return {"points": self.points, "level": calculate_level(self.points),
+                "week": self.week if self.week_logs else None, "week_points": self.week_points, **self.state}
+
+    def summary(self):
+        return {"points": self.points, **self.state}
+
+def week_start(day):
+    """ISO date of the Monday starting `day`'s week; the key of the weekly leaderboard."""
+    return (day - datetime.timedelta(days=day.weekday())).isoformat()
+
+def month_bounds(year, month):
+    """ISO date strings [first, next_first) covering one calendar month."""
+    first = datetime.date(year, month, 1)
+    next_first = datetime.date(year + 1, 1, 1) if month == 12 else datetime.date(year, month + 1, 1)
+    return first.isoformat(), next_first.isoformat()
+
+def month_totals_from_rollup(rollup):
+    return {datetime.date.fromisoformat(date): {"points": d["points"], "count": d["count"]}
+            for date, d in rollup.items()}
+
+def page_cursor(page):
+    """The `before` cursor for the page after `page` (a get_logs_page result), or None if it is empty.
+
+    The last timestamp plus the ids logged at that instant, so logs sharing a
+    timestamp across the page boundary are neither skipped nor repeated.
+    """
+    if not page:
+        return None
+    last = page[-1]["timestamp"]
+    return {"timestamp": last.isoformat() if isinstance(last, datetime.datetime) else last,
+            "ids": [str(log["_id"]) for log in page if log["timestamp"] == last]}
+
+# ---------------- Habit catalog cache ----------------
+# The catalog is a dozen documents that every view looks up per log entry, so it
+# is loaded once and only reloaded when its version counter moves. Edits made by
+# this process invalidate immediately; edits made by other app instances are
+# picked up through a change stream when the backend supports one, otherwise by
+# checking the version counter at most every CATALOG_VERSION_CHECK_SECONDS.
+CATALOG_VERSION_CHECK_SECONDS = 10
+
+class HabitCatalog:
+    def __init__(self, storage):
+        self.storage = storage
+        self._lock = threading.Lock()
+        self._by_name = None
+        self._version = None
+        self._checked_at = 0.0
+        self._watching = False
+
+    def _load(self):
+        # A fresh database must be seeded before the catalog is cached
+        self.storage.ensure_bootstrapped()
+        version = self.storage.get_catalog_version()
+        habits = self.storage.load_habits()
+        self._by_name = {h["habit"]: h for h in habits}
+        self._version = version
+        self._checked_at = time.monotonic()
+
+    def _ensure_fresh(self):
+        if self._by_name is None:
+            self._load()
+        elif not self._watching and time.monotonic() - self._checked_at > CATALOG_VERSION_CHECK_SECONDS:
+            self._checked_at = time.monotonic()
+            try:
+                changed = self.storage.get_catalog_version() != self._version
+            except Exception:
+                # Database unreachable: keep serving the cached catalog
+                return
+            if changed:
+                self._load()
+
+    def all(self):
+        with self._lock:
+            self._ensure_fresh()
+            return list(self._by_name.values())
+
+    def get(self, habit_name):
+        with self._lock:
+            self._ensure_fresh()
+            return self._by_name.get(habit_name)
+
+    def invalidate(self):
+        with self._lock:
+            self._by_name = None
+
+    def put(self, habit):
+        """Apply a local edit to the cached catalog without reloading it."""
+        with self._lock:
+            if self._by_name is not None:
+                self._by_name[habit["habit"]] = habit
+
+    def watch(self):
+        """Invalidate on remote catalog edits when the backend can push them."""
+        def opened():
+            self._watching = True
+
+        def run():
+            try:
+                self.storage.watch_catalog(self.invalidate, opened)
+            except Exception:
+                # No change notifications (standalone mongod, SQLite): fall back to version polling
+                pass
+            finally:
+                self._watching = False
+        threading.Thread(target=run, daemon=True).start()
+
+# ---------------- Leaderboards ----------------
+# Overall points, points this week and current streak. Each board is served by
+# a users index sorted on its score, so the top K is a bounded index walk and a
+# user's rank is one count of the index keys above their score.
+LEADERBOARDS = {"points": "Overall", "weekly": "This Week", "streak": "Streak"}
+LEADERBOARD_TTL_SECONDS = 30
+LEADERBOARD_CACHE_SIZE = 10_000
+
+def board_score(user, board, today=None):
+    """A user's score on a board, or None when they are not on it (no points this week, broken streak)."""
+    today = today or datetime.date.today()
+    if board == "weekly":
+        return user.get("week_points", 0) if user.get("week") == week_start(today) else None
+    if board == "streak":
+        last = user.get("last_action_date")
+        if not last or last < (today - datetime.timedelta(days=1)).isoformat():
+            return None
+        return user.get("streak", 0)
+    return user.get("points", 0)
+
+# ---------------- Storage interface ----------------
+class Storage:
+    """Everything the app reads and writes. Subclasses implement the raw operations;
+    the shared helpers here are written in terms of them."""
+    name = None
+    # Whether independent per-user maintenance jobs may run on several threads at once
+    parallel_writes = False
+
+    def __init__(self):
+        self.catalog = HabitCatalog(self)
+        self._bootstrap_lock = threading.Lock()
+        self._bootstrapped = False
+        self._board_cache = {}
+        self._board_lock = threading.Lock()
+
+    # -- lifecycle --
+    def ensure_bootstrapped(self, mark=None):
+        """Create schema/indexes and seed the predefined habits, once per process.
+
+        `mark(phase)` is called after each step, for startup timing reports.
+        """
+        with self._bootstrap_lock:
+            if self._bootstrapped:
+                return
+            self.bootstrap(mark or (lambda phase: None))
+            self._bootstrapped = True
+
+    def bootstrap(self, mark):
+        raise NotImplementedError
+
+    def watch_catalog(self, on_change, on_open):
+        """Block, calling on_change() for each remote catalog edit."""
+        raise NotImplementedError
+
+    # -- users --
+    def create_user(self, username, password):
+        raise NotImplementedError
+
+    def login_user(self, username, password):
+        raise NotImplementedError
+
+    def get_user_stats(self, username):
+        raise NotImplementedError
+
+    def set_user_pin(self, username, pin, recovery):
+        raise NotImplementedError
+
+    def list_usernames(self):
+        raise NotImplementedError
+
+    # -- habits --
+    def load_habits(self):
+        raise NotImplementedError
+
+    def get_catalog_version(self):
+        raise NotImplementedError
+
+    def save_habit(self, name, points, habit_type):
+        """Add a habit or update an existing one; returns True when it already existed."""
+        raise NotImplementedError
+
+    def build_habit_list(self):
+        return self.catalog.all()
+
+    def get_habit(self, habit_name):
+        return self.catalog.get(habit_name)
+
+    def habit_type(self, habit_name, points=0):
+        habit = self.catalog.get(habit_name)
+        if habit:
+            return habit["type"]
+        return "good" if points > 0 else "bad"
+
+    # -- logs --
+    def add_habit_logs(self, username, habit_names):
+        """Log one or more habits for today atomically.
+
+        Returns the points of each logged habit, or None if the user or any
+        habit is unknown. Raises AlreadyLoggedError if a habit was already
+        logged today (or is named twice).
+        """
+        raise NotImplementedError
+
+    def add_habit_log(self, username, habit_name):
+        points = self.add_habit_logs(username, [habit_name])
+        return points[0] if points else None
+
+    def undo_last_habit_log(self, username):
+        raise NotImplementedError
+
+    def get_logs_for_user(self, username, limit=1000):
+        raise NotImplementedError
+
+    def get_logs_page(self, username, before=None, limit=100):
+        """Up to `limit` of a user's logs, newest first, older than the `before` cursor.
+
+        `before` comes from page_cursor() of the previous page, so each page is a
+        range on the (user, timestamp) index and costs the same however deep it is.
+        """
+        raise NotImplementedError
+
+    def count_logs(self, username):
+        raise NotImplementedError
+
+    def recompute_user_stats(self, username):
+        """Maintenance: replay a user's full history to rebuild points, level and streak."""
+        raise NotImplementedError
+
+    def recompute_users(self, usernames):
+        """recompute_user_stats for a batch of users; backends read the batch with one cursor."""
+        for username in usernames:
+            self.recompute_user_stats(username)
+        return len(usernames)
+
+    # -- rebalancing --
+    def habit_log_counts(self, habit_name, points):
+        """{username: number of their `habit_name` logs not worth `points`}."""
+        raise NotImplementedError
+
+    def set_habit_log_points(self, habit_name, points, usernames):
+        """Set `habit_name` logs of a batch of users to `points` in one server-side update; returns the count."""
+        raise NotImplementedError
+
+    def rebalance_users(self, habit_name, points, usernames):
+        """Re-price one habit's logs for a batch of users, then rebuild their aggregates and rollup."""
+        changed = self.set_habit_log_points(habit_name, points, usernames)
+        self.recompute_users(usernames)
+        self.backfill_daily_totals(usernames, batch_size=len(usernames), workers=1)
+        return changed
+
+    def iter_logs(self, username=None, after=None, batch_size=1000, fields=None):
+        """Stream logs (one user's or everyone's) in a stable backend-defined order.
+
+        Each yielded dict has at least _id, user and timestamp plus `fields`.
+        `after` = {"user", "timestamp" (ISO), "ids"} resumes right after a
+        previously streamed row: rows at that exact (user, timestamp) whose
+        str(_id) is in "ids" are skipped.
+        """
+        raise NotImplementedError
+
+    def iter_users(self, after=None, batch_size=1000):
+        """Stream public user stats (no password or PIN) ordered by username, after `after`."""
+        raise NotImplementedError
+
+    def log_columns(self, username):
+        """A user's whole history as three parallel sequences: ISO dates, habit names, points (any order)."""
+        logs = [(l["date"], l["habit"], l["points"]) for l in self.iter_logs(username, fields=("date", "habit", "points"))]
+        return tuple(zip(*logs)) if logs else ((), (), ())
+
+    def insert_users(self, users):
+        """Bulk-insert new user dicts (username, password); stats start at zero."""
+        raise NotImplementedError
+
+    def insert_logs(self, logs):
+        """Bulk-insert historical log dicts (user, habit, points, date, timestamp) as-is.
+
+        Aggregates and the daily rollup are left alone: run recompute_user_stats
+        and backfill_daily_totals for the affected users afterwards.
+        """
+        raise NotImplementedError
+
+    def habits_logged_on_days(self, days):
+        """{(user, ISO date): set of habit names} in the stored logs, for (user, ISO date) pairs.
+
+        Reads the logs rather than the rollup, so logs inserted with insert_logs
+        count before backfill_daily_totals runs.
+        """
+        raise NotImplementedError
+
+    # -- leaderboard --
+    def top_users(self, board, limit):
+        """[{"username", "score", "level"}] for the best `limit` users on a board, best first."""
+        raise NotImplementedError
+
+    def count_above(self, board, score):
+        """Number of users on a board with a strictly higher score, counted on the board's index."""
+        raise NotImplementedError
+
+    def _cached(self, key, load):
+        # Keys include the current week/day, so cached boards never outlive their period
+        now = time.monotonic()
+        with self._board_lock:
+            hit = self._board_cache.get(key)
+            if hit and hit[0] > now:
+                return hit[1]
+        value = load()
+        with self._board_lock:
+            if len(self._board_cache) > LEADERBOARD_CACHE_SIZE:
+                self._board_cache.clear()
+            self._board_cache[key] = (now + LEADERBOARD_TTL_SECONDS, value)
+        return value
+
+    def get_leaderboard(self, board, limit=10):
+        """Top `limit` users on a board, cached for LEADERBOARD_TTL_SECONDS."""
+        return self._cached(("top", board, limit, datetime.date.today()), lambda: self.top_users(board, limit))
+
+    def get_ranks(self, username):
+        """{board: {"rank", "score"} or None when the user is not on that board}.
+
+        One user read plus one indexed count per board; counts are cached per
+        score, so users sharing a score share the query.
+        """
+        user = self.get_user_stats(username)
+        ranks = {}
+        for board in LEADERBOARDS:
+            score = board_score(user, board) if user else None
+            if score is None:
+                ranks[board] = None
+                continue
+            above = self._cached(("above", board, score, datetime.date.today()),
+                                 lambda: self.count_above(board, score))
+            ranks[board] = {"rank": above + 1, "score": score}
+        return ranks
+
+    # -- daily rollup --
+    def get_month_rollup(self, username, year, month):
+        """Daily rollup documents for one month keyed by ISO date (at most 31)."""
+        raise NotImplementedError
+
+    def get_day_totals(self, username, date):
+        """Rollup document for one day (ISO string or date), or None when nothing was logged."""
+        raise NotImplementedError
+
+    def backfill_daily_totals(self, usernames=None, batch_size=200, workers=4):
+        raise NotImplementedError
+
+    def get_month_totals(self, username, year, month):
+        """Per-day point totals and log counts for one month.
+
+        Returns {datetime.date: {"points": int, "count": int}} with at most one
+        entry per day, whatever the size of the user's history.
+        """
+        return month_totals_from_rollup(self.get_month_rollup(username, year, month))
+
+    def get_habits_logged_on(self, username, date):
+        doc = self.get_day_totals(username, date)
+        return doc.get("habits", []) if doc else []
+
+    def load_dashboard_snapshot(self, username, year, month, recent_limit=5):
+        """Read everything one dashboard refresh renders, once.
+
+        When the displayed month is the current one, today's rollup comes out of
+        the month query, so a refresh costs three reads.
+        """
+        today = datetime.date.today().isoformat()
+        start, end = month_bounds(year, month)
+        rollup = self.get_month_rollup(username, year, month)
+        today_totals = rollup.get(today) if start <= today < end else self.get_day_totals(username, today)
+        return {
+            "user": self.get_user_stats(username),
+            "recent_logs": self.get_logs_for_user(username, limit=recent_limit),
+            "today": today_totals,
+            "logged_today": today_totals.get("habits", []) if today_totals else [],
+            "month_totals": month_totals_from_rollup(rollup),
+            "year": year,
+            "month": month,
+        }
+
+# ---------------- MongoDB backend ----------------
+# Every hot query filters on one of these keys, so without them each dashboard
+# refresh is a full collection scan.
+REQUIRED_INDEXES = {
+    "logs": [
+        {"name": "user_date", "keys": [("user", 1), ("date", -1)]},
+        {"name": "user_timestamp", "keys": [("user", 1), ("timestamp", -1)]},
+    ],
+    "users": [
+        {"name": "username_unique", "keys": [("username", 1)], "unique": True},
+        {"name": "points_rank", "keys": [("points", -1), ("username", 1)]},
+        {"name": "weekly_rank", "keys": [("week", 1), ("week_points", -1), ("username", 1)]},
+        {"name": "streak_rank", "keys": [("streak", -1), ("username", 1)]},
+    ],
+    "habits": [
+        {"name": "habit_unique", "keys": [("habit", 1)], "unique": True},
+    ],
+    "daily_totals": [
+        {"name": "user_date_unique", "keys": [("user", 1), ("date", 1)], "unique": True},
+    ],
+}
+
+CATALOG_VERSION_ID = "habit_catalog"
+
+def _index_keys(spec):
+    return [(k, int(v) if isinstance(v, (int, float)) else v) for k, v in spec]
+
+def level_expr(points_expr):
+    """Aggregation-pipeline equivalent of calculate_level."""
+    return {"$toInt": {"$max": [1, {"$add": [{"$floor": {"$divide": [points_expr, 100]}}, 1]}]}}
+
+def log_update_pipeline(points, day):
+    """Server-side update applying `points` logged on `day` to a user document.
+
+    Mirrors advance_streak and calculate_level so the read-modify-write happens
+    atomically inside MongoDB instead of racing between clients.
+    """
+    today = day.isoformat()
+    yesterday = (day - datetime.timedelta(days=1)).isoformat()
+    week = week_start(day)
+    streak = {"$ifNull": ["$streak", 0]}
+    return [
+        {"$set": {
+            "points": {"$add": [{"$ifNull": ["$points", 0]}, points]},
+            # The weekly score restarts when the first log of a new week arrives
+            "week_points": {"$cond": [{"$eq": ["$week", week]},
+                                      {"$add": [{"$ifNull": ["$week_points", 0]}, points]},
+                                      points]},
+            "week": week,
+            "streak": {"$switch": {
+                "branches": [
+                    {"case": {"$eq": ["$last_action_date", today]}, "then": streak},
+                    {"case": {"$eq": ["$last_action_date", yesterday]}, "then": {"$add": [streak, 1]}},
+                ],
+                "default": 1,
+            }},
+            "last_action_date": today,
+        }},
+        {"$set": {"level": level_expr("$points"),
+                  "longest_streak": {"$max": [{"$ifNull": ["$longest_streak", 0]}, "$streak"]}}},
+    ]
+
+class MongoStorage(Storage):
+    name = "mongo"
+    parallel_writes = True
+    required_indexes = REQUIRED_INDEXES
+
+    def __init__(self, uri="mongodb://localhost:27017/", database="habit_game", timeout_ms=None, pool_size=None):
+        if MongoClient is None:
+            raise RuntimeError("The mongo backend needs pymongo: pip install pymongo")
+        super().__init__()
+
+        class _CallListener(monitoring.CommandListener):
+            """Counts commands per UI action and times each one, labelled with its collection."""
+            def __init__(self):
+                self.targets = {}
+
+            def started(self, event):
+                db_calls.count()
+                target = event.command.get(event.command_name)
+                self.targets[event.request_id] = f"{event.database_name}.{target}" if isinstance(target, str) else None
+
+            def succeeded(self, event):
+                metrics.observe(f"mongo.{event.command_name}", event.duration_micros / 1000,
+                                detail=self.targets.pop(event.request_id, None))
+
+            def failed(self, event):
+                metrics.observe(f"mongo.{event.command_name}.failed", event.duration_micros / 1000,
+                                detail=self.targets.pop(event.request_id, None))
+
+        options = {"serverSelectionTimeoutMS": timeout_ms} if timeout_ms else {}
+        if pool_size:
+            options["maxPoolSize"] = pool_size
+        self.client = MongoClient(uri, event_listeners=[_CallListener()], **options)
+        self.db = self.client[database]
+        self.users = self.db["users"]
+        self.habits = self.db["habits"]
+        self.logs = self.db["logs"]
+        self.meta = self.db["meta"]
+        self.daily_totals = self.db["daily_totals"]
+        self._transactions_supported = None
+
+    # ---------- Bootstrap and indexes ----------
+    def bootstrap(self, mark):
+        self.client.admin.command("ping")
+        mark("background: connect to MongoDB")
+        if self.habits.count_documents({}) == 0:
+            self.habits.insert_many([dict(h) for h in PREDEFINED_HABITS])
+        mark("background: seed habits")
+        self.ensure_indexes()
+        mark("background: verify indexes")
+        self.catalog.watch()
+
+    def index_build_progress(self):
+        """Return (namespace, message) pairs for index builds currently running on the server."""
+        try:
+            ops = self.client.admin.aggregate([
+                {"$currentOp": {"allUsers": True}},
+                {"$match": {"command.createIndexes": {"$exists": True}}},
+            ])
+            return [(op.get("ns", "?"), op.get("msg") or op.get("progress") or "in progress") for op in ops]
+        except Exception:
+            # $currentOp needs extra privileges on some deployments
+            return []
+
+    def check_indexes(self):
+        """Compare existing indexes with the backend's required_indexes.
+
+        Returns a dict per collection with the "missing" index specs and the
+        names of "redundant" indexes (exact duplicates, or prefixes of a
+        required compound index).
+        """
+        report = {}
+        for coll_name, required in self.required_indexes.items():
+            existing = {ix["name"]: _index_keys(ix["key"].items())
+                        for ix in self.db[coll_name].list_indexes() if ix["name"] != "_id_"}
+            required_keys = [ix["keys"] for ix in required]
+            missing = [ix for ix in required if ix["keys"] not in existing.values()]
+            redundant = []
+            seen = set()
+            for name, keys in existing.items():
+                covered = any(keys != req and req[:len(keys)] == keys for req in required_keys)
+                duplicate = tuple(keys) in seen
+                seen.add(tuple(keys))
+                if covered or duplicate:
+                    redundant.append(name)
+            report[coll_name] = {"missing": missing, "redundant": redundant}
+        return report
+
+    def ensure_indexes(self, verbose=True):
+        """Create any missing required index and print a short build report."""
+        report = self.check_indexes()
+        for coll_name, result in report.items():
+            for ix in result["missing"]:
+                options = {k: v for k, v in ix.items() if k != "keys"}
+                if verbose:
+                    print(f"🔧 Building index {ix['name']} on {coll_name}...")
+                started = time.perf_counter()
+                try:
+                    self.db[coll_name].create_index(ix["keys"], **options)
+                except Exception as e:
+                    # e.g. duplicate usernames already stored prevent a unique index
+                    print(f"⚠️ Could not build index {ix['name']} on {coll_name}: {e}")
+                    continue
+                if verbose:
+                    print(f"✅ Index {ix['name']} on {coll_name} ready ({time.perf_counter() - started:.2f}s)")
+            for name in result["redundant"]:
+                print(f"ℹ️ Index {name} on {coll_name} is redundant with a required index")
+        if verbose:
+            for ns, msg in self.index_build_progress():
+                print(f"⏳ Index build still running on {ns}: {msg}")
+        return report
+
+    def watch_catalog(self, on_change, on_open):
+        # Change streams need a replica set; a standalone server raises here
+        with self.habits.watch() as stream:
+            on_open()
+            for _ in stream:
+                on_change()
+
+    # ---------- Transactions ----------
+    def transactions_supported(self):
+        """Multi-document transactions need a replica set or a sharded cluster."""
+        if self._transactions_supported is None:
+            try:
+                hello = self.client.admin.command("hello")
+                self._transactions_supported = "setName" in hello or hello.get("msg") == "isdbgrid"
+            except OperationFailure:
+                self._transactions_supported = False
+        return self._transactions_supported
+
+    def run_atomically(self, write):
+        """Call write(session) inside a transaction when possible, else write(None).
+
+        On a standalone server each write is still atomic per document, which is
+        what the single-document updates in the logging path rely on.
+        """
+        if not self.transactions_supported():
+            return write(None)
+        with self.client.start_session() as session:
+            return session.with_transaction(write)
+
+    # ---------- Users ----------
+    def create_user(self, username, password):
+        if self.users.find_one({"username": username}):
+            return False
+        self.users.insert_one({
+            "username": username,
+            "password": password,
+            "points": 0,
+            "level": 1,
+            "streak": 0,
+            "longest_streak": 0,
+            "last_action_date": None,
+            "pin": None,
+            "pin_recovery": None
+        })
+        return True
+
+    def login_user(self, username, password):
+        return self.users.find_one({"username": username, "password": password})
+
+    def get_user_stats(self, username):
+        return self.users.find_one({"username": username})
+
+    def set_user_pin(self, username, pin, recovery):
+        self.users.update_one({"username": username}, {"$set": {"pin": pin, "pin_recovery": recovery}})
+        return self.get_user_stats(username)
+
+    def list_usernames(self):
+        return self.users.distinct("username")
+
+    # ---------- Habits ----------
+    def load_habits(self):
+        return list(self.habits.find({}))
+
+    def get_catalog_version(self):
+        doc = self.meta.find_one({"_id": CATALOG_VERSION_ID})
+        return doc.get("version", 0) if doc else 0
+
+    def bump_catalog_version(self):
+        self.meta.update_one({"_id": CATALOG_VERSION_ID}, {"$inc": {"version": 1}}, upsert=True)
+
+    def save_habit(self, name, points, habit_type):
+        result = self.habits.update_one({"habit": name}, {"$set": {"points": points, "type": habit_type}}, upsert=True)
+        self.bump_catalog_version()
+        self.catalog.invalidate()
+        return result.matched_count > 0
+
+    # ---------- Logs ----------
+    def add_habit_logs(self, username, habit_names, ids=None):
+        # `ids` optionally fixes the log _ids, so a retried write cannot insert twice.
+        # The user's points, level and streak are updated by one find_one_and_update,
+        # the logs go in with one bulk_write and the day's rollup with one upsert;
+        # inside a transaction when the server supports them.
+        habits = [self.catalog.get(name) for name in habit_names]
+        if not habits or not all(habits):
+            return None
+        points = [int(h["points"]) for h in habits]
+        today = datetime.date.today()
+        # Journal replays (`ids` set) were checked when queued; the rollup claim in store_logs still guards them
+        repeated = [] if ids else repeated_habits([h["habit"] for h in habits],
+                                                  self.get_habits_logged_on(username, today))
+        if repeated:
+            raise AlreadyLoggedError(repeated)
+
+        def write(session):
+            before = self.users.find_one_and_update(
+                {"username": username},
+                log_update_pipeline(sum(points), today),
+                projection={"streak": 1, "longest_streak": 1, "last_action_date": 1},
+                return_document=ReturnDocument.BEFORE,
+                session=session,
+            )
+            if not before:
+                return None
+            # streak state each log replaced, so undo can restore it without replaying history
+            prev_state = streak_state(before)
+            try:
+                self.store_logs(username, habits, points, today, prev_state, advance_streak(prev_state, today),
+                                ids, session)
+            except Exception:
+                # Lost a race with a concurrent log of the same habit, or the write failed. A transaction
+                # aborts on its own; without one, take the points back so none are counted without a log
+                if session is None:
+                    self.reverse_user_stats(username, sum(points), today.isoformat(), prev_state)
+                raise
+            return points
+
+        return self.run_atomically(write)
+
+    def store_logs(self, username, habits, points, today, prev_state, after, ids, session):
+        """Write the log entries of one click (the user document is already updated).
+
+        The day's rollup is claimed first, so a habit already logged today raises
+        AlreadyLoggedError before any log is written. Outside a transaction, a
+        failed insert gives the claim back and removes the logs that did go in.
+        """
+        self.apply_to_daily_totals(username, today.isoformat(),
+                                   [(h["habit"], pts, h["type"]) for h, pts in zip(habits, points)],
+                                   session=session, once=True)
+        now = datetime.datetime.utcnow()
+        entries = []
+        for i, (habit, pts) in enumerate(zip(habits, points)):
+            entries.append({
+                "_id": ids[i] if ids else ObjectId(),
+                "user": username,
+                "habit": habit["habit"],
+                "points": pts,
+                # store ISO date for day-based grouping and a precise timestamp for ordering
+                "date": today.isoformat(),
+                "timestamp": now + datetime.timedelta(microseconds=1000 * i),
+                "prev_state": prev_state if i == 0 else after,
+            })
+        try:
+            self.logs.bulk_write([InsertOne(e) for e in entries], ordered=True, session=session)
+        except PyMongoError as e:
+            if session is None:
+                # An ordered bulk write stops at the first error, so only the entries before it went in
+                inserted = entries[:e.details.get("nInserted", 0)] if isinstance(e, BulkWriteError) else entries
+                if inserted:
+                    self.logs.delete_many({"_id": {"$in": [entry["_id"] for entry in inserted]}})
+                self.release_daily_totals(username, today.isoformat(),
+                                          [(h["habit"], pts, h["type"]) for h, pts in zip(habits, points)])
+            raise
+
+    def last_log(self, username):
+        # Sorting on timestamp alone lets the (user, timestamp) index serve this
+        return self.logs.find_one({"user": username}, sort=[("timestamp", -1)])
+
+    def undo_last_habit_log(self, username):
+        last_log = self.last_log(username)
+        if not last_log:
+            return False
+        return self.undo_log(username, last_log)
+
+    def undo_log(self, username, last_log):
+        """Delete one log and reverse it against the user's aggregates and the daily rollup."""
+        prev = last_log.get("prev_state")
+
+        def write(session):
+            if not self.logs.delete_one({"_id": last_log["_id"]}, session=session).deleted_count:
+                return False  # already undone by another client
+            if "date" in last_log:
+                self.remove_from_daily_totals(username, last_log["date"], last_log["habit"],
+                                              last_log.get("points", 0), session=session)
+            if prev is not None:
+                self.reverse_user_stats(username, last_log.get("points", 0), last_log["date"], prev, session)
+            return True
+
+        undone = self.run_atomically(write)
+        if undone and prev is None:
+            # Logs written before running aggregates existed carry no snapshot
+            self.recompute_user_stats(username)
+        return undone
+
+    def reverse_user_stats(self, username, points, date, prev, session=None):
+        """Take one undone log off the user's running aggregates: one update, independent of history length."""
+        self.users.update_one(
+            {"username": username},
+            [
+                {"$set": {
+                    "points": {"$subtract": [{"$ifNull": ["$points", 0]}, points]},
+                    "week_points": {"$cond": [
+                        {"$eq": ["$week", week_start(datetime.date.fromisoformat(date))]},
+                        {"$subtract": [{"$ifNull": ["$week_points", 0]}, points]},
+                        {"$ifNull": ["$week_points", 0]},
+                    ]},
+                    "streak": {"$literal": prev.get("streak", 0)},
+                    # Snapshots from before longest_streak existed leave it alone
+                    "longest_streak": ({"$literal": prev["longest_streak"]} if "longest_streak" in prev
+                                       else {"$ifNull": ["$longest_streak", 0]}),
+                    "last_action_date": {"$literal": prev.get("last_action_date")},
+                }},
+                {"$set": {"level": level_expr("$points")}},
+            ],
+            session=session,
+        )
+
+    def get_logs_for_user(self, username, limit=1000):
+        return list(self.logs.find({"user": username}).sort("date", -1).limit(limit))
+
+    def get_logs_page(self, username, before=None, limit=100):
+        # The user_timestamp index walked from `before` down; logs sharing the
+        # cursor's timestamp are re-read and dropped by id
+        query = {"user": username}
+        skip = set()
+        if before:
+            query["timestamp"] = {"$lte": datetime.datetime.fromisoformat(before["timestamp"])}
+            skip = set(before["ids"])
+        cursor = self.logs.find(query).sort("timestamp", -1).limit(limit + len(skip))
+        return [log for log in cursor if str(log["_id"]) not in skip][:limit]
+
+    def count_logs(self, username):
+        return self.logs.count_documents({"user": username})
+
+    def insert_users(self, users):
+        if users:
+            self.users.insert_many([{"points": 0, "level": 1, "streak": 0, "longest_streak": 0,
+                                     "last_action_date": None, "pin": None, "pin_recovery": None, **u}
+                                    for u in users], ordered=False)
+        return len(users)
+
+    def insert_logs(self, logs):
+        if logs:
+            self.logs.insert_many(logs, ordered=False)
+        return len(logs)
+
+    def habits_logged_on_days(self, days):
+        days = sorted(days)
+        logged = {}
+        for i in range(0, len(days), 500):
+            # Each (user, date) branch is a point lookup on the user_date index
+            query = {"$or": [{"user": user, "date": date} for user, date in days[i:i + 500]]}
+            for log in self.logs.find(query, {"_id": 0, "user": 1, "date": 1, "habit": 1}):
+                logged.setdefault((log["user"], log["date"]), set()).add(log["habit"])
+        return logged
+
+    def iter_logs(self, username=None, after=None, batch_size=1000, fields=None):
+        # (user desc, timestamp asc) is the (user, timestamp) index walked backwards:
+        # chronological per user without an in-memory sort
+        query = {"user": username} if username else {}
+        if after:
+            resume = {"$or": [
+                {"user": after["user"], "timestamp": {"$gte": datetime.datetime.fromisoformat(after["timestamp"])}},
+                {"user": {"$lt": after["user"]}},
+            ]}
+            query = {"$and": [query, resume]} if query else resume
+        projection = dict.fromkeys(set(fields) | {"user", "timestamp"}, 1) if fields else None
+        cursor = self.logs.find(query, projection).sort([("user", -1), ("timestamp", 1)]).batch_size(batch_size)
+        skip = set(after["ids"]) if after else set()
+        for doc in cursor:
+            if skip and str(doc["_id"]) in skip:
+                continue
+            yield doc
+
+    def iter_users(self, after=None, batch_size=1000):
+        query = {"username": {"$gt": after}} if after else {}
+        projection = {"_id": 0, "username": 1, "points": 1, "level": 1, "streak": 1, "longest_streak": 1,
+                      "last_action_date": 1}
+        yield from self.users.find(query, projection).sort("username", 1).batch_size(batch_size)
+
+    def log_columns(self, username):
+        # Unsorted and narrow: an index range on user, three small fields per document
+        cursor = self.logs.find({"user": username}, {"_id": 0, "date": 1, "habit": 1, "points": 1}).batch_size(10_000)
+        dates, habits, points = [], [], []
+        for doc in cursor:
+            dates.append(doc["date"])
+            habits.append(doc["habit"])
+            points.append(doc["points"])
+        return dates, habits, points
+
+    # ---------- Leaderboard ----------
+    def _board_query(self, board):
+        today = datetime.date.today()
+        if board == "weekly":
+            return {"week": week_start(today)}, "week_points"
+        if board == "streak":
+            return {"last_action_date": {"$gte": (today - datetime.timedelta(days=1)).isoformat()}}, "streak"
+        return {}, "points"
+
+    def top_users(self, board, limit):
+        query, field = self._board_query(board)
+        cursor = (self.users.find(query, {"_id": 0, "username": 1, "level": 1, field: 1})
+                  .sort([(field, -1), ("username", 1)]).limit(limit))
+        return [{"username": u["username"], "score": u.get(field, 0), "level": u.get("level", 1)} for u in cursor]
+
+    def count_above(self, board, score):
+        query, field = self._board_query(board)
+        return self.users.count_documents({**query, field: {"$gt": score}})
+
+    def recompute_user_stats(self, username, batch_size=1000):
+        # Also rewrites each log's prev_state snapshot so later undos stay O(1).
+        self.recompute_users([username], batch_size)
+        user = self.users.find_one({"username": username}, {"points": 1, "streak": 1, "longest_streak": 1,
+                                                             "last_action_date": 1})
+        return {"points": user.get("points", 0), **streak_state(user)} if user else None
+
+    def habit_log_counts(self, habit_name, points):
+        counts = self.logs.aggregate([
+            {"$match": {"habit": habit_name, "points": {"$ne": points}}},
+            {"$group": {"_id": "$user", "logs": {"$sum": 1}}},
+        ])
+        return {c["_id"]: c["logs"] for c in counts}
+
+    def set_habit_log_points(self, habit_name, points, usernames):
+        result = self.logs.update_many({"user": {"$in": list(usernames)}, "habit": habit_name,
+                                        "points": {"$ne": points}}, {"$set": {"points": points}})
+        return result.modified_count
+
+    def recompute_users(self, usernames, batch_size=1000):
+        # One cursor over the whole batch, walking the (user, timestamp) index like iter_logs;
+        # only logs whose snapshot changed are rewritten
+        replays = {}
+        ops = []
+        projection = {"user": 1, "points": 1, "date": 1, "prev_state": 1}
+        cursor = (self.logs.find({"user": {"$in": list(usernames)}}, projection)
+                  .sort([("user", -1), ("timestamp", 1)]).batch_size(batch_size))
+        for l in cursor:
+            replay = replays.get(l["user"])
+            if replay is None:
+                replay = replays[l["user"]] = StatsReplay()
+            prev_state = replay.add(l.get("points", 0), l.get("date"))
+            if l.get("prev_state") != prev_state:
+                ops.append(UpdateOne({"_id": l["_id"]}, {"$set": {"prev_state": prev_state}}))
+            if len(ops) >= batch_size:
+                self.logs.bulk_write(ops, ordered=False)
+                ops = []
+        if ops:
+            self.logs.bulk_write(ops, ordered=False)
+        self.users.bulk_write([UpdateOne({"username": u}, {"$set": (replays.get(u) or StatsReplay()).user_fields()})
+                               for u in usernames], ordered=False)
+        return len(usernames)
+
+    # ---------- Daily rollup ----------
+    # One small document per (user, date) with the day's point sum, good/bad counts
+    # and the habits logged, so day-level views never scan raw logs. Each change is a
+    # single-document upsert, which MongoDB applies atomically.
+    def apply_to_daily_totals(self, username, date, entries, session=None, once=False):
+        """Add (habit_name, points, kind) entries logged on `date` to the rollup in one upsert.
+
+        With `once`, raises AlreadyLoggedError instead if any of the habits is
+        already in the day's list: the filter then misses the existing document
+        and the upsert collides with it on the unique (user, date) index.
+        """
+        names = [name for name, _, _ in entries]
+        inc = {"points": sum(points for _, points, _ in entries), "count": len(entries)}
+        for _, _, kind in entries:
+            inc[kind] = inc.get(kind, 0) + 1
+        query = {"user": username, "date": date}
+        if once:
+            query["habits"] = {"$nin": names}
+        try:
+            self.daily_totals.update_one(query, {"$inc": inc, "$push": {"habits": {"$each": names}}},
+                                         upsert=True, session=session)
+        except DuplicateKeyError:
+            if not once:
+                raise
+            raise AlreadyLoggedError(repeated_habits(names, self.get_habits_logged_on(
+                username, datetime.date.fromisoformat(date))) or names)
+
+    def release_daily_totals(self, username, date, entries):
+        """Undo a `once` claim of apply_to_daily_totals whose logs could not be written.
+
+        The claim only succeeded if none of the habits were in the day's list, so
+        pulling them removes exactly what it pushed.
+        """
+        dec = {"points": -sum(points for _, points, _ in entries), "count": -len(entries)}
+        for _, _, kind in entries:
+            dec[kind] = dec.get(kind, 0) - 1
+        self.daily_totals.update_one({"user": username, "date": date},
+                                     {"$inc": dec, "$pull": {"habits": {"$in": [name for name, _, _ in entries]}}})
+        self.daily_totals.delete_one({"user": username, "date": date, "count": {"$lte": 0}})
+
+    def remove_from_daily_totals(self, username, date, habit_name, points, session=None):
+        kind = self.habit_type(habit_name, points)
+        # Drop a single occurrence of the habit name so repeated logs stay counted correctly
+        without_one = {"$let": {
+            "vars": {"i": {"$indexOfArray": ["$habits", habit_name]}},
+            "in": {"$cond": [
+                {"$lt": ["$$i", 0]},
+                "$habits",
+                {"$concatArrays": [
+                    {"$slice": ["$habits", "$$i"]},
+                    {"$slice": ["$habits", {"$add": ["$$i", 1]}, {"$max": [1, {"$size": "$habits"}]}]},
+                ]},
+            ]},
+        }}
+        self.daily_totals.update_one(
+            {"user": username, "date": date},
+            [{"$set": {
+                "points": {"$subtract": ["$points", points]},
+                "count": {"$subtract": ["$count", 1]},
+                kind: {"$max": [0, {"$subtract": [{"$ifNull": ["$" + kind, 0]}, 1]}]},
+                "habits": without_one,
+            }}],
+            session=session
+        )
+        self.daily_totals.delete_one({"user": username, "date": date, "count": {"$lte": 0}}, session=session)
+
+    def get_month_rollup(self, username, year, month):
+        start, end = month_bounds(year, month)
+        cursor = self.daily_totals.find({"user": username, "date": {"$gte": start, "$lt": end}}, {"_id": 0})
+        return {d["date"]: d for d in cursor}
+
+    def get_day_totals(self, username, date):
+        if isinstance(date, datetime.date):
+            date = date.isoformat()
+        return self.daily_totals.find_one({"user": username, "date": date})
+
+    def backfill_daily_totals(self, usernames=None, batch_size=200, workers=4):
+        """Rebuild the rollup from raw logs, grouping batches of users on the server in parallel.
+
+        Returns the number of users processed.
+        """
+        if usernames is None:
+            usernames = self.logs.distinct("user")
+        batches = [usernames[i:i + batch_size] for i in range(0, len(usernames), batch_size)]
+
+        def rebuild(batch):
+            self.daily_totals.delete_many({"user": {"$in": batch}})
+            self.logs.aggregate([
+                {"$match": {"user": {"$in": batch}}},
+                {"$lookup": {"from": "habits", "localField": "habit", "foreignField": "habit", "as": "h"}},
+                {"$set": {"kind": {"$ifNull": [
+                    {"$arrayElemAt": ["$h.type", 0]},
+                    {"$cond": [{"$gt": ["$points", 0]}, "good", "bad"]},
+                ]}}},
+                {"$sort": {"timestamp": 1}},
+                {"$group": {
+                    "_id": {"user": "$user", "date": "$date"},
+                    "points": {"$sum": "$points"},
+                    "count": {"$sum": 1},
+                    "good": {"$sum": {"$cond": [{"$eq": ["$kind", "good"]}, 1, 0]}},
+                    "bad": {"$sum": {"$cond": [{"$eq": ["$kind", "bad"]}, 1, 0]}},
+                    "habits": {"$push": "$habit"},
+                }},
+                {"$project": {"_id": 0, "user": "$_id.user", "date": "$_id.date",
+                              "points": 1, "count": 1, "good": 1, "bad": 1, "habits": 1}},
+                {"$merge": {"into": "daily_totals", "on": ["user", "date"],
+                            "whenMatched": "replace", "whenNotMatched": "insert"}},
+            ])
+            return len(batch)
+
+        done = 0
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for count in pool.map(rebuild, batches):
+                done += count
+                print(f"📅 Daily totals: {done}/{len(usernames)} users ({time.perf_counter() - started:.1f}s)")
+        return done
+
+# ---------------- Offline write journal ----------------
+# With journaling on, every write is appended (and fsynced) to a local JSONL file
+# before MongoDB sees it. A syncer thread replays whatever the server has not
+# confirmed, so clicks keep working at local-disk latency through an outage and
+# converge once the server is back.
+JOURNAL_RETRY_SECONDS = (1, 60)
+_journal_locks = {}  # journal path -> open lock file, held for the life of the process
+
+def lock_journal(path):
+    """Take the exclusive lock on `path` (a `.lock` file next to it); False if another process holds it.
+
+    Two processes syncing one journal would both replay it and resolve the same
+    undo against different logs, so only the lock holder journals.
+    """
+    if path in _journal_locks:
+        return True
+    handle = open(path + ".lock", "a+")
+    try:
+        if fcntl:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        handle.close()
+        return False
+    _journal_locks[path] = handle
+    return True
+
+def _id_to_json(_id):
+    return {"$oid": str(_id)} if isinstance(_id, ObjectId) else _id
+
+def _id_from_json(value):
+    return ObjectId(value["$oid"]) if isinstance(value, dict) else value
+
+class WriteJournal:
+    """Append-only file of write operations, each tagged with a sequence number and an idempotency key.
+
+    Three record kinds are appended: operations ({"seq", "key", "op", "args", "at"}),
+    undo target resolutions ({"resolve": seq, "target": id}) and sync
+    checkpoints ({"synced": seq}). Once everything is synced the file is truncated.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.pending = []
+        self.seq = 0
+        self._load()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                # Drop a record torn by a crash mid-append so new records start on a clean line
+                data = data[:data.rfind(b"\n") + 1]
+                f.seek(0)
+                f.truncate(len(data))
+        ops = {}
+        synced = 0
+        for line in data.decode("utf-8").splitlines():
+            rec = json.loads(line)
+            if "synced" in rec:
+                synced = max(synced, rec["synced"])
+            elif "resolve" in rec:
+                if rec["resolve"] in ops:
+                    ops[rec["resolve"]]["target"] = rec["target"]
+            else:
+                ops[rec["seq"]] = rec
+                self.seq = max(self.seq, rec["seq"])
+        self.pending = [rec for seq, rec in sorted(ops.items()) if seq > synced]
+
+    def _append(self, rec):
+        self._file.write(json.dumps(rec) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def append(self, op, **args):
+        with self._lock:
+            self.seq += 1
+            rec = {"seq": self.seq, "key": uuid.uuid4().hex, "op": op, "args": args,
+                   "at": datetime.datetime.utcnow().isoformat()}
+            self._append(rec)
+            self.pending.append(rec)
+            return rec
+
+    def resolve(self, rec, target):
+        """Pin the log an undo removes, so a replay after a partial sync cannot undo a second one."""
+        with self._lock:
+            rec["target"] = _id_to_json(target)
+            self._append({"resolve": rec["seq"], "target": rec["target"]})
+
+    def mark_synced(self, seq):
+        with self._lock:
+            self.pending = [rec for rec in self.pending if rec["seq"] > seq]
+            if self.pending:
+                self._append({"synced": seq})
+            else:
+                self._file.close()
+                self._file = open(self.path, "w", encoding="utf-8")
+
+    def snapshot(self, username=None):
+        with self._lock:
+            return [rec for rec in self.pending if username is None or rec["args"].get("username") == username]
+
+def overlay_journal(snapshot, ops):
+    """A dashboard snapshot with journaled operations applied on top, as the server will see them."""
+    if not ops:
+        return snapshot
+    snap = dict(snapshot)
+    user = snap["user"] = dict(snap["user"])
+    recent = snap["recent_logs"] = list(snap["recent_logs"])
+    month_totals = snap["month_totals"] = dict(snap["month_totals"])
+    today = datetime.date.today().isoformat()
+    totals = snap["today"] = dict(snap["today"] or {"points": 0, "count": 0, "good": 0, "bad": 0, "habits": []})
+    totals["habits"] = snap["logged_today"] = list(totals.get("habits", []))
+
+    def add_to_day(date, habit, points, kind, sign):
+        day = datetime.date.fromisoformat(date)
+        if (day.year, day.month) == (snap["year"], snap["month"]):
+            cell = dict(month_totals.get(day, {"points": 0, "count": 0}))
+            cell["points"] += sign * points
+            cell["count"] += sign
+            month_totals[day] = cell
+            if cell["count"] <= 0:
+                del month_totals[day]
+        if date == today:
+            totals["points"] += sign * points
+            totals["count"] += sign
+            totals[kind] = max(0, totals.get(kind, 0) + sign)
+            if sign > 0:
+                totals["habits"].append(habit)
+            elif habit in totals["habits"]:
+                totals["habits"].remove(habit)
+
+    for rec in ops:
+        args = rec["args"]
+        if rec.get("rejected"):
+            continue  # a repeated log the server turned down
+        if rec["op"] == "log":
+            day = datetime.date.fromisoformat(args["date"])
+            for i, (habit, points, kind) in enumerate(args["entries"]):
+                prev = streak_state(user)
+                user["points"] = user.get("points", 0) + points
+                user["level"] = calculate_level(user["points"])
+                user.update(advance_streak(prev, day))
+                recent.insert(0, {"_id": f"{rec['key']}:{i}", "user": args["username"], "habit": habit,
+                                  "points": points, "date": args["date"], "timestamp": rec["at"],
+                                  "kind": kind, "prev_state": prev})
+                add_to_day(args["date"], habit, points, kind, 1)
+        elif rec["op"] == "undo" and recent:
+            log = recent.pop(0)
+            user["points"] = user.get("points", 0) - log.get("points", 0)
+            user["level"] = calculate_level(user["points"])
+            if log.get("prev_state"):
+                user.update(streak_state({"longest_streak": user.get("longest_streak"), **log["prev_state"]}))
+            kind = log.get("kind") or ("good" if log.get("points", 0) > 0 else "bad")
+            add_to_day(log["date"], log["habit"], log.get("points", 0), kind, -1)
+        elif rec["op"] == "set_pin":
+            user["pin"] = args["pin"]
+            user["pin_recovery"] = args["recovery"]
+    if not totals["count"]:
+        snap["today"] = None
+    return snap
+
+class JournaledMongoStorage(MongoStorage):
+    """MongoStorage whose writes go through a WriteJournal first.
+
+    While the server is up and nothing is queued, each write is applied right
+    away through the normal O(1) paths (with the journal key as log _id). Queued
+    writes are replayed in batches: queued logs of a habit the server already
+    has for that day are dropped, then one unordered bulk_write per collection,
+    duplicate log _ids ignored, then one recompute of each affected user's
+    aggregates and daily rollup, which makes the whole replay idempotent.
+    While offline, dashboard reads come from the last snapshot with the queued
+    writes overlaid.
+    """
+    name = "mongo"
+
+    def __init__(self, uri="mongodb://localhost:27017/", database="habit_game", timeout_ms=None,
+                 journal_path="habit_journal.jsonl", pool_size=None):
+        super().__init__(uri, database, timeout_ms, pool_size)
+        self.journal = WriteJournal(journal_path)
+        self.offline = False
+        self._fresh = set()  # seqs never attempted against the server, safe for the fast path
+        self._snapshots = {}  # username -> last server snapshot with synced writes folded in
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        if self.journal.pending:
+            print(f"📤 {len(self.journal.pending)} journaled writes waiting to sync")
+            self._wake.set()
+        threading.Thread(target=self._sync_loop, name="habit-journal-sync", daemon=True).start()
+
+    # ---------- Syncing ----------
+    def _sync_loop(self):
+        delay = JOURNAL_RETRY_SECONDS[0]
+        while True:
+            self._wake.wait(timeout=delay if self.journal.pending or self.offline else None)
+            self._wake.clear()
+            try:
+                synced = self.flush()
+            except Exception as e:
+                delay = min(JOURNAL_RETRY_SECONDS[1], delay * 2)
+                print(f"⚠️ Journal sync failed ({len(self.journal.pending)} writes queued, retry in {delay}s):", e)
+                continue
+            delay = JOURNAL_RETRY_SECONDS[0]
+            if synced:
+                print(f"📤 Synced {synced} journaled writes")
+
+    def flush(self):
+        """Send every queued write to the server; returns how many were synced."""
+        with self._flush_lock:
+            pending = self.journal.snapshot()
+            try:
+                if not pending:
+                    if self.offline:
+                        self.client.admin.command("ping")
+                        self.offline = False
+                    return 0
+                if all(rec["seq"] in self._fresh for rec in pending):
+                    for rec in pending:
+                        self._fresh.discard(rec["seq"])
+                        self._apply_now(rec)
+                        self._synced([rec])
+                else:
+                    self._replay(pending)
+                    self._synced(pending)
+            except PyMongoError:
+                self._fresh.clear()
+                self.offline = True
+                raise
+            self.offline = False
+            return len(pending)
+
+    def _synced(self, recs):
+        self.journal.mark_synced(recs[-1]["seq"])
+        for rec in recs:
+            username = rec["args"].get("username")
+            if username in self._snapshots:
+                self._snapshots[username] = overlay_journal(self._snapshots[username], [rec])
+
+    def _apply_now(self, rec):
+        args = rec["args"]
+        if rec["op"] == "log":
+            names = [habit for habit, _, _ in args["entries"]]
+            ids = [f"{rec['key']}:{i}" for i in range(len(names))]
+            try:
+                rec["result"] = MongoStorage.add_habit_logs(self, args["username"], names, ids=ids)
+            except AlreadyLoggedError as e:
+                rec["rejected"] = e.habits  # synced as a no-op; the caller re-raises
+        elif rec["op"] == "undo":
+            last_log = self.last_log(args["username"])
+            rec["result"] = bool(last_log)
+            if last_log:
+                self.journal.resolve(rec, last_log["_id"])
+                self.undo_log(args["username"], last_log)
+        elif rec["op"] == "set_pin":
+            MongoStorage.set_user_pin(self, args["username"], args["pin"], args["recovery"])
+        elif rec["op"] == "save_habit":
+            MongoStorage.save_habit(self, args["name"], args["points"], args["type"])
+
+    def _logged_on_server(self, pending):
+        """(user, date, habit) -> log _id for the server's logs on the days the queued logs fall on."""
+        logs = [rec for rec in pending if rec["op"] == "log"]
+        if not logs:
+            return {}
+        days = sorted({(rec["args"]["username"], rec["args"]["date"]) for rec in logs})
+        # Logs an earlier, interrupted sync already inserted are the queued ones, not repeats
+        queued = [f"{rec['key']}:{i}" for rec in logs for i in range(len(rec["args"]["entries"]))]
+        cursor = self.logs.find({"$or": [{"user": user, "date": date} for user, date in days], "_id": {"$nin": queued}},
+                                {"user": 1, "date": 1, "habit": 1})
+        return {(log["user"], log["date"], log["habit"]): log["_id"] for log in cursor}
+
+    def _replay(self, pending):
+        inserts, deletes, user_updates, habit_updates = [], [], [], []
+        affected = set()
+        inserted = {}  # username -> [(timestamp, _id)] queued in this batch
+        logged = self._logged_on_server(pending)  # the once-per-day check, kept up to date through the batch
+        for rec in pending:
+            args = rec["args"]
+            username = args.get("username")
+            if rec["op"] == "log":
+                at = datetime.datetime.fromisoformat(rec["at"])
+                keys = [(username, args["date"], habit) for habit, _, _ in args["entries"]]
+                repeated = [habit for _, _, habit in keys if (username, args["date"], habit) in logged]
+                if repeated:
+                    # Logged from another device while this one was offline: synced as a no-op, like _apply_now
+                    rec["rejected"] = repeated
+                    print(f"⚠️ Dropped a queued log for {username}: {', '.join(repeated)} "
+                          f"already logged on {args['date']}")
+                for i, (habit, points, _) in enumerate(args["entries"]):
+                    log_id = f"{rec['key']}:{i}"
+                    timestamp = at + datetime.timedelta(microseconds=1000 * i)
+                    # A rejected log stays an undo candidate, so an undo queued after it undoes nothing
+                    inserted.setdefault(username, []).append((timestamp, log_id))
+                    if not repeated:
+                        logged[keys[i]] = log_id
+                        inserts.append(InsertOne({"_id": log_id, "user": username, "habit": habit, "points": points,
+                                                  "date": args["date"], "timestamp": timestamp}))
+                if not repeated:
+                    affected.add(username)
+            elif rec["op"] == "undo":
+                if "target" not in rec:
+                    # Latest log not already removed: queued in this batch or on the server
+                    candidates = [c for c in inserted.get(username, []) if c[1] not in deletes]
+                    server = self.logs.find_one({"user": username, "_id": {"$nin": deletes}},
+                                                sort=[("timestamp", -1)], projection={"timestamp": 1})
+                    if server:
+                        candidates.append((server["timestamp"], server["_id"]))
+                    if not candidates:
+                        continue
+                    self.journal.resolve(rec, max(candidates, key=lambda c: c[0])[1])
+                target = _id_from_json(rec["target"])
+                deletes.append(target)
+                # An undone log frees its habit for the rest of the day
+                for key in [key for key, log_id in logged.items() if log_id == target]:
+                    del logged[key]
+                affected.add(username)
+            elif rec["op"] == "set_pin":
+                user_updates.append(UpdateOne({"username": username},
+                                              {"$set": {"pin": args["pin"], "pin_recovery": args["recovery"]}}))
+            elif rec["op"] == "save_habit":
+                habit_updates.append(UpdateOne({"habit": args["name"]},
+                                               {"$set": {"points": args["points"], "type": args["type"]}},
+                                               upsert=True))
+        if habit_updates:
+            self.habits.bulk_write(habit_updates, ordered=True)
+            self.bump_catalog_version()
+            self.catalog.invalidate()
+        if inserts:
+            try:
+                self.logs.bulk_write(inserts, ordered=False)
+            except BulkWriteError as e:
+                # Duplicate _ids are logs an earlier, interrupted sync already inserted
+                if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                    raise
+        if deletes:
+            # Deletes target exact _ids, so running them after every insert keeps batch order
+            self.logs.delete_many({"_id": {"$in": deletes}})
+        if user_updates:
+            self.users.bulk_write(user_updates, ordered=True)
+        if affected:
+            self.recompute_users(sorted(affected))
+            self.backfill_daily_totals(sorted(affected), workers=1)
+
+    def _write(self, op, **args):
+        rec = self.journal.append(op, **args)
+        if not self.offline:
+            self._fresh.add(rec["seq"])
+            try:
+                self.flush()
+            except PyMongoError:
+                pass  # stays journaled; the syncer retries
+        if self.journal.pending:
+            self._wake.set()
+        return rec
+
+    # ---------- Writes ----------
+    def add_habit_logs(self, username, habit_names, ids=None):
+        habits = [self.catalog.get(name) for name in habit_names]
+        if not habits or not all(habits):
+            return None
+        entries = [(h["habit"], int(h["points"]), h["type"]) for h in habits]
+        today = datetime.date.today()
+        repeated = repeated_habits([name for name, _, _ in entries], self.get_habits_logged_on(username, today))
+        if repeated:
+            raise AlreadyLoggedError(repeated)
+        rec = self._write("log", username=username, date=today.isoformat(), entries=entries)
+        if "rejected" in rec:
+            raise AlreadyLoggedError(rec["rejected"])
+        return rec.get("result", [points for _, points, _ in entries])
+
+    def undo_last_habit_log(self, username):
+        rec = self._write("undo", username=username)
+        return rec.get("result", True)
+
+    def set_user_pin(self, username, pin, recovery):
+        self._write("set_pin", username=username, pin=pin, recovery=recovery)
+        return self.get_user_stats(username)
+
+    def save_habit(self, name, points, habit_type):
+        existed = self.catalog.get(name) is not None
+        rec = self._write("save_habit", name=name, points=points, type=habit_type)
+        if "result" not in rec:
+            self.catalog.put({"habit": name, "points": points, "type": habit_type})
+        return existed
+
+    # ---------- Reads ----------
+    def get_habits_logged_on(self, username, date):
+        # With writes queued (or the server down) the answer includes them, as the dashboard shows it
+        if date == datetime.date.today() and username in self._snapshots and (
+                self.offline or self.journal.snapshot(username)):
+            return self._offline_snapshot(username)["logged_today"]
+        try:
+            return super().get_habits_logged_on(username, date)
+        except PyMongoError:
+            if username not in self._snapshots:
+                raise
+            self.offline = True
+            self._wake.set()
+            return self._offline_snapshot(username)["logged_today"]
+
+    def get_user_stats(self, username):
+        if not self.offline:
+            try:
+                user = super().get_user_stats(username)
+            except PyMongoError:
+                self.offline = True
+                self._wake.set()
+            else:
+                if user is None:
+                    return None
+                bare = {"user": user, "recent_logs": [], "today": None, "month_totals": {}, "year": 0, "month": 0}
+                return overlay_journal(bare, self.journal.snapshot(username))["user"]
+        return self._offline_snapshot(username)["user"]
+
+    def load_dashboard_snapshot(self, username, year, month, recent_limit=5):
+        if not self.offline:
+            try:
+                snapshot = super().load_dashboard_snapshot(username, year, month, recent_limit)
+            except PyMongoError:
+                self.offline = True
+                self._wake.set()
+            else:
+                self._snapshots[username] = snapshot
+                return overlay_journal(snapshot, self.journal.snapshot(username))
+        snapshot = self._offline_snapshot(username)
+        if (snapshot["year"], snapshot["month"]) != (year, month):
+            snapshot = dict(snapshot, year=year, month=month, month_totals={})
+        return snapshot
+
+    def _offline_snapshot(self, username):
+        if username not in self._snapshots:
+            raise RuntimeError("The database is unreachable and nothing is cached for this user yet")
+        return overlay_journal(self._snapshots[username], self.journal.snapshot(username))
+
+# ---------------- Bucketed MongoDB schema ----------------
+# Optional log layout ("mongo_schema": "buckets"): one document per (user, month)
+# holding that month's logs as compact entries plus the month's totals, instead
+# of one document per log and one per day in daily_totals:
+#
+#   {"user": "ann", "month": "2024-05", "points": 312, "count": 41,
+#    "entries": [{"i": <ObjectId>, "d": 3, "h": 7, "p": 10, "t": <datetime>, "s": [4, 9, 739010]}, ...]}
+#
+# i is the entry's id (migrated logs keep their _id), d the day of the month,
+# h the habit's integer id (habits gain an "hid"), p the points and s the
+# streak state the entry replaced (streak, longest, last action day as an
+# ordinal). Ids never depend on array positions, which shift on undo and on
+# imports sorted into the middle of a month. Entries stay sorted by t, so the last entry of
+# the latest bucket is the one undo removes. Month views and undo read or update
+# one document. Existing logs move over with `Habit_Tracker.py migrate-logs`, which
+# records each migrated user in bucket_migrations.
+# The offline journal replays against the per-log collection, so it is not used
+# with this schema.
+BUCKET_INDEXES = {
+    "log_buckets": [
+        {"name": "user_month_unique", "keys": [("user", 1), ("month", -1)], "unique": True},
+    ],
+    "users": REQUIRED_INDEXES["users"],
+    "habits": REQUIRED_INDEXES["habits"] + [
+        {"name": "hid_unique", "keys": [("hid", 1)], "unique": True, "sparse": True},
+    ],
+}
+HABIT_IDS_ID = "habit_ids"
+
+def pack_state(state):
+    last = state.get("last_action_date")
+    return [state.get("streak", 0), state.get("longest_streak", 0),
+            datetime.date.fromisoformat(last).toordinal() if last else None]
+
+def unpack_state(packed):
+    if packed is None:
+        return None
+    streak, longest, last = packed
+    return {"streak": streak, "longest_streak": longest,
+            "last_action_date": datetime.date.fromordinal(last).isoformat() if last else None}
+
+class BucketedMongoStorage(MongoStorage):
+    required_indexes = BUCKET_INDEXES
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = self.db["log_buckets"]
+        self.migrations = self.db["bucket_migrations"]
+
+    def bootstrap(self, mark):
+        super().bootstrap(mark)
+        self.assign_habit_ids()
+
+    # ---------- Habit ids ----------
+    def assign_habit_ids(self):
+        """Give every habit without one a small integer id, used in place of its name in entries."""
+        for habit in self.habits.find({"hid": {"$exists": False}}, {"_id": 1}):
+            counter = self.meta.find_one_and_update({"_id": HABIT_IDS_ID}, {"$inc": {"next": 1}},
+                                                    upsert=True, return_document=ReturnDocument.AFTER)
+            self.habits.update_one({"_id": habit["_id"], "hid": {"$exists": False}}, {"$set": {"hid": counter["next"]}})
+
+    def save_habit(self, name, points, habit_type):
+        existed = super().save_habit(name, points, habit_type)
+        if not existed:
+            self.assign_habit_ids()
+            self.catalog.invalidate()
+        return existed
+
+    def habit_id(self, habit_name):
+        habit = self.catalog.get(habit_name)
+        if habit is not None and "hid" not in habit:
+            self.catalog.invalidate()  # cached before its id was assigned
+            habit = self.catalog.get(habit_name)
+        if habit is None or "hid" not in habit:
+            raise ValueError(f"Habit {habit_name!r} has no id yet")
+        return habit["hid"]
+
+    def habits_by_id(self):
+        return {h["hid"]: h for h in self.catalog.all() if "hid" in h}
+
+    @staticmethod
+    def habit_name(habits, hid):
+        habit = habits.get(hid)
+        return habit["habit"] if habit else f"#{hid}"
+
+    # ---------- Entries ----------
+    @staticmethod
+    def _entry_id(bucket, i, entry):
+        if "i" in entry:
+            return str(entry["i"])
+        return f"{bucket['_id']}:{i}"  # written before entries had ids
+
+    def _expand(self, bucket, habits):
+        """The bucket's entries as per-log dicts, oldest first (the shape the per-log schema returns)."""
+        for i, e in enumerate(bucket.get("entries", [])):
+            yield {"_id": self._entry_id(bucket, i, e), "user": bucket["user"],
+                   "habit": self.habit_name(habits, e["h"]), "points": e["p"],
+                   "date": f"{bucket['month']}-{e['d']:02d}", "timestamp": e["t"],
+                   "prev_state": unpack_state(e.get("s"))}
+
+    def store_logs(self, username, habits, points, today, prev_state, after, ids, session):
+        now = datetime.datetime.utcnow()
+        entries = [{"i": ids[i] if ids else ObjectId(), "d": today.day, "h": self.habit_id(habit["habit"]), "p": pts,
+                    "t": now + datetime.timedelta(microseconds=1000 * i),
+                    "s": pack_state(prev_state if i == 0 else after)}
+                   for i, (habit, pts) in enumerate(zip(habits, points))]
+        # A bucket already holding one of these habits today misses the filter, and the
+        # upsert then collides with it on the unique (user, month) index
+        try:
+            self.buckets.update_one(
+                {"user": username, "month": today.strftime("%Y-%m"),
+                 "entries": {"$not": {"$elemMatch": {"d": today.day, "h": {"$in": [e["h"] for e in entries]}}}}},
+                {"$push": {"entries": {"$each": entries}}, "$inc": {"points": sum(points), "count": len(entries)}},
+                upsert=True, session=session,
+            )
+        except DuplicateKeyError:
+            raise AlreadyLoggedError([h["habit"] for h in habits])
+
+    def undo_last_habit_log(self, username):
+        for _ in range(3):
+            bucket = self.buckets.find_one({"user": username}, sort=[("month", -1)])
+            if not bucket or not bucket.get("entries"):
+                return False
+            entry = bucket["entries"][-1]
+            prev = unpack_state(entry.get("s"))
+            date = f"{bucket['month']}-{entry['d']:02d}"
+
+            def write(session):
+                # Pop only while the bucket still ends with this entry: a concurrent log or undo changes count
+                popped = self.buckets.update_one(
+                    {"_id": bucket["_id"], "count": bucket["count"]},
+                    {"$pop": {"entries": 1}, "$inc": {"points": -entry["p"], "count": -1}},
+                    session=session,
+                ).modified_count
+                if not popped:
+                    return False
+                self.buckets.delete_one({"_id": bucket["_id"], "count": 0}, session=session)
+                if prev is not None:
+                    self.reverse_user_stats(username, entry["p"], date, prev, session)
+                return True
+
+            if self.run_atomically(write):
+                if prev is None:
+                    self.recompute_user_stats(username)
+                return True
+        return False
+
+    def get_logs_for_user(self, username, limit=1000):
+        habits = self.habits_by_id()
+        logs = []
+        for bucket in self.buckets.find({"user": username}).sort("month", -1).batch_size(2):
+            logs.extend(reversed(list(self._expand(bucket, habits))))
+            if len(logs) >= limit:
+                break
+        return logs[:limit]
+
+    def get_logs_page(self, username, before=None, limit=100):
+        # Months are local dates and timestamps UTC, so the bucket of the month
+        # after the cursor may still hold older entries
+        query = {"user": username}
+        if before:
+            until = datetime.datetime.fromisoformat(before["timestamp"])
+            skip = set(before["ids"])
+            next_month = (until.replace(day=1) + datetime.timedelta(days=32)).strftime("%Y-%m")
+            query["month"] = {"$lte": next_month}
+        habits = self.habits_by_id()
+        logs = []
+        for bucket in self.buckets.find(query).sort("month", -1).batch_size(2):
+            for log in reversed(list(self._expand(bucket, habits))):
+                if before and (log["timestamp"] > until or log["_id"] in skip):
+                    continue
+                logs.append(log)
+                if len(logs) == limit:
+                    return logs
+        return logs
+
+    def count_logs(self, username):
+        return sum(b["count"] for b in self.buckets.find({"user": username}, {"_id": 0, "count": 1}))
+
+    def insert_logs(self, logs):
+        # One upsert per (user, month); $sort keeps entries in timestamp order whatever the input order
+        habit_ids = {}
+        grouped = {}
+        for log in logs:
+            name = log["habit"]
+            if name not in habit_ids:
+                habit_ids[name] = self.habit_id(name)
+            entry = {"i": log.get("_id") or ObjectId(), "d": int(log["date"][8:10]), "h": habit_ids[name],
+                     "p": log["points"], "t": log["timestamp"]}
+            grouped.setdefault((log["user"], log["date"][:7]), []).append(entry)
+        if grouped:
+            self.buckets.bulk_write([
+                UpdateOne({"user": user, "month": month},
+                          {"$push": {"entries": {"$each": entries, "$sort": {"t": 1}}},
+                           "$inc": {"points": sum(e["p"] for e in entries), "count": len(entries)}},
+                          upsert=True)
+                for (user, month), entries in grouped.items()
+            ], ordered=False)
+        return len(logs)
+
+    def habits_logged_on_days(self, days):
+        wanted = set(days)
+        months = sorted({(user, date[:7]) for user, date in wanted})
+        habits = self.habits_by_id()
+        logged = {}
+        for i in range(0, len(months), 500):
+            query = {"$or": [{"user": user, "month": month} for user, month in months[i:i + 500]]}
+            for bucket in self.buckets.find(query, {"user": 1, "month": 1, "entries.d": 1, "entries.h": 1}):
+                for e in bucket.get("entries", []):
+                    day = (bucket["user"], f"{bucket['month']}-{e['d']:02d}")
+                    if day in wanted:
+                        logged.setdefault(day, set()).add(self.habit_name(habits, e["h"]))
+        return logged
+
+    def iter_logs(self, username=None, after=None, batch_size=1000, fields=None):
+        # Same order as the per-log schema: user descending, oldest first within a user
+        query = {"user": username} if username else {}
+        skip = set()
+        if after:
+            resume_at = datetime.datetime.fromisoformat(after["timestamp"])
+            # Months are local dates and timestamps UTC, so the bucket of the month
+            # before the checkpoint may still hold later entries
+            prev_month = (resume_at.replace(day=1) - datetime.timedelta(days=1)).strftime("%Y-%m")
+            resume = {"$or": [{"user": after["user"], "month": {"$gte": prev_month}},
+                              {"user": {"$lt": after["user"]}}]}
+            query = {"$and": [query, resume]} if query else resume
+            skip = set(after["ids"])
+        habits = self.habits_by_id()
+        cursor = self.buckets.find(query).sort([("user", -1), ("month", 1)]).batch_size(max(1, batch_size // 100))
+        for bucket in cursor:
+            for log in self._expand(bucket, habits):
+                if after and log["user"] == after["user"] and (log["timestamp"] < resume_at or log["_id"] in skip):
+                    continue
+                yield log
+
+    def log_columns(self, username):
+        habits = self.habits_by_id()
+        dates, names, points = [], [], []
+        for bucket in self.buckets.find({"user": username}, {"month": 1, "entries.d": 1, "entries.h": 1,
+                                                              "entries.p": 1}):
+            month = bucket["month"]
+            for e in bucket.get("entries", []):
+                dates.append(f"{month}-{e['d']:02d}")
+                names.append(self.habit_name(habits, e["h"]))
+                points.append(e["p"])
+        return dates, names, points
+
+    def recompute_users(self, usernames, batch_size=1000):
+        # Replays each user's buckets oldest first, rewriting a bucket only when an
+        # entry's snapshot or the bucket's totals changed
+        replays = {}
+        ops = []
+        cursor = (self.buckets.find({"user": {"$in": list(usernames)}})
+                  .sort([("user", -1), ("month", 1)]).batch_size(max(1, batch_size // 100)))
+        for bucket in cursor:
+            replay = replays.get(bucket["user"])
+            if replay is None:
+                replay = replays[bucket["user"]] = StatsReplay()
+            entries = bucket.get("entries", [])
+            changed = False
+            for e in entries:
+                packed = pack_state(replay.add(e["p"], f"{bucket['month']}-{e['d']:02d}"))
+                if e.get("s") != packed:
+                    e["s"] = packed
+                    changed = True
+            points = sum(e["p"] for e in entries)
+            if changed or bucket.get("points") != points or bucket.get("count") != len(entries):
+                ops.append(UpdateOne({"_id": bucket["_id"]},
+                                     {"$set": {"entries": entries, "points": points, "count": len(entries)}}))
+            if len(ops) >= 100:
+                self.buckets.bulk_write(ops, ordered=False)
+                ops = []
+        if ops:
+            self.buckets.bulk_write(ops, ordered=False)
+        self.users.bulk_write([UpdateOne({"username": u}, {"$set": (replays.get(u) or StatsReplay()).user_fields()})
+                               for u in usernames], ordered=False)
+        return len(usernames)
+
+    # ---------- Rebalancing ----------
+    def habit_log_counts(self, habit_name, points, usernames=None):
+        hid = self.habit_id(habit_name)
+        match = {"entries.h": hid}
+        if usernames is not None:
+            match["user"] = {"$in": list(usernames)}
+        counts = self.buckets.aggregate([
+            {"$match": match},
+            {"$project": {"user": 1, "logs": {"$size": {"$filter": {
+                "input": "$entries", "as": "e",
+                "cond": {"$and": [{"$eq": ["$$e.h", hid]}, {"$ne": ["$$e.p", points]}]},
+            }}}}},
+            {"$group": {"_id": "$user", "logs": {"$sum": "$logs"}}},
+            {"$match": {"logs": {"$gt": 0}}},
+        ])
+        return {c["_id"]: c["logs"] for c in counts}
+
+    def set_habit_log_points(self, habit_name, points, usernames):
+        hid = self.habit_id(habit_name)
+        changed = sum(self.habit_log_counts(habit_name, points, usernames).values())
+        # Re-price matching entries and the month total inside each bucket, server-side
+        self.buckets.update_many(
+            {"user": {"$in": list(usernames)}, "entries": {"$elemMatch": {"h": hid, "p": {"$ne": points}}}},
+            [
+                {"$set": {"entries": {"$map": {
+                    "input": "$entries", "as": "e",
+                    "in": {"$cond": [{"$eq": ["$$e.h", hid]}, {"$mergeObjects": ["$$e", {"p": points}]}, "$$e"]},
+                }}}},
+                {"$set": {"points": {"$sum": "$entries.p"}}},
+            ],
+        )
+        return changed
+
+    # ---------- Month totals ----------
+    def get_month_rollup(self, username, year, month):
+        bucket = self.buckets.find_one({"user": username, "month": f"{year:04d}-{month:02d}"})
+        if not bucket:
+            return {}
+        # A month is at most a few hundred entries: the per-day rollup is summed here
+        habits = self.habits_by_id()
+        rollup = {}
+        for e in bucket.get("entries", []):
+            date = f"{bucket['month']}-{e['d']:02d}"
+            day = rollup.setdefault(date, {"user": username, "date": date, "points": 0, "count": 0,
+                                           "good": 0, "bad": 0, "habits": []})
+            habit = habits.get(e["h"])
+            day["points"] += e["p"]
+            day["count"] += 1
+            day[habit["type"] if habit else ("good" if e["p"] > 0 else "bad")] += 1
+            day["habits"].append(self.habit_name(habits, e["h"]))
+        return rollup
+
+    def get_day_totals(self, username, date):
+        if isinstance(date, str):
+            date = datetime.date.fromisoformat(date)
+        return self.get_month_rollup(username, date.year, date.month).get(date.isoformat())
+
+    def backfill_daily_totals(self, usernames=None, batch_size=200, workers=4):
+        """Recompute each bucket's month totals from its entries, server-side."""
+        if usernames is None:
+            usernames = self.buckets.distinct("user")
+        started = time.perf_counter()
+        for i in range(0, len(usernames), batch_size):
+            self.buckets.update_many({"user": {"$in": usernames[i:i + batch_size]}},
+                                     [{"$set": {"points": {"$sum": "$entries.p"}, "count": {"$size": "$entries"}}}])
+            print(f"📅 Month totals: {min(i + batch_size, len(usernames))}/{len(usernames)} users "
+                  f"({time.perf_counter() - started:.1f}s)")
+        return len(usernames)
+
+    # ---------- Migration ----------
+    def migrate_users(self, usernames):
+        """Move a batch of users' logs from the per-log collection into their buckets.
+
+        Logs are merged by id into whatever buckets a user already has, so entries
+        written after the switch to buckets are kept and an interrupted batch is
+        redone by running it again. Migrated users are recorded in
+        bucket_migrations and skipped afterwards: from then on the buckets are the
+        only copy, and a rebuild would bring back logs undone since.
+        """
+        usernames = list(usernames)
+        done = {m["_id"] for m in self.migrations.find({"_id": {"$in": usernames}}, {"_id": 1})}
+        usernames = [u for u in usernames if u not in done]
+        if not usernames:
+            return 0
+        entries = {}  # (user, month) -> entries
+        ids = set()
+        for bucket in self.buckets.find({"user": {"$in": usernames}}, {"user": 1, "month": 1, "entries": 1}):
+            entries[(bucket["user"], bucket["month"])] = bucket.get("entries", [])
+            ids.update(e["i"] for e in bucket.get("entries", []) if "i" in e)
+        habit_ids = {}
+        cursor = self.logs.find({"user": {"$in": usernames}}, {"user": 1, "habit": 1, "points": 1, "date": 1,
+                                                                 "timestamp": 1}).batch_size(10_000)
+        logs = 0
+        for log in cursor:
+            if log["_id"] in ids:
+                continue  # moved by an earlier, interrupted run
+            name = log["habit"]
+            if name not in habit_ids:
+                habit_ids[name] = self.habit_id(name)
+            entries.setdefault((log["user"], log["date"][:7]), []).append(
+                {"i": log["_id"], "d": int(log["date"][8:10]), "h": habit_ids[name], "p": log["points"],
+                 "t": log["timestamp"]})
+            logs += 1
+        # Replay each user's merged history oldest first for the undo snapshots
+        replays = {}
+        ops = []
+        for (user, month), month_entries in sorted(entries.items()):
+            replay = replays.setdefault(user, StatsReplay())
+            month_entries.sort(key=lambda e: e["t"])
+            for e in month_entries:
+                e["s"] = pack_state(replay.add(e["p"], f"{month}-{e['d']:02d}"))
+            ops.append(ReplaceOne({"user": user, "month": month},
+                                  {"user": user, "month": month, "points": sum(e["p"] for e in month_entries),
+                                   "count": len(month_entries), "entries": month_entries}, upsert=True))
+        for i in range(0, len(ops), 100):
+            self.buckets.bulk_write(ops[i:i + 100], ordered=False)
+        self.migrations.bulk_write([UpdateOne({"_id": u}, {"$set": {"at": datetime.datetime.utcnow()}}, upsert=True)
+                                    for u in usernames], ordered=False)
+        return logs
+
+    def collection_sizes(self, name):
+        stats = self.db.command("collStats", name)
+        return {"documents": stats.get("count", 0), "data": stats.get("size", 0),
+                "storage": stats.get("storageSize", 0), "indexes": stats.get("totalIndexSize", 0)}
+
+# ---------------- SQLite backend ----------------
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password TEXT NOT NULL,
+    points INTEGER NOT NULL DEFAULT 0,
+    level INTEGER NOT NULL DEFAULT 1,
+    streak INTEGER NOT NULL DEFAULT 0,
+    longest_streak INTEGER NOT NULL DEFAULT 0,
+    last_action_date TEXT,
+    pin TEXT,
+    pin_recovery TEXT,
+    week TEXT,
+    week_points INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS habits (
+    habit TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    points INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user TEXT NOT NULL,
+    habit TEXT NOT NULL,
+    points INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    has_prev_state INTEGER NOT NULL DEFAULT 0,
+    prev_streak INTEGER,
+    prev_longest_streak INTEGER,
+    prev_last_action_date TEXT
+);
+CREATE INDEX IF NOT EXISTS logs_user_date ON logs (user, date);
+CREATE INDEX IF NOT EXISTS logs_user_timestamp ON logs (user, timestamp);
+CREATE TABLE IF NOT EXISTS daily_totals (
+    user TEXT NOT NULL,
+    date TEXT NOT NULL,
+    points INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    good INTEGER NOT NULL DEFAULT 0,
+    bad INTEGER NOT NULL DEFAULT 0,
+    habits TEXT NOT NULL DEFAULT '[]',
+    PRIMARY KEY (user, date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+# Columns added after the first release, for databases created before them
+SQLITE_MIGRATIONS = {
+    "users": [("week", "TEXT"), ("week_points", "INTEGER NOT NULL DEFAULT 0"),
+              ("longest_streak", "INTEGER NOT NULL DEFAULT 0")],
+    "logs": [("prev_longest_streak", "INTEGER")],
+}
+
+SQLITE_INDEXES = """
+CREATE INDEX IF NOT EXISTS users_points_rank ON users (points DESC, username);
+CREATE INDEX IF NOT EXISTS users_weekly_rank ON users (week, week_points DESC, username);
+CREATE INDEX IF NOT EXISTS users_streak_rank ON users (streak DESC, username);
+"""
+
+class SQLiteStorage(Storage):
+    """Embedded backend for single-user desktops: no server, no network round trips.
+
+    Each thread gets its own connection (WAL mode lets readers run alongside the
+    writer). Statements are constant SQL strings with ? parameters, so sqlite3's
+    statement cache keeps them prepared. Writes run in BEGIN IMMEDIATE
+    transactions, which makes every read-modify-write atomic.
+    """
+    name = "sqlite"
+
+    def __init__(self, path="habit_game.db"):
+        super().__init__()
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # "file:...?mode=memory&cache=shared" URIs give an in-memory database shared by all threads
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, cached_statements=256,
+                                   uri=self.path.startswith("file:"))
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.set_trace_callback(lambda sql: db_calls.count())
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _write(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @staticmethod
+    def _log_dict(row):
+        log = dict(row)
+        log["_id"] = log.pop("id")
+        has_prev = log.pop("has_prev_state")
+        prev = {"streak": log.pop("prev_streak"), "longest_streak": log.pop("prev_longest_streak"),
+                "last_action_date": log.pop("prev_last_action_date")}
+        if prev["longest_streak"] is None:
+            del prev["longest_streak"]  # written before longest_streak existed
+        log["prev_state"] = prev if has_prev else None
+        return log
+
+    @staticmethod
+    def _totals_dict(row):
+        totals = dict(row)
+        totals["habits"] = json.loads(totals["habits"])
+        return totals
+
+    # ---------- Bootstrap ----------
+    def bootstrap(self, mark):
+        conn = self._conn()
+        conn.executescript(SQLITE_SCHEMA)
+        for table, columns in SQLITE_MIGRATIONS.items():
+            existing = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+            for column, definition in columns:
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        conn.executescript(SQLITE_INDEXES)
+        mark("background: open SQLite database")
+        with self._write() as conn:
+            if conn.execute("SELECT COUNT(*) FROM habits").fetchone()[0] == 0:
+                conn.executemany("INSERT INTO habits (habit, type, points) VALUES (?, ?, ?)",
+                                 [(h["habit"], h["type"], h["points"]) for h in PREDEFINED_HABITS])
+        mark("background: seed habits")
+
+    # ---------- Users ----------
+    def create_user(self, username, password):
+        self.ensure_bootstrapped()
+        with self._write() as conn:
+            cur = conn.execute("INSERT OR IGNORE INTO users (username, password) VALUES (?, ?)", (username, password))
+            return cur.rowcount == 1
+
+    def login_user(self, username, password):
+        self.ensure_bootstrapped()
+        row = self._conn().execute("SELECT * FROM users WHERE username = ? AND password = ?",
+                                   (username, password)).fetchone()
+        return dict(row) if row else None
+
+    def get_user_stats(self, username):
+        self.ensure_bootstrapped()
+        row = self._conn().execute("SELECT * FROM users WHERE username = ?", (username,)).fetchone()
+        return dict(row) if row else None
+
+    def set_user_pin(self, username, pin, recovery):
+        with self._write() as conn:
+            conn.execute("UPDATE users SET pin = ?, pin_recovery = ? WHERE username = ?", (pin, recovery, username))
+        return self.get_user_stats(username)
+
+    def list_usernames(self):
+        self.ensure_bootstrapped()
+        return [r[0] for r in self._conn().execute("SELECT username FROM users")]
+
+    # ---------- Habits ----------
+    def load_habits(self):
+        return [dict(r) for r in self._conn().execute("SELECT habit, type, points FROM habits")]
+
+    def get_catalog_version(self):
+        row = self._conn().execute("SELECT value FROM meta WHERE key = 'habit_catalog'").fetchone()
+        return row[0] if row else 0
+
+    def save_habit(self, name, points, habit_type):
+        self.ensure_bootstrapped()
+        with self._write() as conn:
+            existed = conn.execute("SELECT 1 FROM habits WHERE habit = ?", (name,)).fetchone() is not None
+            conn.execute("INSERT INTO habits (habit, type, points) VALUES (?, ?, ?) "
+                         "ON CONFLICT (habit) DO UPDATE SET type = excluded.type, points = excluded.points",
+                         (name, habit_type, points))
+            conn.execute("INSERT INTO meta (key, value) VALUES ('habit_catalog', 1) "
+                         "ON CONFLICT (key) DO UPDATE SET value = value + 1")
+        self.catalog.invalidate()
+        return existed
+
+    # ---------- Logs ----------
+    def add_habit_logs(self, username, habit_names):
+        habits = [self.catalog.get(name) for name in habit_names]
+        if not habits or not all(habits):
+            return None
+        points = [int(h["points"]) for h in habits]
+        today = datetime.date.today()
+        date = today.isoformat()
+
+        with self._write() as conn:
+            user = conn.execute("SELECT points, streak, longest_streak, last_action_date, week, week_points "
+                                "FROM users WHERE username = ?", (username,)).fetchone()
+            if not user:
+                return None
+            day = conn.execute("SELECT habits FROM daily_totals WHERE user = ? AND date = ?",
+                               (username, date)).fetchone()
+            repeated = repeated_habits([h["habit"] for h in habits], json.loads(day["habits"]) if day else [])
+            if repeated:
+                raise AlreadyLoggedError(repeated)
+            before = streak_state(dict(user))
+            after = advance_streak(before, today)
+            new_points = user["points"] + sum(points)
+            week = week_start(today)
+            week_points = (user["week_points"] if user["week"] == week else 0) + sum(points)
+            conn.execute("UPDATE users SET points = ?, level = ?, streak = ?, longest_streak = ?, last_action_date = ?, "
+                         "week = ?, week_points = ? WHERE username = ?",
+                         (new_points, calculate_level(new_points), after["streak"], after["longest_streak"], date,
+                          week, week_points, username))
+            now = datetime.datetime.utcnow()
+            rows = []
+            for i, (habit, pts) in enumerate(zip(habits, points)):
+                # streak state each log replaced, so undo can restore it without replaying history
+                prev = before if i == 0 else after
+                stamp = (now + datetime.timedelta(microseconds=1000 * i)).isoformat()
+                rows.append((username, habit["habit"], pts, date, stamp,
+                             prev["streak"], prev["longest_streak"], prev["last_action_date"]))
+            conn.executemany("INSERT INTO logs (user, habit, points, date, timestamp, has_prev_state, "
+                             "prev_streak, prev_longest_streak, prev_last_action_date) "
+                             "VALUES (?, ?, ?, ?, ?, 1, ?, ?, ?)", rows)
+            self._apply_to_daily_totals(conn, username, date,
+                                        [(h["habit"], pts, h["type"]) for h, pts in zip(habits, points)])
+        return points
+
+    def _apply_to_daily_totals(self, conn, username, date, entries):
+        row = conn.execute("SELECT * FROM daily_totals WHERE user = ? AND date = ?", (username, date)).fetchone()
+        totals = self._totals_dict(row) if row else {"points": 0, "count": 0, "good": 0, "bad": 0, "habits": []}
+        for name, pts, kind in entries:
+            totals["points"] += pts
+            totals["count"] += 1
+            totals[kind] += 1
+            totals["habits"].append(name)
+        conn.execute("INSERT OR REPLACE INTO daily_totals (user, date, points, count, good, bad, habits) "
+                     "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                     (username, date, totals["points"], totals["count"], totals["good"], totals["bad"],
+                      json.dumps(totals["habits"])))
+
+    def undo_last_habit_log(self, username):
+        self.ensure_bootstrapped()
+        with self._write() as conn:
+            row = conn.execute("SELECT * FROM logs WHERE user = ? ORDER BY timestamp DESC, id DESC LIMIT 1",
+                               (username,)).fetchone()
+            if not row:
+                return False
+            last_log = self._log_dict(row)
+            conn.execute("DELETE FROM logs WHERE id = ?", (last_log["_id"],))
+
+            totals_row = conn.execute("SELECT * FROM daily_totals WHERE user = ? AND date = ?",
+                                      (username, last_log["date"])).fetchone()
+            if totals_row:
+                totals = self._totals_dict(totals_row)
+                kind = self.habit_type(last_log["habit"], last_log["points"])
+                if last_log["habit"] in totals["habits"]:
+                    totals["habits"].remove(last_log["habit"])
+                if totals["count"] <= 1:
+                    conn.execute("DELETE FROM daily_totals WHERE user = ? AND date = ?", (username, last_log["date"]))
+                else:
+                    conn.execute("UPDATE daily_totals SET points = ?, count = ?, good = ?, bad = ?, habits = ? "
+                                 "WHERE user = ? AND date = ?",
+                                 (totals["points"] - last_log["points"], totals["count"] - 1,
+                                  max(0, totals["good"] - (kind == "good")), max(0, totals["bad"] - (kind == "bad")),
+                                  json.dumps(totals["habits"]), username, last_log["date"]))
+
+            prev = last_log["prev_state"]
+            if prev is not None:
+                # Reverse the log against the running aggregate: independent of history length
+                user = conn.execute("SELECT points, longest_streak, week, week_points FROM users WHERE username = ?",
+                                    (username,)).fetchone()
+                new_points = user["points"] - last_log["points"]
+                week_points = user["week_points"]
+                if user["week"] == week_start(datetime.date.fromisoformat(last_log["date"])):
+                    week_points -= last_log["points"]
+                state = streak_state({"longest_streak": user["longest_streak"], **prev})
+                conn.execute("UPDATE users SET points = ?, level = ?, streak = ?, longest_streak = ?, "
+                             "last_action_date = ?, week_points = ? WHERE username = ?",
+                             (new_points, calculate_level(new_points), state["streak"], state["longest_streak"],
+                              state["last_action_date"], week_points, username))
+        if prev is None:
+            # Logs written without a snapshot (e.g. bulk imports) need the full replay
+            self.recompute_user_stats(username)
+        return True
+
+    def get_logs_for_user(self, username, limit=1000):
+        self.ensure_bootstrapped()
+        rows = self._conn().execute("SELECT * FROM logs WHERE user = ? ORDER BY date DESC, timestamp DESC LIMIT ?",
+                                    (username, limit))
+        return [self._log_dict(r) for r in rows]
+
+    def get_logs_page(self, username, before=None, limit=100):
+        self.ensure_bootstrapped()
+        if before is None:
+            rows = self._conn().execute("SELECT * FROM logs WHERE user = ? ORDER BY timestamp DESC, id DESC LIMIT ?",
+                                        (username, limit))
+            return [self._log_dict(r) for r in rows]
+        skip = set(before["ids"])
+        rows = self._conn().execute("SELECT * FROM logs WHERE user = ? AND timestamp <= ? "
+                                    "ORDER BY timestamp DESC, id DESC LIMIT ?",
+                                    (username, before["timestamp"], limit + len(skip)))
+        return [self._log_dict(r) for r in rows if str(r["id"]) not in skip][:limit]
+
+    def count_logs(self, username):
+        self.ensure_bootstrapped()
+        return self._conn().execute("SELECT COUNT(*) FROM logs WHERE user = ?", (username,)).fetchone()[0]
+
+    def insert_users(self, users):
+        self.ensure_bootstrapped()
+        with self._write() as conn:
+            conn.executemany("INSERT INTO users (username, password) VALUES (?, ?)",
+                             [(u["username"], u["password"]) for u in users])
+        return len(users)
+
+    def insert_logs(self, logs):
+        self.ensure_bootstrapped()
+        rows = [(l["user"], l["habit"], l["points"], l["date"],
+                 l["timestamp"].isoformat() if isinstance(l["timestamp"], datetime.datetime) else l["timestamp"])
+                for l in logs]
+        with self._write() as conn:
+            conn.executemany("INSERT INTO logs (user, habit, points, date, timestamp) VALUES (?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def habits_logged_on_days(self, days):
+        self.ensure_bootstrapped()
+        days = sorted(days)
+        logged = {}
+        for i in range(0, len(days), 400):
+            batch = days[i:i + 400]
+            marks = ",".join(["(?, ?)"] * len(batch))
+            for user, date, habit in self._conn().execute(
+                    f"SELECT user, date, habit FROM logs WHERE (user, date) IN (VALUES {marks})",
+                    [value for day in batch for value in day]):
+                logged.setdefault((user, date), set()).add(habit)
+        return logged
+
+    def _iter_rows(self, sql, params, batch_size):
+        cursor = self._conn().execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield from rows
+
+    def iter_logs(self, username=None, after=None, batch_size=1000, fields=None):
+        # Ordered by the (user, timestamp) index; `fields` is ignored as rows are narrow
+        self.ensure_bootstrapped()
+        where, params = [], []
+        if username:
+            where.append("user = ?")
+            params.append(username)
+        if after:
+            where.append("(user > ? OR (user = ? AND timestamp >= ?))")
+            params += [after["user"], after["user"], after["timestamp"]]
+        sql = ("SELECT id AS _id, user, habit, points, date, timestamp FROM logs"
+               + (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY user, timestamp, id")
+        skip = set(after["ids"]) if after else set()
+        for row in self._iter_rows(sql, params, batch_size):
+            if skip and str(row["_id"]) in skip:
+                continue
+            yield dict(row)
+
+    def iter_users(self, after=None, batch_size=1000):
+        self.ensure_bootstrapped()
+        sql = ("SELECT username, points, level, streak, longest_streak, last_action_date FROM users "
+               "WHERE username > ? ORDER BY username")
+        for row in self._iter_rows(sql, (after or "",), batch_size):
+            yield dict(row)
+
+    def log_columns(self, username):
+        self.ensure_bootstrapped()
+        cursor = self._conn().cursor()
+        cursor.row_factory = None  # plain tuples: no Row object per log
+        rows = cursor.execute("SELECT date, habit, points FROM logs WHERE user = ?", (username,)).fetchall()
+        return tuple(zip(*rows)) if rows else ((), (), ())
+
+    # ---------- Leaderboard ----------
+    # One constant statement per board and query kind, so each stays prepared
+    SQLITE_BOARDS = {
+        "points": ("points", "1 = 1"),
+        "weekly": ("week_points", "week = :period"),
+        "streak": ("streak", "last_action_date >= :period"),
+    }
+
+    def _board_period(self, board):
+        today = datetime.date.today()
+        return week_start(today) if board == "weekly" else (today - datetime.timedelta(days=1)).isoformat()
+
+    def top_users(self, board, limit):
+        self.ensure_bootstrapped()
+        field, where = self.SQLITE_BOARDS[board]
+        rows = self._conn().execute(
+            f"SELECT username, {field} AS score, level FROM users WHERE {where} "
+            f"ORDER BY {field} DESC, username LIMIT :limit",
+            {"period": self._board_period(board), "limit": limit})
+        return [dict(r) for r in rows]
+
+    def count_above(self, board, score):
+        self.ensure_bootstrapped()
+        field, where = self.SQLITE_BOARDS[board]
+        return self._conn().execute(f"SELECT COUNT(*) FROM users WHERE {where} AND {field} > :score",
+                                    {"period": self._board_period(board), "score": score}).fetchone()[0]
+
+    def recompute_user_stats(self, username):
+        # Also rewrites each log's prev_state snapshot so later undos stay O(1).
+        return self._recompute(username)[username].summary()
+
+    def recompute_users(self, usernames):
+        return len(self._recompute(*usernames))
+
+    def habit_log_counts(self, habit_name, points):
+        self.ensure_bootstrapped()
+        rows = self._conn().execute("SELECT user, COUNT(*) FROM logs WHERE habit = ? AND points != ? GROUP BY user",
+                                    (habit_name, points))
+        return {user: count for user, count in rows}
+
+    def set_habit_log_points(self, habit_name, points, usernames):
+        self.ensure_bootstrapped()
+        marks = ",".join("?" * len(usernames))
+        with self._write() as conn:
+            return conn.execute(f"UPDATE logs SET points = ? WHERE user IN ({marks}) AND habit = ? AND points != ?",
+                                (points, *usernames, habit_name, points)).rowcount
+
+    def _recompute(self, *usernames):
+        """Replay a batch of users in one transaction, reading their logs with one query."""
+        self.ensure_bootstrapped()
+        replays = {u: StatsReplay() for u in usernames}
+        with self._write() as conn:
+            updates = []
+            placeholders = ", ".join("?" * len(usernames))
+            for row in conn.execute(f"SELECT id, user, points, date FROM logs WHERE user IN ({placeholders}) "
+                                    "ORDER BY user, timestamp, id", usernames):
+                prev = replays[row["user"]].add(row["points"], row["date"])
+                updates.append((prev["streak"], prev["longest_streak"], prev["last_action_date"], row["id"]))
+            conn.executemany("UPDATE logs SET has_prev_state = 1, prev_streak = ?, prev_longest_streak = ?, "
+                             "prev_last_action_date = ? WHERE id = ?", updates)
+            conn.executemany("UPDATE users SET points = :points, level = :level, streak = :streak, "
+                             "longest_streak = :longest_streak, last_action_date = :last_action_date, "
+                             "week = :week, week_points = :week_points WHERE username = :username",
+                             [{"username": u, **r.user_fields()} for u, r in replays.items()])
+        return replays
+
+    # ---------- Daily rollup ----------
+    def get_month_rollup(self, username, year, month):
+        self.ensure_bootstrapped()
+        start, end = month_bounds(year, month)
+        rows = self._conn().execute("SELECT * FROM daily_totals WHERE user = ? AND date >= ? AND date < ?",
+                                    (username, start, end))
+        return {r["date"]: self._totals_dict(r) for r in rows}
+
+    def get_day_totals(self, username, date):
+        self.ensure_bootstrapped()
+        if isinstance(date, datetime.date):
+            date = date.isoformat()
+        row = self._conn().execute("SELECT * FROM daily_totals WHERE user = ? AND date = ?",
+                                   (username, date)).fetchone()
+        return self._totals_dict(row) if row else None
+
+    def backfill_daily_totals(self, usernames=None, batch_size=200, workers=4):
+        # SQLite has a single writer, so one set-based statement per batch beats
+        # parallel workers; `workers` is accepted for interface compatibility.
+        self.ensure_bootstrapped()
+        if usernames is None:
+            usernames = [r[0] for r in self._conn().execute("SELECT DISTINCT user FROM logs")]
+        done = 0
+        started = time.perf_counter()
+        for i in range(0, len(usernames), batch_size):
+            batch = usernames[i:i + batch_size]
+            marks = ",".join("?" * len(batch))
+            with self._write() as conn:
+                conn.execute(f"DELETE FROM daily_totals WHERE user IN ({marks})", batch)
+                conn.execute(f"""
+                    INSERT INTO daily_totals (user, date, points, count, good, bad, habits)
+                    SELECT user, date, SUM(points), COUNT(*), SUM(kind = 'good'), SUM(kind = 'bad'),
+                           json_group_array(habit)
+                    FROM (SELECT l.user, l.date, l.points, l.habit,
+                                 COALESCE(h.type, CASE WHEN l.points > 0 THEN 'good' ELSE 'bad' END) AS kind
+                          FROM logs l LEFT JOIN habits h ON h.habit = l.habit
+                          WHERE l.user IN ({marks})
+                          ORDER BY l.timestamp, l.id)
+                    GROUP BY user, date
+                """, batch)
+            done += len(batch)
+            print(f"📅 Daily totals: {done}/{len(usernames)} users ({time.perf_counter() - started:.1f}s)")
+        return done
+
+# ---------------- Active backend ----------------
+def make_mongo_storage(config):
+    args = (config["mongo_uri"], config["mongo_db"], config.get("mongo_timeout_ms"))
+    if config.get("mongo_schema") == "buckets":
+        return BucketedMongoStorage(*args, config.get("mongo_pool_size"))
+    if config.get("journal_path"):
+        if lock_journal(config["journal_path"]):
+            return JournaledMongoStorage(*args, config["journal_path"], config.get("mongo_pool_size"))
+        print(f"⚠️ {config['journal_path']} is in use by another Habit Tracker; writing straight to MongoDB")
+    return MongoStorage(*args, config.get("mongo_pool_size"))
+
+BACKENDS = {
+    "mongo": make_mongo_storage,
+    "sqlite": lambda config: SQLiteStorage(config["sqlite_path"]),
+}
+
+_storage = None
+_storage_config = None
+_storage_lock = threading.Lock()
+
+def configure_storage(config=None):
+    """Select the backend described by `config` (default: load_config())."""
+    global _storage, _storage_config
+    config = config or load_config()
+    if config["backend"] not in BACKENDS:
+        raise ValueError(f"Unknown storage backend {config['backend']!r}; choose from {', '.join(BACKENDS)}")
+    with _storage_lock:
+        _storage = BACKENDS[config["backend"]](config)
+        _storage_config = config
+    return _storage
+
+def get_storage():
+    if _storage is None:
+        configure_storage()
+    return _storage
+
+# ---------------- Core backend functions ----------------
+@metrics.timed("backend.ensure_bootstrapped")
+def ensure_bootstrapped(mark=None):
+    return get_storage().ensure_bootstrapped(mark)
+
+@metrics.timed("backend.create_user")
+def create_user(username, password):
+    return get_storage().create_user(username, password)
+
+@metrics.timed("backend.login_user")
+def login_user(username, password):
+    return get_storage().login_user(username, password)
+
+@metrics.timed("backend.get_user_stats")
+def get_user_stats(username):
+    return get_storage().get_user_stats(username)
+
+@metrics.timed("backend.set_user_pin")
+def set_user_pin(username, pin, recovery):
+    return get_storage().set_user_pin(username, pin, recovery)
+
+@metrics.timed("backend.list_usernames")
+def list_usernames():
+    return get_storage().list_usernames()
+
+@metrics.timed("backend.build_habit_list")
+def build_habit_list():
+    return get_storage().build_habit_list()
+
+@metrics.timed("backend.get_habit")
+def get_habit(habit_name):
+    return get_storage().get_habit(habit_name)
+
+@metrics.timed("backend.save_habit")
+def save_habit(name, points, habit_type):
+    return get_storage().save_habit(name, points, habit_type)
+
+@metrics.timed("backend.add_habit_log_for_user")
+def add_habit_log_for_user(username, habit_name):
+    return get_storage().add_habit_log(username, habit_name)
+
+@metrics.timed("backend.add_habit_logs_for_user")
+def add_habit_logs_for_user(username, habit_names):
+    return get_storage().add_habit_logs(username, habit_names)
+
+@metrics.timed("backend.undo_last_habit_log")
+def undo_last_habit_log(username):
+    return get_storage().undo_last_habit_log(username)
+
+@metrics.timed("backend.get_logs_for_user")
+def get_logs_for_user(username, limit=1000):
+    return get_storage().get_logs_for_user(username, limit)
+
+@metrics.timed("backend.get_logs_page")
+def get_logs_page(username, before=None, limit=100):
+    return get_storage().get_logs_page(username, before, limit)
+
+@metrics.timed("backend.count_logs")
+def count_logs(username):
+    return get_storage().count_logs(username)
+
+@metrics.timed("backend.recompute_user_stats")
+def recompute_user_stats(username):
+    return get_storage().recompute_user_stats(username)
+
+@metrics.timed("backend.get_leaderboard")
+def get_leaderboard(board, limit=10):
+    return get_storage().get_leaderboard(board, limit)
+
+@metrics.timed("backend.get_ranks")
+def get_ranks(username):
+    return get_storage().get_ranks(username)
+
+@metrics.timed("backend.get_month_totals")
+def get_month_totals(username, year, month):
+    return get_storage().get_month_totals(username, year, month)
+
+@metrics.timed("backend.get_day_totals")
+def get_day_totals(username, date):
+    return get_storage().get_day_totals(username, date)
+
+@metrics.timed("backend.get_habits_logged_on")
+def get_habits_logged_on(username, date):
+    return get_storage().get_habits_logged_on(username, date)
+
+@metrics.timed("backend.backfill_daily_totals")
+def backfill_daily_totals(usernames=None, batch_size=200, workers=4):
+    return get_storage().backfill_daily_totals(usernames, batch_size, workers)
+
+@metrics.timed("backend.load_dashboard_snapshot")
+def load_dashboard_snapshot(username, year, month, recent_limit=5):
+    return get_storage().load_dashboard_snapshot(username, year, month, recent_limit)
+
+# ---------------- Bulk recompute ----------------
+# Rebuilds every user's aggregates, e.g. after the streak rule changes. The
+# parent walks usernames with a batched cursor and hands each batch to a worker
+# process, which opens its own connection (a MongoClient must not cross a fork)
+# and replays the whole batch through StatsReplay with one log cursor. SQLite
+# has a single writer, so it runs the batches in-process instead.
+RECOMPUTE_BATCH = 500
+
+def _batch_worker_init(config):
+    configure_storage(config)
+
+def _run_storage_batch(method, args, usernames):
+    return getattr(get_storage(), method)(*args, usernames)
+
+def run_user_batches(storage, batches, method, args=(), workers=None, report=None):
+    """Call storage.<method>(*args, batch) for every batch of usernames, across processes where the backend allows.
+
+    `report(batch, result)` runs in this process as each batch finishes.
+    """
+    workers = workers or os.cpu_count() or 1
+    if not storage.parallel_writes or workers == 1:
+        for batch in batches:
+            result = getattr(storage, method)(*args, batch)
+            if report:
+                report(batch, result)
+        return
+
+    # Workers write straight through; spawn so no parent connection is inherited
+    config = dict(_storage_config or load_config(), journal_path=None)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_batch_worker_init, initargs=(config,)) as pool:
+        pending = {}
+        for batch in batches:
+            # Keep a couple of batches queued per worker, not the whole user list
+            if len(pending) >= 2 * workers:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    result = future.result()
+                    if report:
+                        report(pending.pop(future), result)
+            pending[pool.submit(_run_storage_batch, method, args, batch)] = batch
+        for future in wait(pending).done:
+            if report:
+                report(pending[future], future.result())
+
+def username_batches(storage, batch_size):
+    batch = []
+    for user in storage.iter_users(batch_size=batch_size):
+        batch.append(user["username"])
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+@metrics.timed("backend.recompute_all_users")
+def recompute_all_users(batch_size=RECOMPUTE_BATCH, workers=None):
+    """Recompute points, level, weekly points and streaks for every user; returns the user count."""
+    storage = get_storage()
+    storage.ensure_bootstrapped()
+    done = 0
+    started = time.perf_counter()
+
+    def report(batch, count):
+        nonlocal done
+        done += count
+        elapsed = time.perf_counter() - started
+        print(f"♻️ Recomputed {done} users ({done / max(elapsed, 1e-9):,.0f}/s)")
+
+    run_user_batches(storage, username_batches(storage, batch_size), "recompute_users", workers=workers, report=report)
+    return done
+
+# ---------------- Rebalancing ----------------
+# When a habit's point value changes, past logs keep the value they were logged
+# with. Rebalancing re-prices them: per batch of affected users, one server-side
+# update_many over their logs of that habit, then the same batched replay as the
+# bulk recompute and a rollup rebuild, so totals, levels and the calendar agree.
+@metrics.timed("backend.rebalance_habit")
+def rebalance_habit(habit_name, points=None, dry_run=False, batch_size=RECOMPUTE_BATCH, workers=None):
+    """Apply `habit_name`'s point value (default: its catalog value) to every past log.
+
+    Returns {"users", "logs"} affected (or that would be, with dry_run).
+    """
+    storage = get_storage()
+    storage.ensure_bootstrapped()
+    if points is None:
+        habit = storage.get_habit(habit_name)
+        if habit is None:
+            raise ValueError(f"Unknown habit {habit_name!r}")
+        points = int(habit["points"])
+    counts = storage.habit_log_counts(habit_name, points)
+    total_logs = sum(counts.values())
+    summary = {"users": len(counts), "logs": total_logs}
+    if dry_run:
+        print(f"🔎 {total_logs} '{habit_name}' logs of {len(counts)} users would change to {points} pts")
+        for username, logs in sorted(counts.items(), key=lambda c: -c[1])[:10]:
+            print(f"   {username}: {logs} logs")
+        return summary
+    if not counts:
+        print(f"✅ Every '{habit_name}' log is already worth {points} pts")
+        return summary
+
+    users = sorted(counts)
+    batches = [users[i:i + batch_size] for i in range(0, len(users), batch_size)]
+    done_users = done_logs = 0
+    started = time.perf_counter()
+
+    def report(batch, changed):
+        nonlocal done_users, done_logs
+        done_users += len(batch)
+        done_logs += changed
+        elapsed = time.perf_counter() - started
+        rate = done_logs / max(elapsed, 1e-9)
+        eta = (total_logs - done_logs) / rate if rate else 0
+        print(f"⚖️ Rebalanced {done_users}/{len(users)} users, {done_logs}/{total_logs} logs "
+              f"({rate:,.0f} logs/s, ~{eta:.0f}s left)")
+
+    run_user_batches(storage, batches, "rebalance_users", (habit_name, points), workers=workers, report=report)
+    print(f"✅ '{habit_name}' is now worth {points} pts in {done_logs} past logs of {done_users} users "
+          f"({time.perf_counter() - started:.1f}s)")
+    return {"users": done_users, "logs": done_logs}
+
+# ---------------- Log schema migration ----------------
+def _human_bytes(n):
+    for unit in ("B", "KB", "MB"):
+        if n < 1024:
+            return f"{n:.0f} {unit}"
+        n /= 1024
+    return f"{n:.1f} GB"
+
+@metrics.timed("backend.migrate_logs_to_buckets")
+def migrate_logs_to_buckets(batch_size=RECOMPUTE_BATCH, workers=None):
+    """Copy the per-log collection into monthly buckets, batch by batch of users.
+
+    Every user with logs is migrated, including logs whose user document is
+    gone. Running it again resumes an interrupted migration and skips users
+    already done, so logs written or undone in buckets since are kept as they
+    are. The logs and daily_totals collections are left in place.
+    """
+    config = load_config() if _storage_config is None else _storage_config
+    if config["backend"] != "mongo":
+        raise ValueError("Bucketed logs are a MongoDB schema; the SQLite backend keeps one row per log")
+    storage = configure_storage(dict(config, mongo_schema="buckets", journal_path=None))
+    storage.ensure_bootstrapped()
+    storage.assign_habit_ids()
+    total = storage.logs.estimated_document_count()
+    done_logs = 0
+    started = time.perf_counter()
+
+    def report(batch, logs):
+        nonlocal done_logs
+        done_logs += logs
+        rate = done_logs / max(time.perf_counter() - started, 1e-9)
+        print(f"📦 Migrated ~{done_logs}/{total} logs ({rate:,.0f} logs/s)")
+
+    users = sorted(storage.logs.distinct("user"))
+    batches = [users[i:i + batch_size] for i in range(0, len(users), batch_size)]
+    run_user_batches(storage, batches, "migrate_users", workers=workers, report=report)
+
+    before = storage.collection_sizes("logs")
+    rollup = storage.collection_sizes("daily_totals")
+    after = storage.collection_sizes("log_buckets")
+    print(f"✅ {done_logs} logs now in {after['documents']} buckets "
+          f"({time.perf_counter() - started:.1f}s)")
+    for label, stats in (("logs", before), ("daily_totals", rollup), ("log_buckets", after)):
+        print(f"   {label:<13} {stats['documents']:>10} docs   data {_human_bytes(stats['data']):>10}   "
+              f"indexes {_human_bytes(stats['indexes']):>10}")
+    print('ℹ️ Set "mongo_schema": "buckets" in habit_config.json to use them; '
+          "drop logs and daily_totals once you are happy with the result.")
+    return {"logs": done_logs, "buckets": after["documents"]}
@@ -0,0 +1,97 @@
+"""Import and export tests, against a SQLite database in a temporary directory.
+
+    python -m pytest -q
+"""
+import csv
+import datetime
+import os
+
+import pytest
+
+from habit_io import USER_FIELDS, export_logs, export_users, import_logs
+from habit_storage import configure_storage
+
+HYDRATED = "Stayed hydrated"  # good, 12 pts
+SKIPPED_MEAL = "Skipped meal"  # bad, -9 pts
+
+@pytest.fixture
+def storage(tmp_path):
+    # A file, not :memory:, as the recompute after an import runs on a worker thread with its own connection
+    storage = configure_storage({"backend": "sqlite", "sqlite_path": str(tmp_path / "habit_game.db")})
+    storage.ensure_bootstrapped()
+    storage.create_user("ana", "pw")
+    return storage
+
+def write_csv(path, rows):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["user", "habit", "date"])
+        writer.writeheader()
+        writer.writerows(rows)
+    return str(path)
+
+# ---------------- Import ----------------
+def test_reimporting_a_file_adds_nothing(storage, tmp_path):
+    path = write_csv(tmp_path / "logs.csv", [
+        {"user": "ana", "habit": HYDRATED, "date": "2024-03-01"},
+        {"user": "ana", "habit": HYDRATED, "date": "2024-03-01"},
+        {"user": "ana", "habit": SKIPPED_MEAL, "date": "2024-03-01"},
+        {"user": "ana", "habit": HYDRATED, "date": "2024-03-02"},
+        {"user": "bob", "habit": HYDRATED, "date": "2024-03-02"},
+    ])
+    first = import_logs(path, batch_size=2, workers=1, storage=storage)
+    assert (first["imported"], first["duplicates"], first["rejected"]) == (3, 1, 1)
+
+    second = import_logs(path, batch_size=2, workers=1, storage=storage)
+    assert (second["imported"], second["duplicates"], second["rejected"]) == (0, 4, 1)
+    assert storage.count_logs("ana") == 3
+    day = storage.get_day_totals("ana", "2024-03-01")
+    assert (day["count"], day["points"], sorted(day["habits"])) == (2, 3, [SKIPPED_MEAL, HYDRATED])
+    assert storage.get_user_stats("ana")["points"] == 15
+
+def test_import_skips_habits_already_logged_that_day(storage, tmp_path):
+    storage.add_habit_log("ana", HYDRATED)
+    today = storage.get_logs_for_user("ana")[0]["date"]
+    path = write_csv(tmp_path / "logs.csv", [{"user": "ana", "habit": HYDRATED, "date": today}])
+    assert import_logs(path, workers=1, storage=storage)["duplicates"] == 1
+    assert storage.count_logs("ana") == 1
+
+# ---------------- Export ----------------
+def test_interrupted_export_resumes_without_duplicates(storage, tmp_path, monkeypatch):
+    storage.add_habit_logs("ana", [HYDRATED, SKIPPED_MEAL])
+    storage.insert_logs([{"user": "ana", "habit": HYDRATED, "points": 12, "date": f"2024-03-{day:02d}",
+                          "timestamp": datetime.datetime(2024, 3, day, 8)} for day in range(1, 6)])
+    path = str(tmp_path / "logs.csv")
+    iter_logs = storage.iter_logs
+
+    def interrupted(*args, **kwargs):
+        for i, log in enumerate(iter_logs(*args, **kwargs)):
+            if i == 5:
+                raise KeyboardInterrupt
+            yield log
+    with monkeypatch.context() as patch, pytest.raises(KeyboardInterrupt):
+        patch.setattr(storage, "iter_logs", interrupted)
+        export_logs(path, batch_size=2, storage=storage)
+    assert os.path.exists(path + ".checkpoint")
+
+    assert export_logs(path, batch_size=2, storage=storage) == 7
+    with open(path, encoding="utf-8", newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert [row["date"] for row in rows] == [log["date"] for log in storage.iter_logs("ana")]
+    assert not os.path.exists(path + ".checkpoint")
+
+def test_parquet_export_round_trips(storage, tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+    storage.add_habit_logs("ana", [HYDRATED, SKIPPED_MEAL])
+
+    users_path = str(tmp_path / "users.parquet")
+    assert export_users(users_path, storage=storage) == 1
+    users = pq.read_table(users_path)
+    assert users.schema.field("longest_streak").type == pa.int64()
+    assert users.to_pylist() == [{k: v for k, v in storage.get_user_stats("ana").items() if k in USER_FIELDS}]
+
+    logs_path = str(tmp_path / "logs.parquet")
+    assert export_logs(logs_path, storage=storage) == 2
+    logs = pq.read_table(logs_path)
+    assert logs.schema.field("timestamp").type == pa.timestamp("us")
+    assert [(row["habit"], row["points"]) for row in logs.to_pylist()] == [(HYDRATED, 12), (SKIPPED_MEAL, -9)]
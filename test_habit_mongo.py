@@ -0,0 +1,138 @@
+"""MongoDB backend tests (logging, the offline journal, the bucketed schema), run against mongomock.
+
+    python -m pytest -q
+"""
+import datetime
+
+import pytest
+from pymongo.errors import AutoReconnect
+
+import habit_storage
+
+HYDRATED = "Stayed hydrated"  # good, 12 pts
+SKIPPED_MEAL = "Skipped meal"  # bad, -9 pts
+
+def stats(storage, username):
+    user = storage.get_user_stats(username)
+    return {k: user.get(k) for k in ("points", "level", "streak", "longest_streak", "last_action_date")}
+
+# ---------------- Logging ----------------
+def test_failed_log_insert_leaves_nothing_counted(mongo_storage, monkeypatch):
+    before = stats(mongo_storage, "ana")
+
+    def fail(*args, **kwargs):
+        raise AutoReconnect("connection lost")
+    with monkeypatch.context() as patch, pytest.raises(AutoReconnect):
+        patch.setattr(mongo_storage.logs, "bulk_write", fail)
+        mongo_storage.add_habit_logs("ana", [HYDRATED, SKIPPED_MEAL])
+
+    assert stats(mongo_storage, "ana") == before
+    assert mongo_storage.get_user_stats("ana")["week_points"] == 0
+    assert mongo_storage.get_day_totals("ana", datetime.date.today()) is None
+    assert mongo_storage.add_habit_logs("ana", [HYDRATED, SKIPPED_MEAL]) == [12, -9]
+    assert stats(mongo_storage, "ana")["points"] == 3
+
+# ---------------- Leaderboards ----------------
+def test_leaderboards_read_the_rank_indexes(mongo_storage):
+    mongo_storage.create_user("ben", "pw")
+    mongo_storage.users.update_one({"username": "ben"}, {"$set": {"points": 500, "streak": 9, "week": "2020-01-06",
+                                                                 "week_points": 500, "last_action_date": "2020-01-10"}})
+    mongo_storage.add_habit_logs("ana", [HYDRATED, SKIPPED_MEAL])
+
+    assert [(row["username"], row["score"]) for row in mongo_storage.top_users("points", 10)] == [("ben", 500), ("ana", 3)]
+    assert [row["username"] for row in mongo_storage.top_users("weekly", 10)] == ["ana"]
+    assert [row["username"] for row in mongo_storage.top_users("streak", 10)] == ["ana"]
+    assert mongo_storage.get_ranks("ana") == {"points": {"rank": 2, "score": 3}, "weekly": {"rank": 1, "score": 3},
+                                              "streak": {"rank": 1, "score": 1}}
+
+# ---------------- Offline journal ----------------
+@pytest.fixture
+def journaled(mongo_config, tmp_path, monkeypatch):
+    storage = habit_storage.configure_storage({**mongo_config, "journal_path": str(tmp_path / "journal.jsonl")})
+    assert isinstance(storage, habit_storage.JournaledMongoStorage)
+    # The replay's rollup rebuild is a $merge aggregation, which mongomock lacks; these tests check the logs
+    monkeypatch.setattr(storage, "backfill_daily_totals", lambda usernames, workers: len(usernames))
+    storage.ensure_bootstrapped()
+    storage.create_user("ana", "pw")
+    today = datetime.date.today()
+    storage.load_dashboard_snapshot("ana", today.year, today.month)  # what the dashboard falls back on offline
+    return storage
+
+def logs_today(storage, habit):
+    return storage.logs.count_documents({"user": "ana", "habit": habit, "date": datetime.date.today().isoformat()})
+
+def test_journal_replay_drops_a_habit_logged_from_another_device(journaled):
+    # Another device logs the habit directly; this one, offline, still shows it as not logged
+    habit_storage.MongoStorage.add_habit_logs(journaled, "ana", [HYDRATED])
+    journaled.offline = True
+    assert journaled.add_habit_logs("ana", [HYDRATED, SKIPPED_MEAL]) == [12, -9]
+    journaled.flush()
+
+    assert journaled.journal.pending == []
+    assert logs_today(journaled, HYDRATED) == 1
+    assert logs_today(journaled, SKIPPED_MEAL) == 0
+    assert journaled.get_user_stats("ana")["points"] == 12
+    assert journaled.get_day_totals("ana", datetime.date.today())["habits"] == [HYDRATED]
+
+def test_journal_replay_keeps_a_habit_logged_again_after_undo(journaled):
+    journaled.offline = True
+    journaled.add_habit_logs("ana", [HYDRATED])
+    journaled.undo_last_habit_log("ana")
+    journaled.add_habit_logs("ana", [HYDRATED])
+    journaled.flush()
+
+    assert journaled.journal.pending == []
+    assert logs_today(journaled, HYDRATED) == 1
+    assert journaled.get_user_stats("ana")["points"] == 12
+
+# ---------------- Bulk import ----------------
+@pytest.mark.parametrize("schema", ["logs", "buckets"])
+def test_habits_logged_on_days_reads_inserted_logs(mongo_config, schema):
+    storage = habit_storage.configure_storage({**mongo_config, "mongo_schema": schema})
+    storage.ensure_bootstrapped()
+    at = datetime.datetime(2024, 3, 1, 8)
+    storage.insert_logs([{"user": user, "habit": habit, "points": 1, "date": at.date().isoformat(), "timestamp": at}
+                         for user, habit in [("ana", HYDRATED), ("ana", SKIPPED_MEAL), ("ben", HYDRATED)]])
+    assert storage.habits_logged_on_days({("ana", "2024-03-01"), ("ana", "2024-03-02")}) == {
+        ("ana", "2024-03-01"): {HYDRATED, SKIPPED_MEAL}}
+
+# ---------------- Bucketed schema ----------------
+def test_rerunning_the_bucket_migration_loses_nothing(mongo_storage, monkeypatch):
+    # mongomock has no collStats, which only feeds the size report
+    monkeypatch.setattr(habit_storage.BucketedMongoStorage, "collection_sizes",
+                        lambda self, name: {"documents": 0, "data": 0, "storage": 0, "indexes": 0})
+    days = [datetime.date.today() - datetime.timedelta(days=n) for n in (40, 2, 1)]
+    mongo_storage.insert_logs([{"user": user, "habit": HYDRATED, "points": 12, "date": day.isoformat(),
+                                "timestamp": datetime.datetime.combine(day, datetime.time(8))}
+                               for user in ("ana", "gone") for day in days])  # "gone" has no user document
+    mongo_storage.recompute_users(["ana"])
+    assert habit_storage.migrate_logs_to_buckets(workers=1)["logs"] == 6
+
+    buckets = habit_storage.get_storage()
+    assert isinstance(buckets, habit_storage.BucketedMongoStorage)
+    buckets.add_habit_logs("ana", [HYDRATED])
+    buckets.add_habit_logs("ana", [SKIPPED_MEAL])
+    buckets.undo_last_habit_log("ana")
+    ana = [(log["_id"], log["habit"], log["prev_state"]) for log in buckets.iter_logs("ana")]
+    assert len(ana) == 4
+    assert stats(buckets, "ana")["streak"] == 3
+
+    assert habit_storage.migrate_logs_to_buckets(workers=1)["logs"] == 0
+    assert [(log["_id"], log["habit"], log["prev_state"]) for log in buckets.iter_logs("ana")] == ana
+    assert buckets.count_logs("gone") == 3
+
+def test_bucket_migration_merges_logs_into_buckets_written_first(mongo_config):
+    # Switched to buckets before migrating: the new entries stay, the old logs join them in order
+    storage = habit_storage.configure_storage({**mongo_config, "mongo_schema": "buckets"})
+    storage.ensure_bootstrapped()
+    storage.create_user("ana", "pw")
+    yesterday = datetime.date.today() - datetime.timedelta(days=1)
+    storage.logs.insert_one({"user": "ana", "habit": HYDRATED, "points": 12, "date": yesterday.isoformat(),
+                             "timestamp": datetime.datetime.combine(yesterday, datetime.time(8))})
+    storage.add_habit_logs("ana", [SKIPPED_MEAL])
+
+    assert storage.migrate_users(["ana"]) == 1
+    logs = list(storage.iter_logs("ana"))
+    assert [log["habit"] for log in logs] == [HYDRATED, SKIPPED_MEAL]
+    assert logs[1]["prev_state"]["streak"] == 1  # replayed over the merged history
+    assert storage.count_logs("ana") == 2
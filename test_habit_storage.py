@@ -0,0 +1,140 @@
+"""Regression tests for the storage rules, against an in-memory SQLite backend.
+
+    python -m pytest -q
+"""
+import datetime
+
+import pytest
+
+from habit_storage import AlreadyLoggedError, configure_storage, page_cursor, rebalance_habit
+
+HYDRATED = "Stayed hydrated"  # good, 12 pts
+SKIPPED_MEAL = "Skipped meal"  # bad, -9 pts
+READ = "Read books or articles"  # good, 9 pts
+
+@pytest.fixture
+def storage():
+    storage = configure_storage({"backend": "sqlite", "sqlite_path": ":memory:"})
+    storage.ensure_bootstrapped()
+    storage.create_user("ana", "pw")
+    return storage
+
+def days_ago(n):
+    return datetime.date.today() - datetime.timedelta(days=n)
+
+def insert_history(storage, username, habit, days, points=None):
+    """One `habit` log on each of `days` (days ago), at 08:00 UTC, then a recompute."""
+    points = storage.get_habit(habit)["points"] if points is None else points
+    storage.insert_logs([{"user": username, "habit": habit, "points": points, "date": days_ago(n).isoformat(),
+                          "timestamp": datetime.datetime.combine(days_ago(n), datetime.time(8))}
+                         for n in days])
+    storage.recompute_users([username])
+
+def stats(storage, username):
+    user = storage.get_user_stats(username)
+    return {k: user[k] for k in ("points", "level", "streak", "longest_streak", "last_action_date")}
+
+# ---------------- Logging and undo ----------------
+def test_undo_restores_the_replaced_streak_state(storage):
+    insert_history(storage, "ana", HYDRATED, [3, 2, 1])
+    before = stats(storage, "ana")
+    assert before["streak"] == 3
+
+    assert storage.add_habit_logs("ana", [HYDRATED, SKIPPED_MEAL]) == [12, -9]
+    logged = stats(storage, "ana")
+    assert (logged["points"], logged["streak"], logged["longest_streak"]) == (before["points"] + 3, 4, 4)
+
+    assert storage.undo_last_habit_log("ana")
+    assert storage.undo_last_habit_log("ana")
+    assert stats(storage, "ana") == before
+    assert storage.get_day_totals("ana", datetime.date.today()) is None
+
+def test_a_habit_counts_once_per_day(storage):
+    storage.add_habit_log("ana", HYDRATED)
+    with pytest.raises(AlreadyLoggedError):
+        storage.add_habit_log("ana", HYDRATED)
+    with pytest.raises(AlreadyLoggedError):
+        storage.add_habit_logs("ana", [SKIPPED_MEAL, SKIPPED_MEAL])
+    assert stats(storage, "ana")["points"] == 12
+    storage.undo_last_habit_log("ana")
+    assert storage.add_habit_log("ana", HYDRATED) == 12
+
+# ---------------- Recompute ----------------
+def test_recompute_matches_incremental_state(storage):
+    storage.create_user("ben", "pw")
+    insert_history(storage, "ana", HYDRATED, [9, 8, 7, 2, 1])
+    insert_history(storage, "ben", SKIPPED_MEAL, [1])
+    storage.add_habit_logs("ana", [HYDRATED, SKIPPED_MEAL])
+    storage.add_habit_log("ben", HYDRATED)
+    incremental = {name: stats(storage, name) for name in ("ana", "ben")}
+
+    storage.recompute_users(["ana", "ben"])
+    assert {name: stats(storage, name) for name in ("ana", "ben")} == incremental
+    assert incremental["ana"]["streak"] == 3
+    assert incremental["ana"]["longest_streak"] == 3
+
+def test_a_bad_habit_only_day_extends_the_streak(storage):
+    # The logging rule, not the old replay rule that reset the streak on days with negative points
+    insert_history(storage, "ana", HYDRATED, [1])
+    assert storage.add_habit_log("ana", SKIPPED_MEAL) == -9
+    assert (stats(storage, "ana")["streak"], stats(storage, "ana")["longest_streak"]) == (2, 2)
+    storage.recompute_users(["ana"])
+    assert stats(storage, "ana")["streak"] == 2
+    storage.undo_last_habit_log("ana")
+    assert stats(storage, "ana")["streak"] == 1
+
+# ---------------- Leaderboards ----------------
+def test_leaderboards_rank_points_this_week_and_live_streaks(storage):
+    storage.create_user("ben", "pw")
+    storage.create_user("cy", "pw")
+    insert_history(storage, "ben", HYDRATED, [42, 41, 40])  # most points, but none this week and no live streak
+    storage.add_habit_log("ana", HYDRATED)
+    storage.add_habit_logs("cy", [HYDRATED, READ])
+
+    def board(name):
+        return [(row["username"], row["score"]) for row in storage.get_leaderboard(name)]
+    assert board("points") == [("ben", 36), ("cy", 21), ("ana", 12)]
+    assert board("weekly") == [("cy", 21), ("ana", 12)]
+    assert board("streak") == [("ana", 1), ("cy", 1)]
+    assert storage.get_ranks("ana") == {"points": {"rank": 3, "score": 12}, "weekly": {"rank": 2, "score": 12},
+                                        "streak": {"rank": 1, "score": 1}}
+    assert storage.get_ranks("ben") == {"points": {"rank": 1, "score": 36}, "weekly": None, "streak": None}
+
+# ---------------- Rebalancing ----------------
+def test_rebalance_dry_run_changes_nothing_then_apply_reprices(storage):
+    insert_history(storage, "ana", HYDRATED, [3, 2, 1])
+    storage.save_habit(HYDRATED, 20, "good")
+
+    assert rebalance_habit(HYDRATED, dry_run=True) == {"users": 1, "logs": 3}
+    assert stats(storage, "ana")["points"] == 36
+    assert storage.habit_log_counts(HYDRATED, 20) == {"ana": 3}
+
+    assert rebalance_habit(HYDRATED, workers=1) == {"users": 1, "logs": 3}
+    assert stats(storage, "ana")["points"] == 60
+    assert storage.habit_log_counts(HYDRATED, 20) == {}
+    assert storage.get_day_totals("ana", days_ago(1))["points"] == 20
+
+# ---------------- History paging ----------------
+def test_keyset_pages_have_no_duplicates_or_gaps(storage):
+    # Three logs share each timestamp, so page boundaries fall inside ties
+    start = datetime.datetime(2024, 1, 1, 8)
+    storage.insert_logs([{"user": "ana", "habit": HYDRATED, "points": 12,
+                          "date": (start + datetime.timedelta(hours=i // 3)).date().isoformat(),
+                          "timestamp": start + datetime.timedelta(hours=i // 3)} for i in range(250)])
+    seen, cursor = [], None
+    while True:
+        page = storage.get_logs_page("ana", cursor, limit=7)
+        seen += [log["_id"] for log in page]
+        if len(page) < 7:
+            break
+        cursor = page_cursor(page)
+    assert storage.count_logs("ana") == 250
+    assert len(seen) == len(set(seen)) == 250
+    assert seen == [log["_id"] for log in storage.get_logs_page("ana", None, limit=1000)]
+
+def test_paging_is_per_user(storage):
+    storage.create_user("ben", "pw")
+    storage.add_habit_log("ana", HYDRATED)
+    storage.add_habit_log("ben", HYDRATED)
+    assert [log["user"] for log in storage.get_logs_page("ana")] == ["ana"]
+    assert page_cursor([]) is None